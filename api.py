@@ -0,0 +1,147 @@
+import hashlib
+import json
+from functools import reduce
+
+import pandas as pd
+from flask import Response, jsonify, request
+
+from backtest import run_backtest, best_parameters
+from datasets import get_dataset, get_sketches
+from funcs import forecast_table, necessity_totals
+from percentiles import SpendSketches
+from projection import project_month_end
+from taxonomy import get_taxonomy
+
+# Read-only JSON views of the analytics behind the charts, for dashboards that poll a dataset registered at upload
+# time (see datasets.register_dataset). A dataset id is the hash of its contents, so a response is fully determined
+# by the id, the endpoint and its parameters; that is what the strong ETag is built from. Bump API_VERSION whenever
+# the shape or the computation of a response changes so clients stop matching old ETags.
+API_VERSION = 2
+DEFAULT_RANKED = 5
+DEFAULT_QUANTILES = [0.5, 0.9, 0.99]
+
+
+def _etag(dataset_id, endpoint, params, revision):
+    key = json.dumps([API_VERSION, dataset_id, endpoint, params, revision], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _records(df):
+    # Through pandas' own JSON writer so NaN becomes null and numpy scalars serialize
+    return json.loads(df.to_json(orient='records'))
+
+
+def _conditional_response(dataset_id, endpoint, params, build, revision=None, lookup=get_dataset):
+    """ 304 when the client already holds this response, otherwise the JSON built from the dataset
+
+    revision identifies any other input the response depends on, such as the taxonomy. lookup returns what build
+    is called with, or None for an unknown dataset. Like the dashboard's checkbox, exclude_duplicates=true leaves
+    out the charges loaded twice by overlapping statements (see duplicates.py).
+    """
+    exclude_duplicates = request.args.get('exclude_duplicates', 'false').lower() == 'true'
+    params = dict(params, exclude_duplicates=exclude_duplicates)
+    etag = _etag(dataset_id, endpoint, params, revision)
+    # Checked before the lookup: the ETag stays valid even after the dataset has been evicted
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        data = lookup(dataset_id, exclude_duplicates)
+        if data is None:
+            return jsonify(error='Unknown dataset'), 404
+        response = jsonify(dataset_id=dataset_id, **params, **build(data))
+    response.set_etag(etag)
+    # Clients may keep the response but must revalidate it, which costs a 304 at most
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def category_rankings(df, ranked):
+    totals = df.groupby('Category')['Amount'].sum().sort_values(ascending=False).round(2)
+    totals = totals.to_frame().reset_index()
+    return {'top': _records(totals.head(ranked)),
+            'bottom': _records(totals.iloc[::-1].head(ranked))}
+
+
+def zip_totals(df):
+    totals = df.groupby('Zip Code')['Amount'].agg(['count', 'sum']).round(2)
+    totals = totals.rename(columns={'count': 'Transactions', 'sum': 'Amount'})
+    return {'zip_codes': _records(totals.sort_values('Amount', ascending=False).reset_index())}
+
+
+def merged_sketches(dataset_ids, exclude_duplicates=False):
+    """ Amount sketches of several datasets (comma-separated ids) merged into one, or None if any is unknown
+    """
+    sketches = [get_sketches(dataset_id, exclude_duplicates) for dataset_id in dataset_ids.split(',')]
+    if any(sketch is None for sketch in sketches):
+        return None
+    return reduce(SpendSketches.merge, sketches)
+
+
+def register_api_routes(server):
+    @server.route('/api/datasets/<dataset_id>/rankings', methods=['GET'])
+    def rankings(dataset_id):
+        ranked = request.args.get('ranked', DEFAULT_RANKED, type=int)
+        if ranked < 1:
+            return jsonify(error='ranked must be a positive integer'), 400
+        return _conditional_response(dataset_id, 'rankings', {'ranked': ranked},
+                                     lambda df: category_rankings(df, ranked))
+
+    @server.route('/api/datasets/<dataset_id>/forecasts', methods=['GET'])
+    def forecasts(dataset_id):
+        def build(df):
+            params = best_parameters(run_backtest(df))
+            forecasts_df = forecast_table(df, params)
+            forecasts_df = forecasts_df.join(params, on='Category')
+            return {'forecasts': _records(forecasts_df)}
+        return _conditional_response(dataset_id, 'forecasts', {}, build)
+
+    @server.route('/api/datasets/<dataset_id>/necessities', methods=['GET'])
+    def necessities(dataset_id):
+        return _conditional_response(dataset_id, 'necessities', {},
+                                     lambda df: {'necessities': _records(necessity_totals(df).round(2))},
+                                     revision=get_taxonomy().revision)
+
+    @server.route('/api/datasets/<dataset_id>/zip-totals', methods=['GET'])
+    def zip_code_totals(dataset_id):
+        return _conditional_response(dataset_id, 'zip-totals', {}, zip_totals)
+
+    @server.route('/api/datasets/<dataset_ids>/percentiles', methods=['GET'])
+    def percentiles(dataset_ids):
+        # Several statements (other files, other years) are combined by listing their ids, e.g. /api/datasets/a,b/
+        try:
+            qs = [float(q) for q in request.args.getlist('q')] or DEFAULT_QUANTILES
+        except ValueError:
+            return jsonify(error='q must be a number between 0 and 1'), 400
+        if not all(0 <= q <= 1 for q in qs):
+            return jsonify(error='q must be a number between 0 and 1'), 400
+        categories = request.args.getlist('category') or None
+        start, end = request.args.get('start'), request.args.get('end')
+        combined = request.args.get('combined', 'false').lower() == 'true'
+        try:
+            start, end = (pd.Period(month, freq='M') if month else None for month in (start, end))
+        except ValueError:
+            return jsonify(error='start and end must be months, e.g. 2023-01'), 400
+        params = {'q': qs, 'categories': categories, 'start': start and str(start), 'end': end and str(end),
+                  'combined': combined}
+
+        def build(sketches):
+            quantiles_df = sketches.quantiles(qs, categories, start, end, combined).round(2)
+            return {'percentiles': _records(quantiles_df.reset_index())}
+        return _conditional_response(dataset_ids, 'percentiles', params, build, lookup=merged_sketches)
+
+    @server.route('/api/datasets/<dataset_id>/projection', methods=['GET'])
+    def projection(dataset_id):
+        # Month-end totals as of the given date, by default the latest transaction
+        as_of = request.args.get('as_of')
+        try:
+            as_of = as_of and str(pd.Timestamp(as_of).date())
+        except ValueError:
+            return jsonify(error='as_of must be a date, e.g. 2023-01-15'), 400
+
+        def build(df):
+            projection_df = project_month_end(df, as_of)
+            # as_of echoes the request, which may leave it to the latest transaction
+            return {'projected_as_of': str(projection_df.attrs['as_of'].date()),
+                    'remaining_days': projection_df.attrs['remaining_days'],
+                    'projection': _records(projection_df)}
+        return _conditional_response(dataset_id, 'projection', {'as_of': as_of}, build)
@@ -1,6 +1,8 @@
 import base64
 import datetime
 import io
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import plotly.graph_objects as go
 import pgeocode
@@ -11,10 +13,11 @@ from funcs import clean_currency, create_forecast_recommendations_flagged, creat
     create_time_series, create_pie_chart, create_box_plot, create_geo_location_plot, \
     create_bar_chart_top_rankings, \
     create_bar_chart_bottom_rankings, create_bar_chart_days_analysis, create_line_plot, create_spending_by_location, \
-    create_heatmap
+    create_heatmap, create_bar_chart_top_merchants
 import dash
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ALL, ClientsideFunction
 from dash import dcc, html, dash_table
+from dash.exceptions import PreventUpdate
 import plotly.express as px
 
 import numpy as np
@@ -22,6 +25,22 @@ import pandas as pd
 
 from nbfuncs import nb_classifier_prediction
 from csv_3d_test import create_3D_scatter
+from outliers import OutlierDetector, create_outlier_alerts
+from merchants import canonicalize_merchants
+from currency import normalize_currency
+from recurring import create_recurring_charges
+from duplicates import create_duplicate_charges, duplicate_rows
+from projection import create_month_end_projection
+from backtest import run_backtest, best_parameters, create_backtest_table
+from comparison import create_period_comparison
+from uploads import register_upload_routes, spool_path, upload_info, remove_upload
+from excel import read_excel_statement
+from datasets import register_dataset, get_sketches, get_dataset, get_search_index, get_group_index, \
+    get_duplicate_rows
+from drilldown import describe_filters, filter_rows
+from api import register_api_routes
+from chunked import OUT_OF_CORE_BYTES, CHUNK_ROWS, clean_amounts, create_archive_summary
+from workers import start_workers
 
 external_stylesheets = [
     {
@@ -34,9 +53,11 @@ external_stylesheets = [
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets,
                 suppress_callback_exceptions=True)
 server = app.server
+register_upload_routes(server)
+register_api_routes(server)
 app.title = "Bank Statement Analytics: Understand Your Personal Finances!"
 
-app.layout = html.Div([  # this code section taken from Dash docs https://dash.plotly.com/dash-core-components/upload
+layout = html.Div([  # this code section taken from Dash docs https://dash.plotly.com/dash-core-components/upload
     html.Div(
         children=[
             html.P(children="🏦", className="header-emoji"),
@@ -74,6 +95,9 @@ app.layout = html.Div([  # this code section taken from Dash docs https://dash.p
                 # Allow multiple files to be uploaded
                 multiple=True
             ),
+            # Large statements: streamed to the server in chunks by assets/chunked_upload.js
+            html.Div(id='chunked-upload', style={'textAlign': 'center', 'margin': '0 auto 40px auto'}),
+            dcc.Store(id='upload-id'),
         ],
         className="upload",
     ),
@@ -92,22 +116,83 @@ app.layout = html.Div([  # this code section taken from Dash docs https://dash.p
         ],
         className="wrapper",
     ),
+
+    # Per-category outlier sketches carried across uploads, so each new statement is scored against history
+    dcc.Store(id='outlier-state', storage_type='session'),
 ])
 
 
-def parse_contents(contents, filename, date):
+def serve_layout():
+    # A fresh id on every page load, so a newer analysis supersedes only this session's own earlier ones
+    return html.Div([layout, dcc.Store(id='session-id', data=uuid.uuid4().hex)])
+
+
+app.layout = serve_layout
+
+
+# Rows per page of the preview table, which is paged and searched on the server
+PREVIEW_PAGE_SIZE = 5
+
+# Shown instead of the preview once its dataset has been evicted from the server (datasets.MAX_DATASETS)
+DATASET_EXPIRED = "This dataset has expired on the server. Re-upload the file to page and search it again."
+
+
+def preview_page(dataset_id, query, page, exclude_duplicates=False):
+    """ Records of one page of the preview table, the number of pages and the number of matching transactions;
+    None for the number of matches once the dataset has been evicted
+    """
+    df = get_dataset(dataset_id)
+    if df is None:
+        return [], 1, None
+    hidden = get_duplicate_rows(dataset_id) if exclude_duplicates else None
+    rows, matches = get_search_index(dataset_id).page(df, query, page, PREVIEW_PAGE_SIZE, hidden)
+    rows = rows.assign(Date=rows['Date'].dt.strftime('%Y-%m-%d'))
+    return rows.to_dict('records'), max(-(-matches // PREVIEW_PAGE_SIZE), 1), matches
+
+
+def parse_contents(contents, filename, date, detector):
     content_type, content_string = contents.split(',')
 
     decoded = base64.b64decode(content_string)
+    return parse_statement(io.BytesIO(decoded), filename, detector)
+
+
+def read_csv_statement(source):
+    """ Read a CSV statement CHUNK_ROWS rows at a time, making each chunk's amounts numeric as it is read, so the
+    raw text of the whole file is never held at once
+    """
+    chunks = []
+    for chunk in pd.read_csv(source, chunksize=CHUNK_ROWS):
+        chunk = chunk.loc[:, ~chunk.columns.str.contains('^Unnamed')]  # Removes Unnamed columns
+        chunks.append(chunk.assign(Amount=clean_amounts(chunk['Amount'])))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def parse_statement(source, filename, detector):
+    # source is either an in-memory buffer or the path of a spooled upload, which is parsed straight from disk
     try:
-        if 'csv' or 'CSV' in filename:
+        if filename.lower().endswith('.xlsx'):
+            # Streamed in read-only mode and cached by workbook hash
+            df = read_excel_statement(source)
+        elif filename.lower().endswith('.xls'):
+            # Legacy Excel format, which the streaming reader can't open
+            df = pd.read_excel(source)
+        else:
             # Assume that the user uploaded a CSV file
-            df = pd.read_csv(
-                io.StringIO(decoded.decode('utf-8')))
-            df = df.loc[:, ~df.columns.str.contains('^Unnamed')]  # Removes Unnamed columns
-        elif 'xls' or 'xlsx' in filename:
-            # Assume that the user uploaded an Excel file
-            df = pd.read_excel(io.BytesIO(decoded))
+            df = read_csv_statement(source)
+
+        # Every amount in the base currency from here on, converted by the transaction's country (see currency.py)
+        df = normalize_currency(df.assign(Amount=df['Amount'].apply(clean_currency).astype('float'),
+                                          Date=pd.to_datetime(df['Date'])))
+        df['Merchant'] = canonicalize_merchants(df['Description'])
+
+        # Cleaned copy kept on the server for the JSON API, addressed by its content hash
+        dataset_id = register_dataset(df)
+
+        # Score every transaction against its category's history as it is ingested; the id keeps a statement
+        # uploaded again from being counted twice
+        df['Outlier_Score'] = detector.update(pd.DataFrame().assign(
+            Date=df['Date'], Category=df['Category'], Amount=df['Amount']), dataset_id).round(2)
 
     except Exception as e:
         print(e)
@@ -115,6 +200,7 @@ def parse_contents(contents, filename, date):
             'There was an error processing this file.'
         ])
 
+    first_page, page_count, _ = preview_page(dataset_id, '', 0)
     return html.Div([
         html.Div(
             children=[
@@ -123,7 +209,7 @@ def parse_contents(contents, filename, date):
                     children=[
                         html.Div(children="Type of Analysis Performed", className="menu-title"),
                         dcc.Dropdown(id='analysis-type',
-                                     options=['All', 'Recommendations', 'Naive Bayes Text Classifier - Necessities', 'Time Series', 'Bar Chart', 'Heat Map', 'Pie Chart', 'Box Plot', 'Geo-Location', 'Spending by Location', '3-D Scatter']),
+                                     options=['All', 'Recommendations', 'Month-end Projection', 'Naive Bayes Text Classifier - Necessities', 'Time Series', 'Bar Chart', 'Year over Year', 'Recurring Charges', 'Duplicate Charges', 'Heat Map', 'Pie Chart', 'Box Plot', 'Outlier Alerts', 'Geo-Location', 'Spending by Location', '3-D Scatter']),
                     ]
                 ),
 
@@ -155,12 +241,30 @@ def parse_contents(contents, filename, date):
                     ]
                 ),
 
+                # EXCLUDE CONFIRMED DUPLICATES FROM EVERY ANALYSIS
+                html.Div(
+                    children=[
+                        dcc.Checklist(id='exclude-duplicates',
+                                      options=[{'label': 'Exclude duplicate charges', 'value': 'exclude'}],
+                                      value=[]),
+                    ]
+                ),
+
                 html.Div(
                     children=[
                         html.Button(id="submit-button", className='app-btn',
                                     children="Generate"),
                     ],
                 ),
+
+                # ACTIVE DRILL-DOWN (set by clicking a ranking bar, heat map cell or map marker)
+                html.Div(
+                    children=[
+                        html.Div(id='drilldown-filters', children="Click a chart to drill down"),
+                        html.Button(id="clear-drilldown", className='app-btn',
+                                    children="Clear filters"),
+                    ],
+                ),
             ],
             className="menu",
         ),
@@ -168,13 +272,26 @@ def parse_contents(contents, filename, date):
         html.Div(
             children=[
                 html.H4("File: " + filename),
+                html.Div("Dataset ID: " + dataset_id),
+
+                # SEARCH THE TRANSACTIONS (Description, City/State and Category, see search.py)
+                dcc.Input(id='search', type='search', debounce=True, className="dropdown",
+                          placeholder="Search transactions, e.g. whole foo"),
+                html.Div(id='search-matches'),
 
+                # Only the current page is sent; paging and search run on the server
                 dash_table.DataTable(
-                    data=df.to_dict('records'),
-                    columns=[{'name': i, 'id': i} for i in df.columns],
-                    page_size=5
+                    id='preview-table',
+                    data=first_page,
+                    columns=[{'name': i, 'id': i} for i in get_dataset(dataset_id).columns],
+                    page_action='custom',
+                    page_current=0,
+                    page_size=PREVIEW_PAGE_SIZE,
+                    page_count=page_count
                 ),
                 dcc.Store(id='stored-data', data=df.to_dict('records')),
+                dcc.Store(id='dataset-id', data=dataset_id),
+                dcc.Store(id='drilldown', data={}),
 
             ],
             className="wrapper",
@@ -183,25 +300,142 @@ def parse_contents(contents, filename, date):
 
 
 @app.callback(Output('output-datatable', 'children'),
+              Output('outlier-state', 'data'),
               Input('upload-data', 'contents'),
+              Input('upload-id', 'data'),
               State('upload-data', 'filename'),
-              State('upload-data', 'last_modified'))
-def update_output(list_of_contents, list_of_names, list_of_dates):
+              State('upload-data', 'last_modified'),
+              State('outlier-state', 'data'))
+def update_output(list_of_contents, upload, list_of_names, list_of_dates, outlier_state):
+    if dash.callback_context.triggered_id == 'upload-id' and upload is not None:
+        # Chunked upload: only the id travels through the callback, the file is read from the spool
+        info = upload_info(upload['upload_id'])
+        if info is None or not info['complete']:
+            return html.Div(['The upload of ' + upload['filename'] + ' is incomplete.']), dash.no_update
+        try:
+            if info['size'] > OUT_OF_CORE_BYTES and not info['filename'].lower().endswith(('.xls', '.xlsx')):
+                # Too large to hold as a DataFrame: stream it through the chunked aggregates instead
+                return [create_archive_summary(spool_path(upload['upload_id']), info['filename'])], dash.no_update
+            detector = OutlierDetector(outlier_state)
+            children = [parse_statement(spool_path(upload['upload_id']), info['filename'], detector)]
+            return children, detector.to_dict()
+        finally:
+            # Parsed, so the spooled file is no longer needed
+            remove_upload(upload['upload_id'])
+
     if list_of_contents is not None:
+        detector = OutlierDetector(outlier_state)
         children = [
-            parse_contents(c, n, d) for c, n, d in
+            parse_contents(c, n, d, detector) for c, n, d in
             zip(list_of_contents, list_of_names, list_of_dates)]
-        return children
+        return children, detector.to_dict()
+    return dash.no_update, dash.no_update
+
+
+@app.callback(Output('preview-table', 'data'),
+              Output('preview-table', 'page_count'),
+              Output('preview-table', 'page_current'),
+              Output('search-matches', 'children'),
+              Input('search', 'value'),
+              Input('preview-table', 'page_current'),
+              Input('exclude-duplicates', 'value'),
+              State('dataset-id', 'data'),
+              prevent_initial_call=True)
+def search_preview(query, page, exclude_duplicates, dataset_id):
+    # A new search, or showing or hiding the duplicates, starts again from the first page
+    if dash.callback_context.triggered_id in ('search', 'exclude-duplicates'):
+        page = 0
+    records, page_count, matches = preview_page(dataset_id, query, page or 0, bool(exclude_duplicates))
+    if matches is None:
+        return records, page_count, 0, DATASET_EXPIRED
+    return records, page_count, page, "{:,} matching transactions".format(matches) if query else ""
+
+
+# Changing the ranking only re-slices the charts already on the page, in assets/ranking.js
+app.clientside_callback(
+    ClientsideFunction(namespace='ranking', function_name='rerank'),
+    Output({'type': 'ranked-graph', 'index': ALL}, 'figure'),
+    Input('ranked', 'value'),
+    State({'type': 'ranked-graph', 'index': ALL}, 'figure'),
+    prevent_initial_call=True
+)
+
+
+# "All" builds its charts on this pool. The builders only read the ledger, and pandas and NumPy release the GIL in
+# much of their grouping and aggregation, so the charts overlap rather than queue behind each other.
+CHART_THREADS = 4
+
+_chart_pool = ThreadPoolExecutor(max_workers=CHART_THREADS)
+
+
+def build_all_charts(df, ranked, sketches, session):
+    """ Every chart of the "All" analysis, in page order
+    """
+    charts = [_chart_pool.submit(build, *args) for build, args in [
+        (create_time_series, (df,)),
+        (create_line_plot, (df, ranked)),
+        (create_bar_chart_top_rankings, (df, ranked)),
+        (create_bar_chart_bottom_rankings, (df, ranked)),
+        (create_bar_chart_top_merchants, (df, ranked)),
+        (create_heatmap, (df,)),
+        (create_bar_chart_days_analysis, (df,)),
+        (create_pie_chart, (df,)),
+        (create_box_plot, (df, sketches)),
+        (create_geo_location_plot, (df, session)),
+    ]]
+    # The forecasts need the backtest, which runs in this thread meanwhile
+    backtest_df = run_backtest(df)
+    return (create_forecast_recommendations_flagged(df, best_parameters(backtest_df), sketches),
+            create_backtest_table(backtest_df)) + tuple(chart.result() for chart in charts)
+
+
+# What a click on each drill-down chart selects, from the clicked point
+CLICK_FILTERS = {
+    'top-rankings': lambda point: {'Category': point['x']},
+    'bottom-rankings': lambda point: {'Category': point['x']},
+    'heatmap': lambda point: {'Category': point['y'], 'Month': point['x']},
+    'geo-location': lambda point: {'Zip Code': point['customdata']},
+}
+
+
+@app.callback(Output('drilldown', 'data'),
+              Output('drilldown-filters', 'children'),
+              Input({'type': 'ranked-graph', 'index': ALL}, 'clickData'),
+              Input({'type': 'drilldown-graph', 'index': ALL}, 'clickData'),
+              Input('clear-drilldown', 'n_clicks'),
+              State('drilldown', 'data'),
+              prevent_initial_call=True)
+def update_drilldown(ranked_clicks, drilldown_clicks, clear, filters):
+    triggered = dash.callback_context.triggered_id
+    if triggered == 'clear-drilldown':
+        return {}, "Click a chart to drill down"
+    click = dash.callback_context.triggered[0]['value']
+    if not click or triggered['index'] not in CLICK_FILTERS:
+        raise PreventUpdate
+    selection = CLICK_FILTERS[triggered['index']](click['points'][0])
+
+    filters = dict(filters or {})
+    if all(filters.get(dimension) == label for dimension, label in selection.items()):
+        # Clicking the current selection again removes it
+        for dimension in selection:
+            del filters[dimension]
+    else:
+        filters.update(selection)
+    return filters, "Showing " + describe_filters(filters) if filters else "Click a chart to drill down"
 
 
 @app.callback(Output('output-div', 'children'),
               Input('submit-button', 'n_clicks'),
+              Input('drilldown', 'data'),
               State('stored-data', 'data'),
               State('analysis-type', 'value'),
               State('ranked', 'value'),
-              State('zipcode', 'value')
+              State('zipcode', 'value'),
+              State('dataset-id', 'data'),
+              State('exclude-duplicates', 'value'),
+              State('session-id', 'data')
               )
-def make_graphs(n, data, analysis_type, ranked, zipcode):
+def make_graphs(n, drilldown, data, analysis_type, ranked, zipcode, dataset_id, exclude_duplicates, session):
     if n is None:
         return dash.no_update
     else:
@@ -209,12 +443,38 @@ def make_graphs(n, data, analysis_type, ranked, zipcode):
         df = df.loc[:, ~df.columns.str.contains('^Unnamed')]  # Removes Unnamed columns
         df['Amount'] = df['Amount'].apply(clean_currency).astype('float')
         df['Date'] = pd.to_datetime(df['Date'])
+        df['Merchant'] = df['Merchant'].astype('category')
+        exclude_duplicates = bool(exclude_duplicates) and analysis_type != 'Duplicate Charges'
+        # Built at upload; None once the dataset has been evicted, and the builders then sketch df themselves
+        sketches = get_sketches(dataset_id, exclude_duplicates)
+
+        rows = np.arange(len(df))
+        if drilldown:
+            # Rows of the selected category, month and zip code, from the dataset's precomputed group rows, or
+            # by scanning the ledger once the dataset has been evicted
+            groups = get_group_index(dataset_id)
+            rows = groups.select(drilldown) if groups is not None else filter_rows(df, drilldown)
+            sketches = None
+        if exclude_duplicates:
+            # Charges loaded twice by overlapping statements, found in the whole ledger (see duplicates.py)
+            duplicates = get_duplicate_rows(dataset_id)
+            if duplicates is None:
+                duplicates = duplicate_rows(df)
+            rows = rows[~duplicates[rows]]
+        df = df.iloc[rows].reset_index(drop=True)
+        if drilldown and df.empty:
+            return "No transactions match " + describe_filters(drilldown) + "."
 
         if analysis_type == 'Recommendations':
-            return create_forecast_recommendations_flagged(df)
+            backtest_df = run_backtest(df)
+            return create_forecast_recommendations_flagged(df, best_parameters(backtest_df), sketches), \
+                create_backtest_table(backtest_df)
+
+        elif analysis_type == 'Month-end Projection':
+            return create_month_end_projection(df)
 
         elif analysis_type == 'Naive Bayes Text Classifier - Necessities':
-            return nb_classifier_prediction(df)
+            return nb_classifier_prediction(df, session)
 
         elif analysis_type == 'Time Series':
             return create_time_series(df), create_line_plot(df, ranked)
@@ -222,8 +482,18 @@ def make_graphs(n, data, analysis_type, ranked, zipcode):
         elif analysis_type == 'Bar Chart':
             return create_bar_chart_top_rankings(df, ranked), \
                 create_bar_chart_bottom_rankings(df, ranked), \
+                create_bar_chart_top_merchants(df, ranked), \
                 create_bar_chart_days_analysis(df)
 
+        elif analysis_type == 'Year over Year':
+            return create_period_comparison(df)
+
+        elif analysis_type == 'Recurring Charges':
+            return create_recurring_charges(df)
+
+        elif analysis_type == 'Duplicate Charges':
+            return create_duplicate_charges(df)
+
         elif analysis_type == 'Heat Map':
             return create_heatmap(df)
 
@@ -231,29 +501,23 @@ def make_graphs(n, data, analysis_type, ranked, zipcode):
             return create_pie_chart(df)
 
         elif analysis_type == 'Box Plot':
-            return create_box_plot(df)
+            return create_box_plot(df, sketches)
+
+        elif analysis_type == 'Outlier Alerts':
+            return create_outlier_alerts(df)
 
         elif analysis_type == 'Geo-Location':
-            return create_geo_location_plot(df)
+            return create_geo_location_plot(df, session)
 
         elif analysis_type == 'Spending by Location':
-            return create_spending_by_location(df, zipcode)
+            return create_spending_by_location(df, zipcode, session)
 
         elif analysis_type == '3-D Scatter':
-            return create_3D_scatter(df)
+            return create_3D_scatter(df, zipcode, session=session)
 
         elif analysis_type == 'All':
-            return create_forecast_recommendations_flagged(df), \
-                create_time_series(df), \
-                create_line_plot(df, ranked), \
-                create_bar_chart_top_rankings(df, ranked), \
-                create_bar_chart_bottom_rankings(df, ranked), \
-                create_heatmap(df),\
-                create_bar_chart_days_analysis(df), \
-                create_pie_chart(df), \
-                create_box_plot(df), \
-                create_geo_location_plot(df), \
-
+            return build_all_charts(df, ranked, sketches, session)
 
 if __name__ == '__main__':
+    start_workers()
     app.run_server(debug=True)
\ No newline at end of file
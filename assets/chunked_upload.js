@@ -0,0 +1,82 @@
+// Chunked, resumable statement upload straight to the Flask server (see uploads.py).
+// Once the file is on the server only its upload id is handed to Dash through the 'upload-id' store.
+(function () {
+    var CHUNK_SIZE = 1024 * 1024;
+    var MAX_RETRIES = 5;
+
+    async function receivedBytes(uploadId) {
+        var response = await fetch('/upload/' + uploadId);
+        return (await response.json()).received;
+    }
+
+    async function sendFile(file, status) {
+        var response = await fetch('/upload', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size})
+        });
+        if (!response.ok) {
+            throw new Error((await response.json()).error);
+        }
+        var uploadId = (await response.json()).upload_id;
+
+        var offset = 0;
+        var retries = 0;
+        while (offset < file.size) {
+            var end = Math.min(offset + CHUNK_SIZE, file.size);
+            try {
+                response = await fetch('/upload/' + uploadId, {
+                    method: 'PUT',
+                    headers: {'Content-Range': 'bytes ' + offset + '-' + (end - 1) + '/' + file.size},
+                    body: file.slice(offset, end)
+                });
+                // 409 means the server holds a different offset, so carry on from there
+                if (!response.ok && response.status !== 409) {
+                    throw new Error(response.statusText);
+                }
+                offset = (await response.json()).received;
+                retries = 0;
+            } catch (err) {
+                if (++retries > MAX_RETRIES) {
+                    throw err;
+                }
+                await new Promise(function (resolve) { setTimeout(resolve, 500 * retries); });
+                offset = await receivedBytes(uploadId);
+            }
+            status.textContent = 'Uploading ' + file.name + ': ' + Math.round(100 * offset / file.size) + '%';
+        }
+        return uploadId;
+    }
+
+    function attach(container) {
+        container.dataset.ready = 'true';
+        var input = document.createElement('input');
+        input.type = 'file';
+        input.accept = '.csv,.CSV,.xls,.xlsx';
+        var status = document.createElement('div');
+        container.appendChild(input);
+        container.appendChild(status);
+
+        input.addEventListener('change', async function () {
+            var file = input.files[0];
+            if (!file) {
+                return;
+            }
+            try {
+                var uploadId = await sendFile(file, status);
+                status.textContent = 'Uploaded ' + file.name;
+                window.dash_clientside.set_props('upload-id', {data: {upload_id: uploadId, filename: file.name}});
+            } catch (err) {
+                status.textContent = 'Upload failed: ' + err.message;
+            }
+        });
+    }
+
+    // The container is rendered by Dash after this script has loaded
+    new MutationObserver(function () {
+        var container = document.getElementById('chunked-upload');
+        if (container && !container.dataset.ready) {
+            attach(container);
+        }
+    }).observe(document.documentElement, {childList: true, subtree: true});
+})();
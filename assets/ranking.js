@@ -0,0 +1,32 @@
+// Re-ranking of the ranked charts when the "Ranked Expenses" dropdown changes, entirely in the browser.
+// Every ranked figure carries its sorted entries and title template in layout.meta (see funcs.ranked_bar_figure).
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ranking: {
+        rerank: function (ranked, figures) {
+            if (!ranked) {
+                return window.dash_clientside.no_update;
+            }
+            return figures.map(function (figure) {
+                var meta = figure && figure.layout && figure.layout.meta;
+                if (!meta) {
+                    return window.dash_clientside.no_update;
+                }
+                var layout = Object.assign({}, figure.layout, {title: {text: meta.title.replace('{n}', ranked)}});
+                var data;
+                if (meta.kind === 'bar') {
+                    data = [Object.assign({}, figure.data[0], {
+                        x: meta.labels.slice(0, ranked),
+                        y: meta.values.slice(0, ranked),
+                        marker: {color: meta.colors.slice(0, ranked)}
+                    })];
+                } else {
+                    // Lines are already in ranking order; only their visibility changes
+                    data = figure.data.map(function (trace, i) {
+                        return Object.assign({}, trace, {visible: i < ranked});
+                    });
+                }
+                return Object.assign({}, figure, {data: data, layout: layout});
+            });
+        }
+    }
+});
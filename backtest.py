@@ -0,0 +1,141 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from dash import dcc
+
+from datasets import dataset_hash
+from workers import process_context
+
+# Parameter grid searched for every category; it includes the original window=4 and alpha=0.2
+WINDOWS = list(range(2, 13))
+ALPHAS = [0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+DEFAULT_WINDOW = 4
+DEFAULT_ALPHA = 0.2
+
+# Every parameter is scored on the same forecast origins, so the first origin follows the largest window
+MIN_ORIGINS = 3
+
+# Small ledgers are faster to backtest inline than to ship to worker processes
+PARALLEL_MIN_ROWS = 200000
+MAX_WORKERS = os.cpu_count() or 1
+
+MAX_CACHED_DATASETS = 16
+
+_executor = None
+_cache = OrderedDict()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Never forked from the threaded web server (see workers.process_context)
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=process_context())
+    return _executor
+
+
+def _backtest_task(task):
+    """ Rolling-origin one-step-ahead MAE of one category for one forecasting method over a list of parameters
+    """
+    category, amounts, method, params = task
+    start = max(WINDOWS)
+    actual = amounts[start:]
+    results = []
+    if method == 'SMA':
+        cum = np.concatenate([[0.0], np.cumsum(amounts)])
+        for window in params:
+            # Mean of the `window` amounts before every origin, straight from the cumulative sums
+            forecast = (cum[start:-1] - cum[start - window:-1 - window]) / window
+            results.append((category, method, window, np.abs(actual - forecast).mean()))
+    else:
+        series = pd.Series(amounts)
+        for alpha in params:
+            forecast = series.ewm(alpha=alpha).mean().to_numpy()[start - 1:-1]
+            results.append((category, method, alpha, np.abs(actual - forecast).mean()))
+    return results
+
+
+def run_backtest(df):
+    """ Evaluate every SMA window and ES alpha per category, cached per dataset hash
+    """
+    key = dataset_hash(df)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    tasks = []
+    # A blank amount would make every error of its category NaN
+    for category, amounts in df.dropna(subset=['Amount']).groupby('Category')['Amount']:
+        amounts = amounts.to_numpy(dtype='float64')
+        if len(amounts) < max(WINDOWS) + MIN_ORIGINS:
+            continue
+        # One task per category and method, split further so a single large category still spreads out
+        for method, grid in (('SMA', WINDOWS), ('ES', ALPHAS)):
+            for chunk in np.array_split(np.array(grid), 2):
+                tasks.append((category, amounts, method, chunk.tolist()))
+
+    if len(df) >= PARALLEL_MIN_ROWS and MAX_WORKERS > 1:
+        results = _get_executor().map(_backtest_task, tasks)
+    else:
+        results = map(_backtest_task, tasks)
+    results_df = pd.DataFrame([row for rows in results for row in rows],
+                              columns=['Category', 'Method', 'Parameter', 'MAE'])
+
+    _cache[key] = results_df
+    if len(_cache) > MAX_CACHED_DATASETS:
+        _cache.popitem(last=False)
+    return results_df
+
+
+def best_parameters(results_df):
+    """ Best window and alpha per category, indexed by Category with Window and Alpha columns
+    """
+    results_df = results_df.dropna(subset=['MAE'])
+    if results_df.empty:
+        return pd.DataFrame(columns=['Window', 'Alpha'], index=pd.Index([], name='Category'))
+    best = results_df.loc[results_df.groupby(['Category', 'Method'])['MAE'].idxmin()]
+    best = best.pivot(index='Category', columns='Method', values='Parameter')
+    best = best.rename(columns={'SMA': 'Window', 'ES': 'Alpha'}).dropna(subset=['Window', 'Alpha'])
+    best['Window'] = best['Window'].astype('int64')
+    return best[['Window', 'Alpha']]
+
+
+def create_backtest_table(results_df):
+    if results_df.empty:
+        return 'Not enough transactions in any category to backtest the forecasts'
+    best = results_df.loc[results_df.groupby(['Category', 'Method'])['MAE'].idxmin()]
+    best = best.pivot(index='Category', columns='Method', values=['Parameter', 'MAE'])
+    defaults = results_df[((results_df['Method'] == 'SMA') & (results_df['Parameter'] == DEFAULT_WINDOW)) |
+                          ((results_df['Method'] == 'ES') & (results_df['Parameter'] == DEFAULT_ALPHA))]
+    defaults = defaults.pivot(index='Category', columns='Method', values='MAE')
+
+    table_df = pd.DataFrame().assign(Category=best.index,
+                                     Window=best[('Parameter', 'SMA')].astype('int64').to_numpy(),
+                                     SMA_MAE=best[('MAE', 'SMA')].round(2).to_numpy(),
+                                     Default_SMA_MAE=defaults['SMA'].reindex(best.index).round(2).to_numpy(),
+                                     Alpha=best[('Parameter', 'ES')].to_numpy(),
+                                     ES_MAE=best[('MAE', 'ES')].round(2).to_numpy(),
+                                     Default_ES_MAE=defaults['ES'].reindex(best.index).round(2).to_numpy())
+
+    backtest_fig = go.Figure(data=[go.Table(
+        header=dict(values=['Category', 'Best SMA Window', 'SMA MAE', 'MAE at Window ' + str(DEFAULT_WINDOW),
+                            'Best ES Alpha', 'ES MAE', 'MAE at Alpha ' + str(DEFAULT_ALPHA)],
+                    fill_color='#004c6d',
+                    font_color='white',
+                    align='left'),
+        cells=dict(
+            values=[table_df.Category, table_df.Window, table_df.SMA_MAE, table_df.Default_SMA_MAE,
+                    table_df.Alpha, table_df.ES_MAE, table_df.Default_ES_MAE],
+            fill_color='#a7b8c6',
+            font_color='black',
+            align='left')),
+    ])
+
+    backtest_fig.update_layout(
+        title='Backtested forecast parameters (rolling-origin one-step-ahead mean absolute error)',
+        height=600,
+    )
+    return dcc.Graph(figure=backtest_fig)
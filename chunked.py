@@ -0,0 +1,174 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+from dash import dcc, html
+
+from backtest import DEFAULT_WINDOW, DEFAULT_ALPHA
+from funcs import MAX_RANKED, ranked_bar_figure, create_pie_chart, create_monthly_heatmap, create_days_bar_chart, \
+    create_flagged_forecast_table
+from currency import normalize_currency
+from merchants import canonicalize_merchants
+from percentiles import SpendSketches
+
+# Out-of-core mode for archives too large to load as one DataFrame: the file is streamed CHUNK_ROWS rows at a
+# time and only small per-category, per-month, per-zip and per-merchant aggregates are kept, so peak memory
+# follows the chunk size rather than the file size.
+CHUNK_ROWS = 100000
+
+# Spooled CSV uploads above this size are summarized this way instead of being parsed into the interactive view
+OUT_OF_CORE_BYTES = 256 * 1024 ** 2
+
+COLUMNS = ['Date', 'Description', 'Amount', 'Zip Code', 'Country', 'Category']
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def _add(a, b):
+    # An empty aggregate has no index levels to align on
+    if a.empty:
+        return b
+    if b.empty:
+        return a
+    return a.add(b, fill_value=0)
+
+
+class LedgerAggregate:
+    """ Mergeable summary of a run of consecutive transactions
+
+    Every field is a sum except the two forecast states, which depend on order: the exponential smoothing state
+    is kept as the numerator and denominator of pandas' adjusted EWM mean, and the moving average keeps the last
+    `window` amounts of every category. merge() therefore expects `later` to follow this run in the file.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, alpha=DEFAULT_ALPHA):
+        self.window = window
+        self.alpha = alpha
+        self.rows = 0
+        self.category_month = pd.Series(dtype='float64')
+        self.category_counts = pd.Series(dtype='int64')
+        self.zip_totals = pd.DataFrame(columns=['Amount', 'Transactions'], dtype='float64')
+        self.merchant_totals = pd.Series(dtype='float64')
+        self.weekday_counts = np.zeros(7, dtype='int64')
+        self.ewm_num = pd.Series(dtype='float64')
+        self.ewm_den = pd.Series(dtype='float64')
+        self.tails = {}
+        self.sketches = SpendSketches()
+
+    @classmethod
+    def from_frame(cls, df, window=DEFAULT_WINDOW, alpha=DEFAULT_ALPHA):
+        """ Aggregate of one chunk, with Amount already numeric and Date already parsed
+        """
+        agg = cls(window, alpha)
+        agg.rows = len(df)
+        category = df['Category'].fillna('Uncategorized')
+        amounts = df['Amount']
+
+        agg.category_month = amounts.groupby([category, df['Date'].dt.to_period('M')]).sum()
+        agg.category_counts = amounts.groupby(category).size()
+        agg.zip_totals = amounts.groupby(df['Zip Code'].astype(str)).agg(['sum', 'count'])
+        agg.zip_totals.columns = ['Amount', 'Transactions']
+        agg.merchant_totals = amounts.groupby(canonicalize_merchants(df['Description']), observed=True).sum()
+        agg.weekday_counts = np.bincount(df['Date'].dt.dayofweek, minlength=7)
+
+        # Weight (1 - alpha) ** (number of later transactions in the same category)
+        position = category.groupby(category).cumcount()
+        weights = (1 - agg.alpha) ** (category.map(agg.category_counts) - 1 - position)
+        agg.ewm_num = (weights * amounts).groupby(category).sum()
+        agg.ewm_den = weights.groupby(category).sum()
+        agg.tails = {name: tail.to_numpy() for name, tail in amounts.groupby(category).tail(window).groupby(category)}
+        agg.sketches = SpendSketches.from_frame(df)
+        return agg
+
+    def merge(self, later):
+        merged = LedgerAggregate(self.window, self.alpha)
+        merged.rows = self.rows + later.rows
+        merged.category_month = _add(self.category_month, later.category_month)
+        merged.category_counts = _add(self.category_counts, later.category_counts)
+        merged.zip_totals = _add(self.zip_totals, later.zip_totals)
+        merged.merchant_totals = _add(self.merchant_totals, later.merchant_totals)
+        merged.weekday_counts = self.weekday_counts + later.weekday_counts
+
+        # The earlier run's smoothing state decays once per transaction of the later run
+        decay = (1 - self.alpha) ** later.category_counts.reindex(self.ewm_num.index, fill_value=0)
+        merged.ewm_num = _add(self.ewm_num * decay, later.ewm_num)
+        merged.ewm_den = _add(self.ewm_den * decay, later.ewm_den)
+        merged.tails = dict(self.tails)
+        for name, tail in later.tails.items():
+            merged.tails[name] = np.concatenate([self.tails.get(name, tail[:0]), tail])[-self.window:]
+        merged.sketches = self.sketches.merge(later.sketches)
+        return merged
+
+    def category_totals(self):
+        return self.category_month.groupby(level=0).sum().sort_values(ascending=False)
+
+    def forecasts(self):
+        """ Same table as funcs.forecast_table with the default window and alpha
+        """
+        totals = self.category_month.groupby(level=0).sum()
+        forecasts = pd.DataFrame().assign(Category=totals.index,
+                                          Average=(totals / self.category_counts.reindex(totals.index)).to_numpy(),
+                                          SMA=[self.tails[name].mean() if len(self.tails[name]) == self.window
+                                               else np.nan for name in totals.index],
+                                          ES=(self.ewm_num / self.ewm_den).reindex(totals.index).to_numpy())
+        forecasts['Flagged_SMA'] = np.where(forecasts['SMA'] > forecasts['Average'], 'Yes', 'No')
+        forecasts['Flagged_ES'] = np.where(forecasts['ES'] > forecasts['Average'], 'Yes', 'No')
+        forecasts['pct_change_SMA'] = (forecasts['SMA'] - forecasts['Average']) / forecasts['Average'] * 100
+        forecasts['pct_change_ES'] = (forecasts['ES'] - forecasts['Average']) / forecasts['Average'] * 100
+        columns = ['Average', 'SMA', 'ES', 'pct_change_SMA', 'pct_change_ES']
+        forecasts[columns] = forecasts[columns].round(2)
+        return forecasts
+
+
+def clean_amounts(amounts):
+    # Vectorized clean_currency
+    if amounts.dtype == object:
+        amounts = amounts.astype(str).str.replace('[$,]', '', regex=True)
+    return pd.to_numeric(amounts, errors='coerce').astype('float64')
+
+
+def read_chunks(source, chunk_rows=CHUNK_ROWS):
+    for chunk in pd.read_csv(source, usecols=lambda name: name in COLUMNS, chunksize=chunk_rows,
+                             dtype={'Zip Code': str}):
+        chunk['Amount'] = clean_amounts(chunk['Amount'])
+        chunk['Date'] = pd.to_datetime(chunk['Date'])
+        # Converted chunk by chunk, so the aggregates add up amounts in one currency
+        yield normalize_currency(chunk).dropna(subset=['Date', 'Amount'])
+
+
+def aggregate_csv(source, chunk_rows=CHUNK_ROWS):
+    """ Stream a CSV statement and fold every chunk's aggregate into one
+    """
+    partials = (LedgerAggregate.from_frame(chunk) for chunk in read_chunks(source, chunk_rows))
+    return reduce(LedgerAggregate.merge, partials, LedgerAggregate())
+
+
+def create_archive_summary(source, filename, ranked=5):
+    """ The summary charts of a statement, computed out of core
+    """
+    agg = aggregate_csv(source)
+    totals = agg.category_totals()
+    merchants = agg.merchant_totals.sort_values(ascending=False)
+    bottom = totals.iloc[::-1]
+
+    heatmap_df = agg.category_month.unstack(level=1).sort_index(axis=1)
+    heatmap_df.columns = heatmap_df.columns.strftime('%Y-%m')
+    days_df = pd.DataFrame().assign(Day_of_Week=DAYS_OF_WEEK, Amount=agg.weekday_counts)
+    pie_df = pd.DataFrame().assign(Category=totals.index, Amount=totals.to_numpy())
+
+    return html.Div([
+        html.H4("File: " + filename),
+        html.Div("{:,} transactions summarized in chunks of {:,} rows".format(agg.rows, CHUNK_ROWS)),
+        create_flagged_forecast_table(agg.forecasts(), agg.sketches.quantiles([0.5, 0.9])),
+        dcc.Graph(id={'type': 'ranked-graph', 'index': 'top-rankings'},
+                  figure=ranked_bar_figure(totals.index[:MAX_RANKED].tolist(), totals.to_numpy(), ranked,
+                                           "What are your top {n} rankings?", 'Category')),
+        dcc.Graph(id={'type': 'ranked-graph', 'index': 'bottom-rankings'},
+                  figure=ranked_bar_figure(bottom.index[:MAX_RANKED].tolist(), bottom.to_numpy(), ranked,
+                                           "What are your bottom {n} rankings?", 'Category')),
+        dcc.Graph(id={'type': 'ranked-graph', 'index': 'top-merchants'},
+                  figure=ranked_bar_figure(merchants.index[:MAX_RANKED].tolist(), merchants.to_numpy(), ranked,
+                                           "Which {n} merchants do you spend the most at?", 'Merchant')),
+        create_monthly_heatmap(heatmap_df),
+        create_days_bar_chart(days_df),
+        create_pie_chart(pie_df),
+    ], className="wrapper")
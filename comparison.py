@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from dash import dcc
+
+from figspec import figure, bar_trace, line_trace
+from funcs import LINE_COLORS
+
+
+def monthly_cumulative(df):
+    """ Dense Category x Month spend matrix turned into cumulative sums along the months
+
+    Returns the categories, the months and a (categories, months + 1) array whose column t holds each category's
+    spend over the first t months, so the total of any month range is one column difference.
+    """
+    # Undated rows belong to no month, and blank amounts would turn a running total into NaN
+    df = df.dropna(subset=['Date', 'Amount'])
+    categories, category_codes = np.unique(df['Category'].astype(str).to_numpy(), return_inverse=True)
+    month_numbers = (df['Date'].dt.year * 12 + df['Date'].dt.month - 1).to_numpy(dtype='int64')
+    first_month = month_numbers.min()
+    n_months = month_numbers.max() - first_month + 1
+
+    matrix = np.bincount(category_codes * n_months + (month_numbers - first_month),
+                         weights=df['Amount'].to_numpy(dtype='float64'),
+                         minlength=len(categories) * n_months).reshape(len(categories), n_months)
+    cumulative = np.zeros((len(categories), n_months + 1))
+    np.cumsum(matrix, axis=1, out=cumulative[:, 1:])
+
+    months = pd.period_range(pd.Period(year=first_month // 12, month=first_month % 12 + 1, freq='M'),
+                             periods=n_months, freq='M')
+    return categories, months, cumulative
+
+
+def period_totals(cumulative, start, stop):
+    """ Spend per category over months [start, stop), NaN when the history doesn't cover all of those months
+    """
+    if start < 0 or stop > cumulative.shape[1] - 1:
+        return np.full(cumulative.shape[0], np.nan)
+    return cumulative[:, stop] - cumulative[:, start]
+
+
+def rolling_totals(cumulative, window=12):
+    """ Spend per category over the `window` months ending at every month, NaN until there are that many
+    """
+    month_ends = np.arange(1, cumulative.shape[1])
+    rolling = cumulative[:, month_ends] - cumulative[:, np.maximum(month_ends - window, 0)]
+    rolling[:, month_ends < window] = np.nan
+    return rolling
+
+
+def percent_change(current, previous):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+
+
+def compare_periods(categories, months, cumulative):
+    """ This month, the year to date and the trailing 12 months of every category against the year before; a
+    period the history doesn't fully cover is NaN, and so is its change
+    """
+    latest = len(months) - 1
+    year_start = latest - (months[-1].month - 1)
+
+    this_month = period_totals(cumulative, latest, latest + 1)
+    last_year_month = period_totals(cumulative, latest - 12, latest - 11)
+    ytd = period_totals(cumulative, year_start, latest + 1)
+    last_ytd = period_totals(cumulative, year_start - 12, latest - 11)
+    trailing = period_totals(cumulative, latest - 11, latest + 1)
+    prior_trailing = period_totals(cumulative, latest - 23, latest - 11)
+
+    comparison_df = pd.DataFrame().assign(Category=categories,
+                                          This_Month=this_month, Last_Year_Month=last_year_month,
+                                          Month_Change=percent_change(this_month, last_year_month),
+                                          YTD=ytd, Last_YTD=last_ytd, YTD_Change=percent_change(ytd, last_ytd),
+                                          Trailing_12M=trailing, Prior_12M=prior_trailing,
+                                          Trailing_Change=percent_change(trailing, prior_trailing))
+    return comparison_df.sort_values('Trailing_12M', ascending=False).round(2)
+
+
+def create_period_comparison(df):
+    categories, months, cumulative = monthly_cumulative(df)
+    comparison_df = compare_periods(categories, months, cumulative)
+
+    this_month_label = months[-1].strftime('%b %Y')
+    last_year_label = (months[-1] - 12).strftime('%b %Y')
+    comparison_fig = go.Figure(data=[go.Table(
+        header=dict(values=['Category', this_month_label, last_year_label, 'Change %',
+                            'YTD ' + str(months[-1].year), 'YTD ' + str(months[-1].year - 1), 'Change %',
+                            'Trailing 12 Months', 'Prior 12 Months', 'Change %'],
+                    fill_color='#004c6d',
+                    font_color='white',
+                    align='left'),
+        cells=dict(
+            values=[comparison_df[column].astype(object).where(comparison_df[column].notna(), 'n/a')
+                    for column in comparison_df.columns],
+            fill_color='#a7b8c6',
+            font_color='black',
+            align='left')),
+    ])
+    comparison_fig.update_layout(
+        title='How does my spending compare with the same period last year?',
+        height=600,
+    )
+
+    ytd_fig = figure([bar_trace(comparison_df['Category'], comparison_df['YTD'].to_numpy(), '#004c6d',
+                                name='YTD ' + str(months[-1].year), showlegend=True),
+                      bar_trace(comparison_df['Category'], comparison_df['Last_YTD'].to_numpy(), '#9f1853',
+                                name='YTD ' + str(months[-1].year - 1), showlegend=True)],
+                     'Year to date through ' + months[-1].strftime('%B') + ' vs. the same months last year',
+                     barmode='group', xaxis=dict(title={'text': 'Category'}), yaxis=dict(title={'text': 'Amount'}))
+
+    # Rolling 12-month totals for every month straight from the cumulative sums, from the 12th month on
+    rolling = rolling_totals(cumulative)
+    month_starts = months.to_timestamp().to_numpy()
+    traces = []
+    for i, category in enumerate(comparison_df['Category'].head(len(LINE_COLORS))):
+        row = np.searchsorted(categories, category)
+        traces.append(line_trace(month_starts, rolling[row], category, LINE_COLORS[i]))
+    rolling_fig = figure(traces, 'Rolling 12-month spend by category', xaxis=dict(type='date'),
+                         yaxis=dict(title={'text': 'Trailing 12-month total'}))
+
+    return dcc.Graph(figure=comparison_fig), dcc.Graph(figure=ytd_fig), dcc.Graph(figure=rolling_fig)
@@ -1,6 +1,5 @@
 import plotly.express as px
 import plotly.graph_objects as go
-import pgeocode
 import geopandas as gpd
 from geopandas import GeoDataFrame
 
@@ -11,6 +10,11 @@ import plotly.express as px
 
 import numpy as np
 import pandas as pd
+
+from proximity import zip_to_number, zip_centroids, haversine_miles
+from workers import TaskTimeout
+
+
 def column_names(filename):
     column_names = ['Date', 'Description', 'Amount', 'Address',
                     'City/State', 'Zip Code', 'Country', 'Category']
@@ -19,10 +23,76 @@ def column_names(filename):
     df = df.drop(df.index[0])
     return df
 
-def create_3D_scatter(df):
-    line_2df = df.groupby(['Category', 'Date', 'Zip Code'])['Amount'].sum().to_frame().reset_index()
-    _3dscatter_fig = px.scatter_3d(line_2df, x = 'Date', y = 'Zip Code', z = 'Amount', color='Category',
+# Upper bound on the number of points sent to the WebGL scene, whatever the length of the history
+POINT_BUDGET = 5000
+AXIS_TICKS = 6
+
+SCATTER_COLORS = ['#004c6d', '#9f1853', '#198038', '#b28600', '#8a3800', '#1192e8',
+                  '#ff7c43', '#005d5d', '#009d9a', '#012749']
+
+
+def sample_per_category(scatter_df, point_budget):
+    """ Stratified sample of at most point_budget rows: every category's smallest and largest amount, and the rest
+    of the budget shared among the other rows in proportion to each category's size
+
+    When the extremes alone don't fit, those of the largest categories are kept.
+    """
+    if len(scatter_df) <= point_budget:
+        return scatter_df
+    grouped = scatter_df.groupby('Category')['Amount']
+    by_size = grouped.size().sort_values(ascending=False, kind='stable').index
+    extremes = pd.concat([grouped.idxmin(), grouped.idxmax()]).loc[by_size].unique()[:point_budget]
+
+    rest = scatter_df.drop(index=extremes).sample(frac=1, random_state=0)  # fixed seed, so the scene is stable
+    sizes = rest.groupby('Category')['Amount'].transform('size')
+    quota = np.floor((point_budget - len(extremes)) * sizes / max(len(rest), 1))
+    sampled = rest.index[(rest.groupby('Category').cumcount() < quota).to_numpy()]
+    return scatter_df[scatter_df.index.isin(sampled) | scatter_df.index.isin(extremes)]
+
+
+def create_3D_scatter(df, zipcode=None, point_budget=POINT_BUDGET, session=None):
+    scatter_df = df.groupby(['Category', 'Date', 'Zip Code'])['Amount'].sum().to_frame().reset_index()
+    scatter_df['Zip'] = zip_to_number(scatter_df['Zip Code'])
+
+    # With a home zip code the y axis becomes the distance from home, from the zip centroids geocoded once per
+    # distinct zip in an analysis worker (see proximity.py)
+    y_title = 'Zip Code'
+    if zipcode is not None and len(zipcode) >= 5:
+        zips = scatter_df['Zip'].dropna().unique()
+        try:
+            centroids = zip_centroids([zipcode[:5]] + ['%05d' % z for z in zips],
+                                      key=session and ('3-d-scatter', session))
+        except TaskTimeout as e:
+            return str(e)
+        home, centroids = centroids[0], centroids[1:]
+        if np.isnan(home).any():
+            return 'Zipcode ' + zipcode[:5] + ' could not be located'
+        miles = haversine_miles(centroids[:, 0], centroids[:, 1], home[0], home[1])
+        scatter_df['Zip'] = scatter_df['Zip'].map(pd.Series(miles, index=zips))
+        y_title = 'Miles from ' + zipcode[:5]
+    scatter_df = scatter_df.dropna(subset=['Zip'])
+    scatter_df = sample_per_category(scatter_df, point_budget)
+
+    # Dates go out as float32 days since the first transaction, which keeps the payload compact
+    first_date = scatter_df['Date'].min()
+    days = (scatter_df['Date'] - first_date).dt.days.to_numpy(dtype='float32')
+    zips = scatter_df['Zip'].to_numpy(dtype='float32')
+    amounts = scatter_df['Amount'].to_numpy(dtype='float32')
+    categories = scatter_df['Category'].to_numpy()
+
+    _3dscatter_fig = go.Figure()
+    for i, category in enumerate(np.unique(categories)):
+        mask = categories == category
+        _3dscatter_fig.add_trace(go.Scatter3d(x=days[mask], y=zips[mask], z=amounts[mask], name=category,
+                                              mode='markers',
+                                              marker=dict(size=3, color=SCATTER_COLORS[i % len(SCATTER_COLORS)])))
+
+    tick_days = np.linspace(0, days.max() if len(days) else 0, AXIS_TICKS).round()
+    _3dscatter_fig.update_layout(
         title="What does a plot of my transactions by category look like?",
-            color_discrete_sequence=['#004c6d', '#9f1853', '#198038', '#b28600', '#8a3800', '#1192e8',
-                                    '#ff7c43', '#005d5d', '#009d9a', '#012749'])
-    return dcc.Graph(figure=  _3dscatter_fig)
\ No newline at end of file
+        legend_title_text='Category',
+        scene=dict(xaxis=dict(title='Date', tickvals=tick_days,
+                              ticktext=(first_date + pd.to_timedelta(tick_days, unit='D')).strftime('%Y-%m-%d')),
+                   yaxis=dict(title=y_title),
+                   zaxis=dict(title='Amount')))
+    return dcc.Graph(figure=_3dscatter_fig)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from datafiles import reloaded
+
+# Every amount is converted to BASE_CURRENCY as it is ingested. A transaction's currency follows its Country
+# through COUNTRIES_PATH, and its rate is the latest one on or before its date in RATES_PATH, which holds the
+# value of one unit of each currency in the base currency (Date,Currency,Rate; any spacing of dates, e.g. daily).
+# Edit or replace either CSV to change them; they are reloaded whenever the file changes.
+BASE_CURRENCY = 'USD'
+RATES_PATH = 'data/fx_rates.csv'
+COUNTRIES_PATH = 'data/currencies.csv'
+
+def load_rates(path=RATES_PATH):
+    rates = pd.read_csv(path)
+    rates = rates.assign(Date=pd.to_datetime(rates['Date']), Currency=rates['Currency'].str.strip().str.upper(),
+                         Rate=pd.to_numeric(rates['Rate'], errors='coerce'))
+    return rates.dropna(subset=['Date', 'Rate']).sort_values('Date', kind='stable').reset_index(drop=True)
+
+
+def load_countries(path=COUNTRIES_PATH):
+    countries = pd.read_csv(path)
+    return pd.Series(countries['Currency'].str.strip().str.upper().to_numpy(),
+                     index=countries['Country'].str.strip().str.upper()).groupby(level=0).last()
+
+
+def get_rates(path=RATES_PATH):
+    """ The rate table sorted by date, reloaded only when the file has changed since it was last read
+    """
+    return reloaded(path, load_rates)
+
+
+def get_countries(path=COUNTRIES_PATH):
+    """ Currency of every country, indexed by upper-case country name
+    """
+    return reloaded(path, load_countries)
+
+
+def currency_of(countries, country_currencies=None):
+    """ Currency of every transaction from its country; missing or unlisted countries are in the base currency
+    """
+    country_currencies = get_countries() if country_currencies is None else country_currencies
+    # One lookup per distinct country; missing ones get the base currency appended last
+    codes, names = pd.factorize(pd.Series(countries).astype(object))
+    names = pd.Index(names).astype(str).str.strip().str.upper()
+    lookup = country_currencies.reindex(names).fillna(BASE_CURRENCY).to_numpy(dtype=object)
+    return np.append(lookup, BASE_CURRENCY)[codes]
+
+
+def to_base_currency(amounts, dates, currencies, rates=None):
+    """ amounts converted to the base currency at the latest rate of their currency on or before their date
+
+    Base currency rows are left as they are. The rest are matched to the rate table in one as-of merge on date
+    (by currency) after a single sort, so the cost is a sort of the foreign rows rather than one lookup per row.
+    A transaction older than the table takes its currency's earliest rate, and an undated one becomes NaN. Raises
+    ValueError for currencies the table has no rate for.
+    """
+    rates = get_rates() if rates is None else rates
+    amounts = np.asarray(amounts, dtype='float64')
+    currencies = np.asarray(currencies, dtype=object)
+    foreign = np.flatnonzero(currencies != BASE_CURRENCY)
+    if not len(foreign):
+        return amounts
+
+    missing = sorted(set(currencies[foreign]) - set(rates['Currency']))
+    if missing:
+        raise ValueError('No exchange rates to {} for {}'.format(BASE_CURRENCY, ', '.join(missing)))
+
+    left = pd.DataFrame({'Date': pd.to_datetime(np.asarray(dates)[foreign]), 'Currency': currencies[foreign],
+                         'Row': foreign})
+    converted = amounts.copy()
+    converted[left.loc[left['Date'].isna(), 'Row'].to_numpy()] = np.nan
+    left = left.dropna(subset=['Date']).sort_values('Date', kind='stable')
+    matched = pd.merge_asof(left, rates[['Date', 'Currency', 'Rate']], on='Date', by='Currency',
+                            direction='backward')
+    first_rates = rates.groupby('Currency')['Rate'].first()
+    matched_rates = matched['Rate'].fillna(matched['Currency'].map(first_rates)).to_numpy()
+
+    rows = matched['Row'].to_numpy()
+    converted[rows] = (amounts[rows] * matched_rates).round(2)
+    return converted
+
+
+def normalize_currency(df):
+    """ df with Amount in the base currency, Amount already numeric and Date already parsed
+
+    The amount as charged is kept in Original_Amount, next to its Currency.
+    """
+    countries = df['Country'] if 'Country' in df else pd.Series(np.nan, index=df.index)
+    currencies = currency_of(countries)
+    return df.assign(Currency=currencies, Original_Amount=df['Amount'],
+                     Amount=to_base_currency(df['Amount'], df['Date'], currencies))
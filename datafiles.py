@@ -0,0 +1,13 @@
+import os
+
+# The editable tables under data/ (taxonomy, FX rates, country currencies), each kept as loaded by path
+_loaded = {}
+
+
+def reloaded(path, load):
+    """ load(path), called again only when the file has changed since it was last loaded
+    """
+    mtime = os.path.getmtime(path)
+    if path not in _loaded or _loaded[path][0] != mtime:
+        _loaded[path] = (mtime, load(path))
+    return _loaded[path][1]
@@ -0,0 +1,97 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from drilldown import GroupIndex
+from duplicates import duplicate_rows
+from percentiles import SpendSketches
+from search import SearchIndex
+
+
+def dataset_hash(df, columns=('Date', 'Category', 'Amount')):
+    """ Stable content hash of a ledger, used to key anything cached per dataset
+    """
+    columns = [column for column in columns if column in df.columns]
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+
+# Parsed ledgers kept in this process so the JSON API (api.py) can serve them by id without the browser
+# re-sending the data; the oldest ones are dropped first. Each is kept with its amount sketches (percentiles.py),
+# built once here at ingestion.
+MAX_DATASETS = 16
+
+# What a statement holds once ingested, the same in every session. Columns that depend on the session, like the
+# outlier scores computed against that session's earlier uploads, are neither kept nor hashed, so the same
+# statement gets the same id (and the same ETags) everywhere.
+INGESTED_COLUMNS = ['Date', 'Description', 'Amount', 'Address', 'City/State', 'Zip Code', 'Country', 'Category',
+                    'Currency', 'Original_Amount', 'Merchant']
+
+_datasets = OrderedDict()
+_lock = threading.Lock()
+
+
+def register_dataset(df):
+    """ Keep the ingested columns of a cleaned ledger in memory and return its dataset id, their content hash
+    """
+    df = df[[column for column in INGESTED_COLUMNS if column in df.columns]]
+    dataset_id = dataset_hash(df, columns=df.columns)
+    with _lock:
+        entry = _datasets.get(dataset_id)
+    if entry is None:
+        entry = {'df': df, 'sketches': SpendSketches.from_frame(df)}
+    with _lock:
+        _datasets[dataset_id] = entry
+        _datasets.move_to_end(dataset_id)
+        if len(_datasets) > MAX_DATASETS:
+            _datasets.popitem(last=False)
+    return dataset_id
+
+
+def _get(dataset_id, field):
+    with _lock:
+        entry = _datasets.get(dataset_id)
+    return None if entry is None else entry[field]
+
+
+def get_dataset(dataset_id, exclude_duplicates=False):
+    """ The ledger, without the charges loaded twice by overlapping statements if exclude_duplicates is set
+    """
+    df = _get(dataset_id, 'df')
+    if df is None or not exclude_duplicates:
+        return df
+    return df[~get_duplicate_rows(dataset_id)]
+
+
+def get_sketches(dataset_id, exclude_duplicates=False):
+    if exclude_duplicates:
+        return _derived(dataset_id, 'deduplicated_sketches',
+                        lambda df: SpendSketches.from_frame(df[~get_duplicate_rows(dataset_id)]))
+    return _get(dataset_id, 'sketches')
+
+
+def _derived(dataset_id, field, build):
+    """ Something computed from a dataset on first use and kept with it from then on
+    """
+    with _lock:
+        entry = _datasets.get(dataset_id)
+    if entry is None:
+        return None
+    if field not in entry:
+        # Two first uses racing may both build it; either result is the same
+        entry[field] = build(entry['df'])
+    return entry[field]
+
+
+def get_search_index(dataset_id):
+    return _derived(dataset_id, 'search', SearchIndex.from_frame)
+
+
+def get_group_index(dataset_id):
+    return _derived(dataset_id, 'groups', GroupIndex.from_frame)
+
+
+def get_duplicate_rows(dataset_id):
+    return _derived(dataset_id, 'duplicates', duplicate_rows)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+# Dimensions a chart click can filter on
+DIMENSIONS = ['Category', 'Month', 'Zip Code']
+
+
+def group_keys(df):
+    """ The value of every dimension for each row, with months as 'YYYY-MM' and zip codes as strings; only the
+    dimensions whose column the ledger has
+    """
+    keys = {}
+    if 'Category' in df:
+        keys['Category'] = df['Category']
+    if 'Date' in df:
+        keys['Month'] = df['Date'].dt.to_period('M')
+    if 'Zip Code' in df:
+        keys['Zip Code'] = df['Zip Code'].astype(str).where(df['Zip Code'].notna())
+    return keys
+
+
+class GroupIndex:
+    """ Sorted row numbers of every category, month and zip code of a ledger
+
+    Built once per dataset: each dimension is factorized and its rows sorted by group once, so the rows of a group
+    are one slice of that order. A drill-down intersects the rows of the selected groups instead of scanning the
+    ledger.
+    """
+
+    def __init__(self, groups, rows, size):
+        # groups maps a dimension to {label: (start, end)} into the matching rows array
+        self.groups = groups
+        self.rows = rows
+        self.size = size
+
+    @classmethod
+    def from_frame(cls, df):
+        groups, rows = {}, {}
+        for dimension, keys in group_keys(df).items():
+            codes, labels = pd.factorize(keys)
+            order = np.argsort(codes, kind='stable')
+            counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+            # Rows without a value (code -1) sort first and belong to no group
+            ends = np.cumsum(counts) + (codes < 0).sum()
+            labels = labels.astype(str)
+            groups[dimension] = {label: (end - count, end) for label, end, count in zip(labels, ends, counts)}
+            rows[dimension] = order
+        return cls(groups, rows, len(df))
+
+    def group_rows(self, dimension, label):
+        start, end = self.groups[dimension].get(str(label), (0, 0))
+        return self.rows[dimension][start:end]
+
+    def select(self, filters):
+        """ Sorted rows in every selected group, for filters mapping dimensions to one label each; filters on
+        dimensions the ledger doesn't have are ignored
+        """
+        selected = sorted((self.group_rows(dimension, label) for dimension, label in filters.items()
+                           if dimension in self.groups), key=len)
+        if not selected:
+            return np.arange(self.size)
+        rows = selected[0]
+        for group in selected[1:]:
+            rows = np.intersect1d(rows, group, assume_unique=True)
+        return rows
+
+
+def filter_rows(df, filters):
+    """ Sorted rows of df in every selected group, found by scanning it; for ledgers without a GroupIndex
+    """
+    keys = group_keys(df)
+    selected = np.ones(len(df), dtype=bool)
+    for dimension, label in filters.items():
+        if dimension not in keys:
+            continue
+        values = keys[dimension]
+        selected &= values.notna().to_numpy() & (values.astype(str) == str(label)).to_numpy()
+    return np.flatnonzero(selected)
+
+
+def describe_filters(filters):
+    return ', '.join('{} {}'.format(dimension, filters[dimension]) for dimension in DIMENSIONS
+                     if dimension in filters)
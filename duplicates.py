@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from dash import dcc
+
+# Charges by the same merchant this many days apart or less are compared
+WINDOW_DAYS = 3
+# Amounts this close, in dollars, count as the same charge
+AMOUNT_TOLERANCE = 0.50
+
+
+def statement_runs(df):
+    """ Number of the statement every row comes from, counting from 0 in file order
+    """
+    # A new statement starts wherever the date steps back against the file's overall direction
+    days = df['Date'].ffill().bfill().to_numpy(dtype='datetime64[D]').astype('int64')
+    if len(days) < 2:
+        return np.zeros(len(days), dtype='int64')
+    direction = 1 if days[-1] >= days[0] else -1
+    return np.concatenate([[0], np.cumsum(direction * np.diff(days) < 0)])
+
+
+def find_duplicate_charges(df, window_days=WINDOW_DAYS, tolerance=AMOUNT_TOLERANCE):
+    """ Pairs of charges by the same merchant for the same or a nearby amount within window_days of each other
+    """
+    merchants = df['Merchant'].astype(object).where(df['Merchant'].notna(), df['Description'])
+    merchant_codes = pd.factorize(merchants)[0]
+    amounts = df['Amount'].to_numpy(dtype='float64')
+    days = df['Date'].to_numpy(dtype='datetime64[D]').astype('int64')
+    buckets = np.floor(np.nan_to_num(amounts) / tolerance).astype('int64')
+    valid = (merchant_codes >= 0) & ~np.isnan(amounts) & ~pd.isna(df['Date']).to_numpy()
+
+    # Every charge in its own bucket (shifted=0) and in the one above (shifted=1)
+    rows = np.tile(np.flatnonzero(valid), 2)
+    shifted = np.repeat([0, 1], valid.sum())
+    key_merchant, key_bucket, key_day = merchant_codes[rows], buckets[rows] + shifted, days[rows]
+    order = np.lexsort((key_day, key_bucket, key_merchant))
+    rows, shifted, key_merchant, key_bucket, key_day = \
+        rows[order], shifted[order], key_merchant[order], key_bucket[order], key_day[order]
+
+    # The k-th sweep pairs every charge with the k-th next one, until no pair is left inside a window
+    first, second = [], []
+    k = 1
+    while k < len(rows):
+        in_window = (key_merchant[k:] == key_merchant[:-k]) & (key_bucket[k:] == key_bucket[:-k]) & \
+            (key_day[k:] - key_day[:-k] <= window_days)
+        if not in_window.any():
+            break
+        # A pair of two shifted entries is the same pair as in the bucket below
+        keep = in_window & ~((shifted[k:] == 1) & (shifted[:-k] == 1))
+        first.append(rows[:-k][keep])
+        second.append(rows[k:][keep])
+        k += 1
+
+    if not first:
+        first, second = [np.array([], dtype='int64')], [np.array([], dtype='int64')]
+    first, second = np.concatenate(first), np.concatenate(second)
+    near = np.abs(amounts[first] - amounts[second]) <= tolerance
+    first, second = first[near], second[near]
+    # Earlier charge first, ties on the same day in file order; a pair found in two buckets is kept once
+    swap = (days[first] > days[second]) | ((days[first] == days[second]) & (first > second))
+    pairs = np.unique(np.column_stack([np.where(swap, second, first), np.where(swap, first, second)]), axis=0)
+    first, second = pairs[:, 0], pairs[:, 1]
+
+    # Identical charges are confirmed, and an overlap when they come from different statements; two in one
+    # statement are real repeat purchases as often as not
+    descriptions = df['Description'].astype(str).to_numpy()
+    runs = statement_runs(df)
+    confirmed = (days[first] == days[second]) & (amounts[first] == amounts[second]) & \
+        (descriptions[first] == descriptions[second])
+    pairs_df = pd.DataFrame().assign(Original=df.index[first], Duplicate=df.index[second],
+                                     Date=df['Date'].to_numpy()[second],
+                                     Original_Date=df['Date'].to_numpy()[first],
+                                     Merchant=merchants.to_numpy()[second],
+                                     Amount=amounts[second],
+                                     Original_Amount=amounts[first],
+                                     Days_Apart=days[second] - days[first],
+                                     Confirmed=confirmed,
+                                     Overlap=confirmed & (runs[first] != runs[second]))
+    return pairs_df.sort_values(['Overlap', 'Confirmed', 'Date'], ascending=[False, False, True])
+
+
+def duplicate_rows(df):
+    """ Boolean mask of the later copy of every charge loaded twice by overlapping statements
+    """
+    duplicates = find_duplicate_charges(df.reset_index(drop=True))
+    mask = np.zeros(len(df), dtype=bool)
+    mask[duplicates.loc[duplicates['Overlap'], 'Duplicate'].to_numpy(dtype='int64')] = True
+    return mask
+
+
+def drop_duplicate_charges(df):
+    """ df without the later copy of every charge loaded twice by overlapping statements; identical charges
+    within one statement are kept
+    """
+    return df[~duplicate_rows(df)]
+
+
+def create_duplicate_charges(df):
+    duplicates_df = find_duplicate_charges(df)
+
+    duplicates_fig = go.Figure(data=[go.Table(
+        header=dict(values=['Status', 'Merchant', 'Date', 'Amount', 'Original Date', 'Original Amount',
+                            'Days Apart'],
+                    fill_color='#004c6d',
+                    font_color='white',
+                    align='left'),
+        cells=dict(
+            values=[np.select([duplicates_df.Overlap, duplicates_df.Confirmed], ['Overlap', 'Identical'], 'Suspected'),
+                    duplicates_df.Merchant.astype(str),
+                    duplicates_df.Date.dt.strftime('%Y-%m-%d'), duplicates_df.Amount.round(2),
+                    duplicates_df.Original_Date.dt.strftime('%Y-%m-%d'), duplicates_df.Original_Amount.round(2),
+                    duplicates_df.Days_Apart],
+            fill_color='#a7b8c6',
+            font_color='black',
+            align='left')),
+    ])
+
+    duplicates_fig.update_layout(
+        title='Which charges look duplicated? ({} from overlapping statements, {} identical within a statement, '
+              '{} suspected, {} days apart at most)'.format(
+                  duplicates_df['Overlap'].sum(), (duplicates_df['Confirmed'] & ~duplicates_df['Overlap']).sum(),
+                  (~duplicates_df['Confirmed']).sum(), WINDOW_DAYS),
+        height=800,
+    )
+    return dcc.Graph(figure=duplicates_fig)
@@ -0,0 +1,151 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+import pandas as pd
+
+from workers import process_context
+
+# Columns of a statement; anything else in the workbook is skipped while streaming the rows
+KNOWN_COLUMNS = ['Date', 'Description', 'Amount', 'Address', 'City/State', 'Zip Code', 'Country', 'Category']
+
+# Parsed workbooks are cached as pickled DataFrames keyed by the workbook's hash, so opening the same file again
+# skips the XML parsing entirely. Unpickling runs code, so the cache lives in a directory only this user can write
+# to, and is trimmed to MAX_CACHE_BYTES and MAX_CACHE_AGE seconds, least recently read first.
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                         'spendalyzer', 'excel')
+MAX_CACHE_BYTES = 512 * 1024 ** 2
+MAX_CACHE_AGE = 30 * 24 * 60 * 60
+HASH_BUFFER = 1024 * 1024
+
+# Workbooks with several sheets are parsed one sheet per process from this size on; below it, starting the
+# processes costs more than it saves
+PARALLEL_MIN_BYTES = 4 * 1024 ** 2
+
+
+def _workbook_hash(source):
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BUFFER), b''):
+                digest.update(block)
+    else:
+        digest.update(source.getbuffer())
+    return digest.hexdigest()
+
+
+def _workbook_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return source.getbuffer().nbytes
+
+
+def _private_cache_dir():
+    """ CACHE_DIR, created if needed; None unless it belongs to this user and nobody else can write to it
+    """
+    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+    info = os.stat(CACHE_DIR)
+    if info.st_uid != os.getuid() or info.st_mode & 0o022:
+        return None
+    return CACHE_DIR
+
+
+def _trim_cache(cache_dir):
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((info.st_mtime, info.st_size, path))
+
+    cutoff = time.time() - MAX_CACHE_AGE
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        if mtime >= cutoff and total <= MAX_CACHE_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _read_rows(worksheet):
+    """ Stream one sheet and keep only the known columns
+    """
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return None
+    positions = {name: i for i, name in enumerate(header) if name in KNOWN_COLUMNS}
+    if 'Date' not in positions or 'Amount' not in positions:
+        return None
+
+    columns = {name: [] for name in positions}
+    for row in rows:
+        if row[positions['Date']] is None and row[positions['Amount']] is None:
+            continue
+        for name, i in positions.items():
+            columns[name].append(row[i] if i < len(row) else None)
+    return pd.DataFrame(columns, columns=[name for name in KNOWN_COLUMNS if name in positions])
+
+
+def _read_sheet(source, sheet_name):
+    # Runs in a worker process; an in-memory workbook arrives as its bytes
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        return _read_rows(workbook[sheet_name])
+    finally:
+        workbook.close()
+
+
+def read_excel_statement(source):
+    """ Read a statement workbook from a path or an in-memory buffer
+
+    Every sheet that has at least a Date and an Amount column is read and the sheets are stacked. Large workbooks
+    with several sheets are parsed one sheet per worker process.
+    """
+    key = _workbook_hash(source)
+    cache_dir = _private_cache_dir()
+    cache_path = cache_dir and os.path.join(cache_dir, key + '.pkl')
+    if cache_path and os.path.exists(cache_path):
+        try:
+            df = pd.read_pickle(cache_path)
+            os.utime(cache_path)
+            return df
+        except FileNotFoundError:
+            # Trimmed meanwhile
+            pass
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet_names = workbook.sheetnames
+        if len(sheet_names) > 1 and _workbook_size(source) >= PARALLEL_MIN_BYTES:
+            workbook.close()
+            shared = source if isinstance(source, (str, os.PathLike)) else source.getvalue()
+            with ProcessPoolExecutor(max_workers=min(len(sheet_names), os.cpu_count() or 1),
+                                     mp_context=process_context()) as executor:
+                sheets = list(executor.map(_read_sheet, [shared] * len(sheet_names), sheet_names))
+        else:
+            sheets = [_read_rows(workbook[sheet_name]) for sheet_name in sheet_names]
+    finally:
+        workbook.close()
+    sheets = [sheet for sheet in sheets if sheet is not None]
+    df = pd.concat(sheets, ignore_index=True) if sheets else pd.DataFrame(columns=KNOWN_COLUMNS)
+
+    if cache_path:
+        # Written under a unique name and then renamed, so a concurrent reader never sees a half-written file
+        fd, partial_path = tempfile.mkstemp(dir=cache_dir, suffix='.partial')
+        with os.fdopen(fd, 'wb') as f:
+            df.to_pickle(f)
+        os.replace(partial_path, cache_path)
+        _trim_cache(cache_dir)
+    return df
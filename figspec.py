@@ -0,0 +1,88 @@
+import base64
+
+import numpy as np
+
+# Thin figure layer for the hot charts: traces are plain dicts built from pre-aggregated arrays, so neither
+# plotly.express nor the graph_objects validators run on the request path. Numeric arrays are sent as base64
+# typed arrays ({'dtype': 'f8', 'bdata': ...}), which plotly.js decodes natively from version 2.28 on.
+
+TYPED_ARRAY_DTYPES = {'float64': 'f8', 'float32': 'f4', 'int32': 'i4', 'uint32': 'u4', 'int16': 'i2',
+                      'uint16': 'u2', 'int8': 'i1', 'uint8': 'u1'}
+
+# The parts of the default plotly template the charts rely on, instead of shipping the whole template
+BASE_LAYOUT = {
+    'font': {'color': '#2a3f5f'},
+    'paper_bgcolor': 'white',
+    'plot_bgcolor': '#E5ECF6',
+    'xaxis': {'gridcolor': 'white', 'zerolinecolor': 'white', 'automargin': True},
+    'yaxis': {'gridcolor': 'white', 'zerolinecolor': 'white', 'automargin': True},
+    'legend': {'tracegroupgap': 0},
+}
+
+
+def typed_array(values):
+    """ Encode a numeric array as a base64 typed array; anything else goes out as a plain list
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        # Date axes accept milliseconds since the epoch
+        values = values.astype('datetime64[ms]').astype('float64')
+    elif values.dtype.kind in 'iu' and values.dtype.itemsize == 8:
+        # plotly.js has no 64-bit integer arrays
+        values = values.astype('float64')
+    elif values.dtype.kind == 'b':
+        values = values.astype('uint8')
+    dtype = TYPED_ARRAY_DTYPES.get(values.dtype.name)
+    if dtype is None:
+        return values.tolist()
+    data = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<')).tobytes()
+    return {'dtype': dtype, 'bdata': base64.b64encode(data).decode('ascii')}
+
+
+def labels(values):
+    return [str(value) for value in values]
+
+
+def bar_trace(x, y, colors=None, name=None, showlegend=False):
+    trace = {'type': 'bar', 'x': labels(x), 'y': typed_array(y), 'showlegend': showlegend}
+    if colors is not None:
+        trace['marker'] = {'color': colors}
+    if name is not None:
+        trace['name'] = name
+    return trace
+
+
+def line_trace(x, y, name, color, mode='lines+markers', marker=None):
+    trace = {'type': 'scatter', 'x': typed_array(x), 'y': typed_array(y), 'name': name, 'mode': mode,
+             'line': {'color': color}}
+    if marker is not None:
+        trace['marker'] = dict(marker, color=color)
+    return trace
+
+
+def pie_trace(names, values, colors):
+    return {'type': 'pie', 'labels': labels(names), 'values': typed_array(values), 'marker': {'colors': colors}}
+
+
+def box_trace(y, name, color, **options):
+    return dict({'type': 'box', 'y': typed_array(y), 'name': name, 'marker': {'color': color}}, **options)
+
+
+def summary_box_trace(name, q1, median, q3, lowerfence, upperfence, color):
+    # Box drawn from precomputed statistics, so none of the underlying values have to be sent
+    return {'type': 'box', 'x': [name], 'q1': [q1], 'median': [median], 'q3': [q3], 'lowerfence': [lowerfence],
+            'upperfence': [upperfence], 'name': name, 'marker': {'color': color}, 'boxpoints': False}
+
+
+def figure(data, title, **layout):
+    """ Figure dict with BASE_LAYOUT merged one level deep into the given layout
+    """
+    merged = {key: dict(value) if isinstance(value, dict) else value for key, value in BASE_LAYOUT.items()}
+    for key, value in layout.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key].update(value)
+        else:
+            merged[key] = value
+    merged['title'] = {'text': title}
+    return {'data': data, 'layout': merged}
+
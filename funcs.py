@@ -13,6 +13,13 @@ import plotly.express as px
 import numpy as np
 import pandas as pd
 
+from figspec import figure, bar_trace, line_trace, pie_trace, box_trace, summary_box_trace
+from percentiles import SpendSketches
+from taxonomy import get_taxonomy
+from proximity import distance_bands, locate_zip_codes
+from workers import TaskTimeout
+from backtest import DEFAULT_WINDOW, DEFAULT_ALPHA
+
 
 def clean_currency(x):
     """ If the value is a string, then remove currency symbol and delimiters
@@ -24,67 +31,9 @@ def clean_currency(x):
 
 
 def create_forecast_recommendations_all(df):
-    df = df.drop(columns=["Description", "Address", "City/State", "Zip Code", "Country"])
-
-    avg_df = df.groupby(['Category'])['Amount'].mean().to_frame().reset_index()
-    avg_df = avg_df.rename(columns={'Amount': 'Average'})
-
-    # creating new dataframes for sma and es forecasts
-    sma_df = df
-    exp_smooth_df = df
-
-    # simple moving average forecast of each category
-    sma_df = df.groupby(['Category'])['Amount'].rolling(window=4).mean().to_frame().reset_index()
-    sma_df.columns = ['Category', 'level_1', 'SMA']
-
-    most_recent_sma_df = sma_df.groupby('Category').tail(1)
-
-    forecasts = pd.merge(most_recent_sma_df, avg_df, on="Category", how="left")
-    forecasts = forecasts.reindex(columns=['Category', 'level_1', 'Average', 'SMA'])
+    # window=4 and alpha=0.2 for every category
+    forecasts = forecast_table(df)
 
-    # exponential smoothing forecast of each category
-
-    # define alpha value
-    alpha = 0.2
-
-    # group transactions by category
-    grouped = exp_smooth_df.groupby('Category')
-
-    # create a new empty column for the exponential smoothed amounts
-
-    # iterate through each group
-    for group_name, group_data in grouped:
-        # get the indices for the current group
-        group_indices = group_data.index
-
-        # perform exponential smoothing on the amount column for the current group
-        smoothed = group_data['Amount'].ewm(alpha=alpha).mean()
-
-        # update the smoothed amounts for the current group in the main dataframe
-        exp_smooth_df.loc[group_indices, 'ES'] = smoothed
-
-    exp_smooth_df = exp_smooth_df.groupby('Category').tail(1)
-
-    # merge back with forecast
-    forecasts = pd.merge(forecasts, exp_smooth_df[['Category', 'ES']], on="Category", how="inner")
-
-    forecasts['Flagged_SMA'] = np.where(forecasts['SMA'] > forecasts['Average'], 'Yes', 'No')
-    forecasts['Flagged_ES'] = np.where(forecasts['ES'] > forecasts['Average'], 'Yes', 'No')
-
-    flagged_categories = forecasts[(forecasts['Flagged_SMA'] == 'Yes') & (forecasts['Flagged_ES'] == 'Yes')][
-        ['Category', 'Average', 'SMA', 'ES', 'Flagged_SMA', 'Flagged_ES']]
-
-    # calculate percentage change from SMA and average to average for every category
-    forecasts['pct_change_SMA'] = (forecasts['SMA'] - forecasts['Average']) / \
-                                  forecasts['Average'] * 100
-    forecasts['pct_change_ES'] = (forecasts['ES'] - forecasts['Average']) / \
-                                 forecasts['Average'] * 100
-
-    # round all int values to 2 decimal places
-    forecasts[['Average', 'SMA', 'ES', 'pct_change_SMA', 'pct_change_ES']] = forecasts[
-        ['Average', 'SMA', 'ES', 'pct_change_SMA', 'pct_change_ES']].round(2)
-
-    forecasts = forecasts.drop(columns='level_1')
     # TABLE
     all_categories_fig = go.Figure(data=[go.Table(
         header=dict(values=list(forecasts.columns),
@@ -103,76 +52,63 @@ def create_forecast_recommendations_all(df):
     return dcc.Graph(figure=all_categories_fig)
 
 
-def create_forecast_recommendations_flagged(df):
-    df = df.drop(columns=["Description", "Address", "City/State", "Zip Code", "Country"])
+def forecast_table(df, params=None):
+    """ Average, latest SMA and ES forecast of every category, with the flags and percentage changes
+
+    df is only read, so the builders can share one ledger.
+    """
+    amounts = df.groupby('Category')['Amount']
 
-    avg_df = df.groupby(['Category'])['Amount'].mean().to_frame().reset_index()
+    avg_df = amounts.mean().to_frame().reset_index()
     avg_df = avg_df.rename(columns={'Amount': 'Average'})
 
-    # creating new dataframes for sma and es forecasts
-    sma_df = df
-    exp_smooth_df = df
+    # window and alpha of each category from the backtest, otherwise the backtest's defaults
+    if params is None:
+        params = pd.DataFrame(columns=['Window', 'Alpha'])
+    windows = params['Window'].to_dict()
+    alphas = params['Alpha'].to_dict()
 
     # simple moving average forecast of each category
-    sma_df = df.groupby(['Category'])['Amount'].rolling(window=4).mean().to_frame().reset_index()
-    sma_df.columns = ['Category', 'level_1', 'SMA']
-
-    most_recent_sma_df = sma_df.groupby('Category').tail(1)
+    most_recent_sma_df = amounts.apply(
+        lambda amounts: amounts.rolling(window=int(windows.get(amounts.name, DEFAULT_WINDOW))).mean().iloc[-1])
+    most_recent_sma_df = most_recent_sma_df.to_frame('SMA').reset_index()
 
     forecasts = pd.merge(most_recent_sma_df, avg_df, on="Category", how="left")
-    forecasts = forecasts.reindex(columns=['Category', 'level_1', 'Average', 'SMA'])
-
-    # exponential smoothing forecast of each category
-
-    # define alpha value
-    alpha = 0.2
-
-    # group transactions by category
-    grouped = exp_smooth_df.groupby('Category')
-
-    # create a new empty column for the exponential smoothed amounts
+    forecasts = forecasts.reindex(columns=['Category', 'Average', 'SMA'])
 
-    # iterate through each group
-    for group_name, group_data in grouped:
-        # get the indices for the current group
-        group_indices = group_data.index
-
-        # perform exponential smoothing on the amount column for the current group
-        smoothed = group_data['Amount'].ewm(alpha=alpha).mean()
-
-        # update the smoothed amounts for the current group in the main dataframe
-        exp_smooth_df.loc[group_indices, 'ES'] = smoothed
-
-    exp_smooth_df = exp_smooth_df.groupby('Category').tail(1)
+    # exponential smoothing forecast of each category: the last smoothed amount
+    most_recent_es_df = amounts.apply(
+        lambda amounts: amounts.ewm(alpha=alphas.get(amounts.name, DEFAULT_ALPHA)).mean().iloc[-1])
+    most_recent_es_df = most_recent_es_df.to_frame('ES').reset_index()
 
     # merge back with forecast
-    forecasts = pd.merge(forecasts, exp_smooth_df[['Category', 'ES']], on="Category", how="inner")
+    forecasts = pd.merge(forecasts, most_recent_es_df, on="Category", how="inner")
 
     forecasts['Flagged_SMA'] = np.where(forecasts['SMA'] > forecasts['Average'], 'Yes', 'No')
     forecasts['Flagged_ES'] = np.where(forecasts['ES'] > forecasts['Average'], 'Yes', 'No')
 
-    flagged_categories = forecasts[(forecasts['Flagged_SMA'] == 'Yes') & (forecasts['Flagged_ES'] == 'Yes')][
-        ['Category', 'Average', 'SMA', 'ES', 'Flagged_SMA', 'Flagged_ES']]
-
     # calculate percentage change from SMA and average to average for every category
     forecasts['pct_change_SMA'] = (forecasts['SMA'] - forecasts['Average']) / \
                                   forecasts['Average'] * 100
     forecasts['pct_change_ES'] = (forecasts['ES'] - forecasts['Average']) / \
                                  forecasts['Average'] * 100
 
-    flagged_categories['pct_change_SMA'] = (flagged_categories['SMA'] - flagged_categories['Average']) / \
-                                           flagged_categories['Average'] * 100
-    flagged_categories['pct_change_ES'] = (flagged_categories['ES'] - flagged_categories['Average']) / \
-                                          flagged_categories['Average'] * 100
-
     # round all int values to 2 decimal places
     forecasts[['Average', 'SMA', 'ES', 'pct_change_SMA', 'pct_change_ES']] = forecasts[
         ['Average', 'SMA', 'ES', 'pct_change_SMA', 'pct_change_ES']].round(2)
+    return forecasts
+
+
+def create_forecast_recommendations_flagged(df, params=None, sketches=None):
+    if sketches is None:
+        sketches = SpendSketches.from_frame(df)
+    return create_flagged_forecast_table(forecast_table(df, params), sketches.quantiles([0.5, 0.9]))
 
-    flagged_categories[['Average', 'SMA', 'ES', 'pct_change_SMA', 'pct_change_ES']] = flagged_categories[
-        ['Average', 'SMA', 'ES', 'pct_change_SMA', 'pct_change_ES']].round(2)
 
-    forecasts = forecasts.drop(columns='level_1')
+def create_flagged_forecast_table(forecasts, typical=None):
+    # typical holds the p50 and p90 transaction of every category, read from its amount sketches
+    flagged_categories = forecasts[(forecasts['Flagged_SMA'] == 'Yes') & (forecasts['Flagged_ES'] == 'Yes')]
+
     # TABLE
 
     flagged_fig = go.Figure(data=[go.Table(
@@ -191,8 +127,12 @@ def create_forecast_recommendations_flagged(df):
     message = ""
 
     for index, row in flagged_categories.iterrows():
-        message += "<b>Flagged Category: {}</b><br>Monthly forecast projections indicate you will surpass your typical average of ${}.<br>Consider cost control strategies.<br>Source: SMA and ES Forecasts indicate an increase of {:.2f}% and {:.2f}%, respectively.<br><br>".format(
+        message += "<b>Flagged Category: {}</b><br>Monthly forecast projections indicate you will surpass your typical average of ${}.<br>Consider cost control strategies.<br>Source: SMA and ES Forecasts indicate an increase of {:.2f}% and {:.2f}%, respectively.<br>".format(
             row['Category'], row['Average'], row['pct_change_SMA'], row['pct_change_ES'])
+        if typical is not None and row['Category'] in typical.index:
+            message += "Typical transaction: ${:.2f}; 9 in 10 are under ${:.2f}.<br>".format(
+                typical.loc[row['Category'], 'p50'], typical.loc[row['Category'], 'p90'])
+        message += "<br>"
 
     flagged_fig.update_layout(
         title='SMA and ES Forecasts',
@@ -225,18 +165,47 @@ def create_time_series(df):
     return dcc.Graph(figure=time_fig1)
 
 
+LINE_COLORS = ['#004c6d', '#9f1853', '#198038', '#b28600', '#8a3800', '#1192e8', '#ff7c43', '#005d5d', '#009d9a',
+               '#012749']
+BAR_COLORS = ['#004c6d', '#155b79', '#2b6a85', '#407992', '#55889e', '#6a97aa', '#80a6b6', '#95b4c2', '#aac3ce',
+              '#bfd2db']
+
+
+# Largest value of the "Ranked Expenses" dropdown. The ranked charts are built for this many entries and
+# assets/ranking.js cuts them down to the selected number in the browser, so re-ranking needs no round trip.
+MAX_RANKED = 10
+
+
+def ranked_bar_figure(labels, values, ranked, title, x_title):
+    """ Bar figure showing the first `ranked` of up to MAX_RANKED sorted entries
+
+    The full sorted entries travel in layout.meta together with the title template, for re-ranking clientside.
+    """
+    labels = [str(label) for label in labels[:MAX_RANKED]]
+    values = np.asarray(values[:MAX_RANKED], dtype='float64')
+    colors = BAR_COLORS[:len(labels)]
+    return figure([bar_trace(labels[:ranked], values[:ranked], colors[:ranked])], title.format(n=ranked),
+                  xaxis=dict(title={'text': x_title}), yaxis=dict(title={'text': 'Amount'}),
+                  meta={'kind': 'bar', 'title': title, 'labels': labels, 'values': values.tolist(), 'colors': colors})
+
+
 def create_line_plot(df, ranked):
     line_2df = df.groupby(['Category', 'Date'])['Amount'].sum().to_frame().reset_index()
-    top_categories = line_2df.groupby('Category')['Amount'].sum().sort_values(ascending=False).index[:ranked]
+    top_categories = line_2df.groupby('Category')['Amount'].sum().sort_values(ascending=False).index[:MAX_RANKED]
     line_2df = line_2df[line_2df['Category'].isin(top_categories)]
-    line_fig2 = px.line(line_2df, 'Date', 'Amount', color='Category',
-                        title="What does a plot of my transactions by category look like? (Top " + str(
-                            ranked) + " rankings)",
-                        color_discrete_sequence=['#004c6d', '#9f1853', '#198038', '#b28600', '#8a3800', '#1192e8',
-                                                 '#ff7c43', '#005d5d', '#009d9a', '#012749'])
-    # color_discrete_sequence=px.colors.qualitative.Safe)
-    line_fig2.update_traces(mode='lines+markers', marker_line_width=2, marker_size=10)
-    return dcc.Graph(figure=line_fig2)
+    traces = []
+    for i, category in enumerate(top_categories):
+        category_df = line_2df[line_2df['Category'] == category]
+        trace = line_trace(category_df['Date'].to_numpy(), category_df['Amount'].to_numpy(), category,
+                           LINE_COLORS[i % len(LINE_COLORS)], marker=dict(size=10, line=dict(width=2)))
+        # Lower-ranked categories are sent hidden so a larger ranking only has to show them
+        trace['visible'] = i < ranked
+        traces.append(trace)
+    title = "What does a plot of my transactions by category look like? (Top {n} rankings)"
+    line_fig2 = figure(traces, title.format(n=ranked), xaxis=dict(type='date', title={'text': 'Date'}),
+                       yaxis=dict(title={'text': 'Amount'}), legend=dict(title={'text': 'Category'}),
+                       meta={'kind': 'line', 'title': title})
+    return dcc.Graph(id={'type': 'ranked-graph', 'index': 'line-plot'}, figure=line_fig2)
 
 
 def create_bar_chart_top_rankings(df, ranked):
@@ -245,13 +214,11 @@ def create_bar_chart_top_rankings(df, ranked):
         'Amount'])  # (columns=["Description", "Address", "City/State", "Zip Code", "Country", ])
     cat_vs_amount_df1 = cat_vs_amount_df1.groupby(cat_vs_amount_df1['Category'])[
         'Amount'].sum().to_frame().reset_index()
-    cat_vs_amount_df1 = cat_vs_amount_df1.sort_values('Amount', ascending=False).head(ranked)
-    bar_fig1 = px.bar(cat_vs_amount_df1, 'Category', 'Amount', color='Category',
-                      title="What are your top " + str(ranked) + " rankings?",
-                      color_discrete_sequence=['#004c6d', '#155b79', '#2b6a85', '#407992', '#55889e', '#6a97aa',
-                                               '#80a6b6', '#95b4c2', '#aac3ce', '#bfd2db'])
+    cat_vs_amount_df1 = cat_vs_amount_df1.sort_values('Amount', ascending=False).head(MAX_RANKED)
+    bar_fig1 = ranked_bar_figure(cat_vs_amount_df1['Category'].tolist(), cat_vs_amount_df1['Amount'].to_numpy(),
+                                 ranked, "What are your top {n} rankings?", 'Category')
 
-    return dcc.Graph(figure=bar_fig1)
+    return dcc.Graph(id={'type': 'ranked-graph', 'index': 'top-rankings'}, figure=bar_fig1)
 
 
 def create_bar_chart_bottom_rankings(df, ranked):
@@ -261,21 +228,34 @@ def create_bar_chart_bottom_rankings(df, ranked):
         'Amount'].sum().to_frame().reset_index()
 
     # BOTTOM RANKINGS
-    cat_vs_amount_df2 = cat_vs_amount_df1.sort_values('Amount', ascending=True).head(ranked)
-    bar_fig2 = px.bar(cat_vs_amount_df2, 'Category', 'Amount', color='Category',
-                      title="What are your bottom " + str(ranked) + " rankings?",
-                      color_discrete_sequence=['#004c6d', '#155b79', '#2b6a85', '#407992', '#55889e', '#6a97aa',
-                                               '#80a6b6', '#95b4c2', '#aac3ce', '#bfd2db'])
+    cat_vs_amount_df2 = cat_vs_amount_df1.sort_values('Amount', ascending=True).head(MAX_RANKED)
+    bar_fig2 = ranked_bar_figure(cat_vs_amount_df2['Category'].tolist(), cat_vs_amount_df2['Amount'].to_numpy(),
+                                 ranked, "What are your bottom {n} rankings?", 'Category')
 
-    return dcc.Graph(figure=bar_fig2)
+    return dcc.Graph(id={'type': 'ranked-graph', 'index': 'bottom-rankings'}, figure=bar_fig2)
+
+
+def create_bar_chart_top_merchants(df, ranked):
+    # Merchant is a categorical built at upload time, so this groups on small integer codes
+    merchant_df = df.groupby('Merchant', observed=True)['Amount'].sum().to_frame().reset_index()
+    merchant_df = merchant_df.sort_values('Amount', ascending=False).head(MAX_RANKED)
+    bar_fig = ranked_bar_figure(merchant_df['Merchant'].tolist(), merchant_df['Amount'].to_numpy(), ranked,
+                                "Which {n} merchants do you spend the most at?", 'Merchant')
+
+    return dcc.Graph(id={'type': 'ranked-graph', 'index': 'top-merchants'}, figure=bar_fig)
 
 
 def create_bar_chart_days_analysis(df):
     # Transform x variable to group by day of the week
     days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    df['Day_of_Week'] = df['Date'].dt.day_name()
-    df['Day_of_Week'] = pd.Categorical(df['Day_of_Week'], categories=days_of_week, ordered=True)
-    bar3_df = df.groupby(df['Day_of_Week'])['Amount'].count().to_frame().reset_index()
+    day_of_week = pd.Categorical(df['Date'].dt.day_name(), categories=days_of_week, ordered=True)
+    bar3_df = df['Amount'].groupby(day_of_week, observed=False).count().rename_axis('Day_of_Week')
+    bar3_df = bar3_df.to_frame().reset_index()
+    return create_days_bar_chart(bar3_df)
+
+
+def create_days_bar_chart(bar3_df):
+    # bar3_df holds the number of transactions (Amount) of every Day_of_Week
     bar3_df = bar3_df.sort_values(by='Amount', ascending=False)
     bar_fig3 = px.bar(bar3_df, 'Day_of_Week', 'Amount', color='Day_of_Week',
                       color_discrete_sequence=['#004c6d', '#29617d', '#46778d', '#618d9e', '#7da3af', '#9abac1',
@@ -286,10 +266,17 @@ def create_bar_chart_days_analysis(df):
 
 
 def create_heatmap(df):
-    # Create a pivot table with categories as rows, months as columns and the sum of amounts as values
-    df_pivot = pd.pivot_table(df, values='Amount', index='Category', columns=df['Date'].dt.strftime('%Y-%m'),
-                              aggfunc=np.sum)
+    # Create a pivot table with categories as rows, months as columns and the sum of amounts as values; months
+    # are grouped as periods and only the column labels are formatted, rather than every date
+    df_pivot = df['Amount'].groupby([df['Category'], df['Date'].dt.to_period('M')]).sum().unstack()
+    df_pivot.columns = df_pivot.columns.strftime('%Y-%m')
+    heatmap = create_monthly_heatmap(df_pivot)
+    # Clicking a cell drills down to that category and month
+    heatmap.id = {'type': 'drilldown-graph', 'index': 'heatmap'}
+    return heatmap
+
 
+def create_monthly_heatmap(df_pivot):
     # Create a heatmap using Plotly
     heatmap_fig = px.imshow(df_pivot.values,
                             labels=dict(x="Month", y="Category", color="Amount"),
@@ -308,43 +295,95 @@ def create_heatmap(df):
     return dcc.Graph(figure=heatmap_fig)
 
 
-def create_pie_chart(df):
-    pie_df = df.drop(columns=["Description", "Address", "City/State", "Zip Code", "Country", ])  # Remove cols
-    pie_df['Type'] = np.where(df['Category'].isin(
-        ['Car Insurance', 'Car Loan', 'Car Maintenance', 'Electric Bill', 'Gas', 'Gas Bill', 'Groceries',
-         'Health Care', 'Housing', 'Internet Bill']), True, False)
+def necessity_totals(df):
+    """ Total spend on necessities and on non-essentials
+    """
+    return get_taxonomy().rollup(df)['Type']['Amount'].to_frame().reset_index()
 
-    pie_df['Type'] = pie_df['Type'].replace({True: "Necessities", False: "Non-essentials"})
-    pie_df = pie_df.groupby(pie_df['Type'])['Amount'].sum().to_frame().reset_index()
+
+def create_pie_chart(df):
+    pie_df = necessity_totals(df)
     colors = {'Necessities': '#003f5c', 'Non-essentials': '#8a3800'}
 
-    pie_fig_1 = px.pie(pie_df, values='Amount', names='Type', color='Type',
-                       color_discrete_map=colors,
-                       title='What does my expense breakdown by necessities and non-essentials look like?')
+    pie_fig_1 = figure([pie_trace(pie_df['Type'], pie_df['Amount'].to_numpy(),
+                                  [colors[name] for name in pie_df['Type']])],
+                       'What does my expense breakdown by necessities and non-essentials look like?')
 
     return dcc.Graph(figure=pie_fig_1)
 
 
-def create_box_plot(df):
-    box_plot = px.box(df, x="Category", y='Amount', color="Category", points="suspectedoutliers",
-                      color_discrete_sequence=['#004c6d', '#155b79', '#2b6a85', '#407992', '#55889e', '#6a97aa',
-                                               '#80a6b6', '#95b4c2', '#aac3ce', '#bfd2db'],
-                      hover_name="Date", title='What outlier transactions can we detect?', )
-    box_plot.update_traces(quartilemethod="exclusive")
+def create_box_plot(df, sketches=None):
+    # Quartiles and fences are read from the per-category amount sketches (see percentiles.py), so only the
+    # transactions beyond the fences are sent as points
+    if sketches is None:
+        sketches = SpendSketches.from_frame(df)
+    row_categories = df['Category'].fillna('Uncategorized').astype(str)
+    categories = pd.unique(row_categories)
+    stats = sketches.quantiles([0.25, 0.5, 0.75], categories=categories).reindex(categories)
+    # The exact quartiles lie between the exact smallest and largest amount
+    for column in ['p25', 'p50', 'p75']:
+        stats[column] = stats[column].clip(stats['Min'], stats['Max'])
+
+    codes = pd.Categorical(row_categories, categories=categories).codes
+    amounts = df['Amount'].to_numpy(dtype='float64')
+
+    # The sketches bound the exact quartiles, and so the exact fences between the narrowest and the widest fences
+    # those quartiles allow
+    bounds = sketches.quantile_bounds([0.25, 0.75], categories=categories).reindex(categories)
+    q1_low, q1_high = bounds['p25_low'].to_numpy(), bounds['p25_high'].to_numpy()
+    q3_low, q3_high = bounds['p75_low'].to_numpy(), bounds['p75_high'].to_numpy()
+    wide_iqr, narrow_iqr = q3_high - q1_low, np.maximum(q3_low - q1_high, 0)
+    lower, upper = q1_low - 1.5 * wide_iqr, q3_high + 1.5 * wide_iqr
+    narrow_lower, narrow_upper = q1_high - 1.5 * narrow_iqr, q3_low + 1.5 * narrow_iqr
+
+    # Only the categories with amounts between the two get their exact quartiles, from their own rows
+    unsure = ((amounts < narrow_lower[codes]) & (amounts >= lower[codes])) | \
+        ((amounts > narrow_upper[codes]) & (amounts <= upper[codes]))
+    if unsure.any():
+        recheck = np.isin(codes, np.unique(codes[unsure]))
+        exact = pd.Series(amounts[recheck]).groupby(codes[recheck]).quantile([0.25, 0.5, 0.75]).unstack()
+        stats.iloc[exact.index, stats.columns.get_indexer(['p25', 'p50', 'p75'])] = exact.to_numpy()
+        iqr = exact[0.75] - exact[0.25]
+        lower[exact.index], upper[exact.index] = exact[0.25] - 1.5 * iqr, exact[0.75] + 1.5 * iqr
+
+    outside = (amounts < lower[codes]) | (amounts > upper[codes])
+    outlier_codes, outlier_amounts = codes[outside], amounts[outside]
+
+    # Whiskers end at the most extreme amounts inside the fences
+    inside = ~outside & ~np.isnan(amounts)
+    whisker_low, whisker_high = stats['p25'].to_numpy(copy=True), stats['p75'].to_numpy(copy=True)
+    np.minimum.at(whisker_low, codes[inside], amounts[inside])
+    np.maximum.at(whisker_high, codes[inside], amounts[inside])
+
+    traces = []
+    for i, category in enumerate(categories):
+        color = BAR_COLORS[i % len(BAR_COLORS)]
+        traces.append(summary_box_trace(category, stats['p25'].iloc[i], stats['p50'].iloc[i], stats['p75'].iloc[i],
+                                        whisker_low[i], whisker_high[i], color))
+        points = outlier_amounts[outlier_codes == i]
+        if len(points):
+            trace = line_trace([category] * len(points), points, category, color, mode='markers')
+            trace['showlegend'] = False
+            traces.append(trace)
+    box_plot = figure(traces, 'What outlier transactions can we detect?', boxmode='overlay',
+                      xaxis=dict(title={'text': 'Category'}), yaxis=dict(title={'text': 'Amount'}),
+                      legend=dict(title={'text': 'Category'}))
     return dcc.Graph(figure=box_plot)
 
 
-def create_geo_location_plot(df):
-    nomi = pgeocode.Nominatim('us')  # Interpret zipcodes as US
-    df['Latitude'] = nomi.query_postal_code(
-        df['Zip Code'].tolist()).latitude  # Create column that loads in the latitude based on Zip Code
-    df['Longitude'] = nomi.query_postal_code(
-        df['Zip Code'].tolist()).longitude  # Create column that loads in the longitude based on Zip Code
+def create_geo_location_plot(df, session=None):
+    try:
+        # Interpret zipcodes as US, geocoded in an analysis worker once per distinct zip code
+        locations = locate_zip_codes(df['Zip Code'], key=session and ('geo-location', session))
+    except TaskTimeout as e:
+        return str(e)
 
     map_fig = go.Figure(data=go.Scattergeo(
-        lon=df['Longitude'],
-        lat=df['Latitude'],
+        lon=locations[:, 1],
+        lat=locations[:, 0],
         text=df['City/State'],
+        # Clicking a purchase drills down to its zip code
+        customdata=df['Zip Code'].astype(str),
         mode='markers',
         marker_color=df['Amount'],
         marker=dict(
@@ -384,17 +423,28 @@ def create_geo_location_plot(df):
         width=1400,
         height=600,
     )
-    return dcc.Graph(figure=map_fig)
-
-
-def create_spending_by_location(df, zipcode):
-    if len(zipcode) >= 5:
-        df['PrimaryZip'] = np.where(df['Zip Code'] == zipcode, 'Primary Zip Code', 'Not Primary Zip Code')
-        box_plot = px.box(df, x="PrimaryZip", y='Amount', color="PrimaryZip", points="suspectedoutliers",
-                          color_discrete_sequence=['#004c6d'],
-                          hover_name="Amount", title='What does spending look like outside our home address?',
-                          labels="Primary Zip Code vs. Other Zip Code")
-        box_plot.update_traces(quartilemethod="exclusive")
+    return dcc.Graph(id={'type': 'drilldown-graph', 'index': 'geo-location'}, figure=map_fig)
+
+
+def create_spending_by_location(df, zipcode, session=None):
+    if zipcode is not None and len(zipcode) >= 5:
+        # Every transaction is placed in a distance band around the home zip code rather than matched to it exactly
+        try:
+            bands = distance_bands(df['Zip Code'], zipcode, key=session and ('spending-by-location', session))
+        except TaskTimeout as e:
+            return str(e)
+        if bands is None:
+            return 'Zipcode ' + zipcode[:5] + ' could not be located'
+        amounts = df['Amount'].to_numpy()
+        traces = []
+        for i, band in enumerate(bands.categories):
+            band_amounts = amounts[bands.codes == i]
+            if len(band_amounts):
+                traces.append(box_trace(band_amounts, band, BAR_COLORS[2 * i % len(BAR_COLORS)],
+                                        boxpoints='suspectedoutliers', quartilemethod='exclusive'))
+        box_plot = figure(traces, 'What does spending look like outside our home address?',
+                          xaxis=dict(title={'text': 'Distance from ' + zipcode[:5]}),
+                          yaxis=dict(title={'text': 'Amount'}), showlegend=False)
         return dcc.Graph(figure=box_plot)
     else:
         return 'Zipcode must be at least 5 characters long'
@@ -0,0 +1,341 @@
+""" Load test of the Dash callbacks with concurrent simulated users
+
+Starts app.py's server in a separate process (or targets --url) and runs --sessions sessions, --concurrency at a
+time. Every session uploads a statement through update_output, then clicks Generate --repeat times for each
+analysis type with make_graphs. Sessions move through the analysis types together, so each type is measured on
+its own. For every type the report gives latency percentiles, throughput, errors and the peak RSS of the server
+and its analysis workers. Results are written as JSON, and --compare checks them against an earlier run:
+
+    python loadtest.py --statement data/transactions.csv --concurrency 8 --output run.json
+    python loadtest.py --compare baseline.json --output run.json
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import platform
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PORT = 8051
+# How long to wait for a locally started server to accept requests
+STARTUP_TIMEOUT = 120
+REQUEST_TIMEOUT = 300
+# Seconds between RSS samples
+SAMPLE_INTERVAL = 0.2
+# A p50 or p95 this much slower than the baseline's is reported as a regression
+REGRESSION_TOLERANCE = 0.2
+
+UPLOAD_OUTPUT = 'output-datatable.children'
+GENERATE_OUTPUT = 'output-div.children'
+
+
+def percentile(values, q):
+    # Nearest rank
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+def rss_bytes(pid):
+    """ Resident set size of pid and every process below it (the analysis workers), 0 where /proc is missing
+    """
+    if pid is None:
+        return 0
+    pids = [pid]
+    try:
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                with open('/proc/{}/stat'.format(entry)) as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                if int(fields[1]) in pids:
+                    pids.append(int(entry))
+    except OSError:
+        pass
+    total = 0
+    for child in pids:
+        try:
+            with open('/proc/{}/status'.format(child)) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+class RssSampler(threading.Thread):
+    """ Peak RSS of the server process tree since the last reset
+    """
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, rss_bytes(self.pid))
+            time.sleep(SAMPLE_INTERVAL)
+
+    def reset(self):
+        peak, self.peak = self.peak, rss_bytes(self.pid)
+        return max(peak, self.peak)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_server(port):
+    # A separate process, so the load generator doesn't compete with the server for its GIL
+    code = 'import app; app.app.server.run(host="127.0.0.1", port={}, threaded=True)'.format(port)
+    # In its own process group, so stop_server also reaches the analysis workers it forks
+    server = subprocess.Popen([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              start_new_session=hasattr(os, 'killpg'))
+    url = 'http://127.0.0.1:{}'.format(port)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('The server exited during startup')
+        try:
+            urllib.request.urlopen(url + '/_dash-layout', timeout=5).read()
+            return server, url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    stop_server(server)
+    raise RuntimeError('The server did not start within {} seconds'.format(STARTUP_TIMEOUT))
+
+
+def stop_server(server):
+    # Workers left running would keep the forked listening socket open
+    if hasattr(os, 'killpg'):
+        os.killpg(server.pid, signal.SIGTERM)
+    else:
+        server.terminate()
+    server.wait()
+
+
+class DashClient:
+    """ Posts callback requests the way the Dash renderer does, built from the app's own callback map
+    """
+
+    def __init__(self, url):
+        self.url = url
+        with urllib.request.urlopen(url + '/_dash-dependencies', timeout=REQUEST_TIMEOUT) as response:
+            self.callbacks = {callback['output']: callback for callback in json.load(response)}
+
+    def call(self, output, values, changed):
+        """ Run the callback of output with values keyed by 'id.property', returning its response
+        """
+        callback = self.callbacks[output]
+        outputs = [{'id': part.rsplit('.', 1)[0], 'property': part.rsplit('.', 1)[1]}
+                   for part in output.strip('.').split('...')]
+        body = {'output': output, 'outputs': outputs if len(outputs) > 1 else outputs[0],
+                'inputs': [dict(item, value=values.get(item['id'] + '.' + item['property']))
+                           for item in callback['inputs']],
+                'state': [dict(item, value=values.get(item['id'] + '.' + item['property']))
+                          for item in callback['state']],
+                'changedPropIds': changed}
+        request = urllib.request.Request(self.url + '/_dash-update-component', data=json.dumps(body).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            # No content when the callback prevented the update
+            return json.load(response)['response'] if response.status == 200 else {}
+
+
+def find_props(children, component_id):
+    stack = [children]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            if item.get('props', {}).get('id') == component_id:
+                return item['props']
+            stack.extend(item.values())
+    return None
+
+
+class Session:
+    """ One simulated user: the values of the components on their page
+    """
+
+    def __init__(self, client, statement, zipcode, ranked):
+        self.client = client
+        self.statement = statement
+        self.values = {'zipcode.value': zipcode, 'ranked.value': ranked, 'exclude-duplicates.value': []}
+        self.analysis_types = []
+
+    def upload(self):
+        with open(self.statement, 'rb') as f:
+            contents = 'data:text/csv;base64,' + base64.b64encode(f.read()).decode()
+        response = self.client.call(self.client_output(UPLOAD_OUTPUT), {
+            'upload-data.contents': [contents],
+            'upload-data.filename': [os.path.basename(self.statement)],
+            'upload-data.last_modified': [0],
+        }, ['upload-data.contents'])
+        children = response['output-datatable']['children']
+        self.values['stored-data.data'] = find_props(children, 'stored-data')['data']
+        dataset_id = find_props(children, 'dataset-id')
+        self.values['dataset-id.data'] = dataset_id and dataset_id['data']
+        self.values['outlier-state.data'] = response.get('outlier-state', {}).get('data')
+        self.analysis_types = [option['value'] if isinstance(option, dict) else option
+                               for option in find_props(children, 'analysis-type')['options']]
+
+    def generate(self, analysis_type):
+        values = dict(self.values, **{'analysis-type.value': analysis_type, 'submit-button.n_clicks': 1})
+        self.client.call(GENERATE_OUTPUT, values, ['submit-button.n_clicks'])
+
+    def client_output(self, output):
+        # The upload callback has several outputs, keyed by Dash as '..a.b...c.d..'
+        return next(key for key in self.client.callbacks if output in key)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    try:
+        fn(*args)
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, '{}: {}'.format(type(e).__name__, e)
+
+
+def run_phase(executor, fn, argument_lists, sampler):
+    """ Run fn over the argument lists concurrently, returning the phase summary
+    """
+    sampler.reset()
+    start = time.perf_counter()
+    results = list(executor.map(lambda args: timed(fn, *args), argument_lists))
+    wall = time.perf_counter() - start
+    latencies = [latency for latency, error in results if error is None]
+    errors = [error for latency, error in results if error is not None]
+    return {
+        'requests': len(results),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'mean': sum(latencies) / len(latencies) if latencies else None,
+        'throughput': len(latencies) / wall if wall else None,
+        'wall': wall,
+        'peak_rss_mb': sampler.reset() / 1024 ** 2,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """ Print the change in p50 and p95 of every phase and return the phases that regressed
+    """
+    regressions = []
+    print('\n{:<45} {:>10} {:>10} {:>10} {:>10}'.format('vs ' + str(baseline.get('revision')), 'p50', 'change',
+                                                      'p95', 'change'))
+    for phase, result in report['phases'].items():
+        before = baseline['phases'].get(phase)
+        if before is None or result['p50'] is None or before['p50'] is None:
+            continue
+        changes = [(result[q] - before[q]) / before[q] for q in ('p50', 'p95')]
+        print('{:<45} {:>10.3f} {:>+9.0%} {:>10.3f} {:>+9.0%}'.format(phase, result['p50'], changes[0],
+                                                                    result['p95'], changes[1]))
+        if max(changes) > REGRESSION_TOLERANCE:
+            regressions.append(phase)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--statement', default='data/transactions.csv', help='CSV statement every session uploads')
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3, help='Generate clicks per session and analysis type')
+    parser.add_argument('--types', nargs='*', help='analysis types to generate (default: every dropdown option)')
+    parser.add_argument('--zipcode', default='06511')
+    parser.add_argument('--ranked', type=int, default=5)
+    parser.add_argument('--url', help='an already running server, instead of starting one')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='an earlier JSON report to compare with')
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url, pid = args.url.rstrip('/'), None
+    else:
+        server, url = start_server(args.port)
+        pid = server.pid
+    # The RSS of a server given by --url isn't measured
+    sampler = RssSampler(pid)
+    sampler.start()
+
+    try:
+        client = DashClient(url)
+        sessions = [Session(client, args.statement, args.zipcode, args.ranked) for _ in range(args.sessions)]
+        phases = {}
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            phases['Upload'] = run_phase(executor, Session.upload, [(session,) for session in sessions], sampler)
+            sessions = [session for session in sessions if session.analysis_types]
+            if not sessions:
+                raise RuntimeError('Every upload failed: ' + str(phases['Upload']['first_error']))
+            for analysis_type in args.types or sessions[0].analysis_types:
+                phases[analysis_type] = run_phase(executor, Session.generate,
+                                                  [(session, analysis_type) for session in sessions] * args.repeat,
+                                                  sampler)
+    finally:
+        sampler.stop()
+        if server is not None:
+            stop_server(server)
+
+    report = {
+        'revision': git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'statement': args.statement,
+        'sessions': args.sessions,
+        'concurrency': args.concurrency,
+        'repeat': args.repeat,
+        'rss_measured': pid is not None and os.path.isdir('/proc'),
+        'phases': phases,
+    }
+
+    print('{:<45} {:>6} {:>6} {:>8} {:>8} {:>8} {:>8} {:>9}'.format('Phase', 'reqs', 'errors', 'p50 s', 'p95 s',
+                                                                   'p99 s', 'req/s', 'RSS MB'))
+    for phase, result in phases.items():
+        print('{:<45} {:>6} {:>6} {:>8} {:>8} {:>8} {:>8.2f} {:>9.0f}'.format(
+            phase, result['requests'], result['errors'],
+            *('-' if result[q] is None else '{:.3f}'.format(result[q]) for q in ('p50', 'p95', 'p99')),
+            result['throughput'] or 0, result['peak_rss_mb']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            print('\nSlower than the baseline by more than {:.0%}: {}'.format(REGRESSION_TOLERANCE,
+                                                                             ', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
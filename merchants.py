@@ -0,0 +1,163 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Canonical merchant for every known description prefix (matched after the cleanup regexes below)
+MERCHANT_PREFIXES = {
+    'AIRBNB': 'AIRBNB',
+    'AMAZON': 'AMAZON',
+    'AMZN': 'AMAZON',
+    'AMAZON PRIME': 'AMAZON PRIME',
+    'PRIME VIDEO': 'AMAZON PRIME',
+    'AMAZON WEB SERVICES': 'AMAZON WEB SERVICES',
+    'APPLE.COM': 'APPLE',
+    'APPLE STORE': 'APPLE',
+    "APPLEBEE'S": "APPLEBEE'S",
+    'AUDIBLE': 'AUDIBLE',
+    'AUTOZONE': 'AUTOZONE',
+    'B&N': 'BARNES & NOBLE',
+    'BARNES & NOBLE': 'BARNES & NOBLE',
+    'BEST BUY': 'BEST BUY',
+    'CHIPOTLE': 'CHIPOTLE',
+    'COMCAST': 'COMCAST',
+    'CVS': 'CVS',
+    'WWW.CVS.COM': 'CVS',
+    "DICK'S SPORTING": "DICK'S SPORTING GOODS",
+    'DICKS SPORTING': "DICK'S SPORTING GOODS",
+    'DOORDASH': 'DOORDASH',
+    'DUNKIN': 'DUNKIN',
+    'E-PAYMENT': 'E-PAYMENT',
+    'EBAY': 'EBAY',
+    'EXXONMOBIL': 'EXXONMOBIL',
+    'GAMESTOP': 'GAMESTOP',
+    'INDIGO': 'INDIGO',
+    'KOHLS': "KOHL'S",
+    "KOHL'S": "KOHL'S",
+    'MARSHALLS': 'MARSHALLS',
+    "MCDONALD'S": "MCDONALD'S",
+    'NORDSTROM': 'NORDSTROM',
+    'PARKMOBILE': 'PARKMOBILE',
+    'SLING TV': 'SLING TV',
+    'STAPLES': 'STAPLES',
+    'STOP & SHOP': 'STOP & SHOP',
+    'SUPER STOP & SHOP': 'STOP & SHOP',
+    'STUBHUB': 'STUBHUB',
+    'SUBWAY': 'SUBWAY',
+    'SUNOCO': 'SUNOCO',
+    'TARGET': 'TARGET',
+    'THE HOME DEPOT': 'THE HOME DEPOT',
+    'UBER EATS': 'UBER EATS',
+    'UNITED AIRLINES': 'UNITED AIRLINES',
+    'UPWORK': 'UPWORK',
+    'USPS': 'USPS',
+    'WAL-MART': 'WALMART',
+    'WALMART': 'WALMART',
+    'WALGREENS': 'WALGREENS',
+    'WHOLE FOODS': 'WHOLE FOODS',
+}
+
+# Payment processor prefixes that come before the actual merchant, e.g. "AplPay CHIPOTLE" or "BT*DD *DOORDASH"
+PROCESSOR_PREFIX = re.compile(r'^(?:APLPAY\s+|(?:SQ|TST|BT|EPC|PAYPAL|CHANGE|DD|GOOGLE)\s?\*\s*)+(?=\S)')
+# Reference numbers introduced by * or #, e.g. "AMAZON.COM*2649A33F3" or "AUTOZONE # 3475"
+REFERENCE = re.compile(r'\s*[*#].*$')
+# Store numbers and anything after the first token containing a digit, e.g. "CHIPOTLE 1927 0000"
+STORE_NUMBER = re.compile(r'\s+\S*\d.*$')
+
+# Statements pad the merchant field to 20 characters followed by the city and state columns
+MERCHANT_FIELD_WIDTH = 20
+
+# Single-spaced descriptions have lost that padding, e.g. "SKULL & COMBS CO. NEW HAVEN CT", or "NEW HAVEN PARKING
+# MONEW HAVEN CT" when the merchant filled its field. Their city is recognized from the upload itself: a run of up
+# to CITY_MAX_WORDS words before the state that follows at least CITY_MIN_MERCHANTS different merchants.
+CITY_MAX_WORDS = 3
+CITY_MIN_MERCHANTS = 2
+CITY_STATE = re.compile(r'^(.*\S) ([A-Z]{2})$')
+
+
+def _build_trie(prefixes):
+    trie = {}
+    for prefix, merchant in prefixes.items():
+        node = trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node['$'] = merchant
+    return trie
+
+
+MERCHANT_TRIE = _build_trie(MERCHANT_PREFIXES)
+
+
+def _longest_prefix(text):
+    # Walk the trie and keep the longest known prefix that ends on a word boundary
+    node = MERCHANT_TRIE
+    match = None
+    for i, char in enumerate(text):
+        node = node.get(char)
+        if node is None:
+            break
+        if '$' in node and (i + 1 == len(text) or not text[i + 1].isalnum()):
+            match = node['$']
+    return match
+
+
+def _city_starts(text):
+    # Where the city can start in "MERCHANT CITY": at one of the last words, or mid-word where a full merchant
+    # field ends
+    starts = [match.start() for match in re.finditer(r'(?<= )\S', text)][-CITY_MAX_WORDS:]
+    if MERCHANT_FIELD_WIDTH < len(text) and ' ' not in text[MERCHANT_FIELD_WIDTH - 1:MERCHANT_FIELD_WIDTH + 1] and \
+            text[MERCHANT_FIELD_WIDTH:].count(' ') < CITY_MAX_WORDS:
+        starts.append(MERCHANT_FIELD_WIDTH)
+    return sorted(starts)
+
+
+def strip_city_state(texts, known=()):
+    """ Single-spaced "MERCHANT CITY ST" descriptions without their state, and without their city too when it is
+    one of known (as "CITY ST") or follows several merchants among texts
+    """
+    parts = [CITY_STATE.match(text) for text in texts]
+    merchants = {}
+    for match in filter(None, parts):
+        text, state = match.groups()
+        for start in _city_starts(text):
+            merchants.setdefault(text[start:] + ' ' + state, set()).add(text[:start].strip())
+    cities = set(known) | {city for city, names in merchants.items() if len(names) >= CITY_MIN_MERCHANTS}
+
+    stripped = []
+    for text, match in zip(texts, parts):
+        if match is not None:
+            body, state = match.groups()
+            # The longest known city, so "NORTH HAVEN" wins over "HAVEN"
+            start = next((start for start in _city_starts(body) if body[start:] + ' ' + state in cities), None)
+            text = body if start is None else body[:start].strip()
+        stripped.append(text)
+    return stripped
+
+
+def canonicalize_merchants(descriptions):
+    """ Map raw statement descriptions to a categorical column of canonical merchant names
+
+    The rules only run on the unique descriptions; rows are then filled in with a single gather on the codes.
+    """
+    descriptions = descriptions.astype('category')
+    uniques = pd.Series(descriptions.cat.categories.astype(str)).str.upper()
+
+    # Fixed-width descriptions keep the merchant in their first field, single-spaced ones need the city and state
+    # dropped
+    padded = uniques.str.contains(r'\s{2,}')
+    cleaned = uniques.where(~padded, uniques.str.slice(0, MERCHANT_FIELD_WIDTH))
+    cleaned = cleaned.str.replace(r'\s+', ' ', regex=True).str.strip()
+    # The city fields of padded descriptions are known cities for the single-spaced ones
+    fields = uniques[padded].str.slice(MERCHANT_FIELD_WIDTH).str.split(r'\s{2,}', regex=True)
+    known = {field[0].strip() + ' ' + field[-1].strip() for field in fields if len(field) >= 2}
+    cleaned = cleaned.where(padded, pd.Series(strip_city_state(cleaned.tolist(), known), index=cleaned.index))
+    cleaned = cleaned.str.replace(PROCESSOR_PREFIX, '', regex=True)
+    cleaned = cleaned.str.replace(REFERENCE, '', regex=True)
+    cleaned = cleaned.str.replace(STORE_NUMBER, '', regex=True)
+
+    merchants = np.array([_longest_prefix(text) or text for text in cleaned], dtype=object)
+    merchants = pd.Categorical(merchants)
+
+    codes = descriptions.cat.codes.to_numpy()
+    row_codes = np.where(codes >= 0, merchants.codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(row_codes, merchants.categories), index=descriptions.index)
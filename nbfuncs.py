@@ -7,52 +7,58 @@ from nltk.classify import NaiveBayesClassifier
 from nltk.tokenize import word_tokenize
 import plotly.graph_objects as go
 
+from taxonomy import get_taxonomy
+from workers import register_warmup, run_in_worker, TaskTimeout
+
 import nltk
 
 nltk.download('stopwords')
 nltk.download('punkt')
 
 
-def nb_classifier_prediction(df):
+# Trained classifier of this process with the taxonomy revision its labels came from. It lives in the analysis
+# workers (see workers.py), which train it once as they start.
+_model = None
+
+
+def clean_description(text, stop_words):
+    # Tokenize the text
+    words = word_tokenize(text)
+    # Remove stop words and punctuation
+    return [word.lower() for word in words if word.isalpha() and word.lower() not in stop_words]
+
+
+def document_features(document, vocabulary):
+    """ Feature extractor that returns a dictionary of word frequencies
+    """
+    document_words = set(document)
+    features = {}
+    for word in vocabulary:
+        features['contains({})'.format(word)] = (word in document_words)
+    return features
+
+
+def train_necessity_classifier():
     learn_df = pd.read_csv('data/transactions.csv')
     cleaned_df = learn_df.drop(columns=["Address", "City/State", "Zip Code", "Country", "Amount"])  # Remove cols
-    cleaned_df['Necessity'] = np.where(learn_df['Category'].isin(
-        ['Car Insurance', 'Car Loan', 'Car Maintenance', 'Electric Bill', 'Gas', 'Gas Bill', 'Groceries',
-         'Health Care', 'Housing', 'Internet Bill']), True, False)
+    cleaned_df['Necessity'] = get_taxonomy().is_necessity(learn_df['Category'])
 
     # Define the stop words
     stop_words = set(stopwords.words('english'))
 
-    # Define the necessary categories
-    necessary_categories = ['Car Insurance', 'Car Loan', 'Car Maintenance', 'Electric Bill', 'Gas', 'Gas Bill',
-                            'Groceries', 'Health Care', 'Housing', 'Internet Bill']
-
     # Clean the text
-    cleaned_text = []
-    for text in learn_df['Description']:
-        # Tokenize the text
-        words = word_tokenize(text)
-        # Remove stop words and punctuation
-        words = [word.lower() for word in words if word.isalpha() and word.lower() not in stop_words]
-        cleaned_text.append(words)
+    cleaned_text = [clean_description(text, stop_words) for text in learn_df['Description']]
 
     # Get the frequency distribution of the words
     all_words = []
     for words in cleaned_text:
         all_words += words
     fd = FreqDist(all_words)
-
-    # Define a feature extractor function that returns a dictionary of word frequencies
-    def document_features(document):
-        document_words = set(document)
-        features = {}
-        for word in fd.keys():
-            features['contains({})'.format(word)] = (word in document_words)
-        return features
+    vocabulary = list(fd.keys())
 
     # Create a labeled feature set
-    featuresets = [(document_features(text), category in necessary_categories) for text, category in
-                   zip(cleaned_text, learn_df['Category'])]
+    featuresets = [(document_features(text, vocabulary), bool(necessity)) for text, necessity in
+                   zip(cleaned_text, cleaned_df['Necessity'])]
 
     # Split the data into training and testing sets
     train_set, test_set = featuresets[100:], featuresets[:100]
@@ -63,27 +69,36 @@ def nb_classifier_prediction(df):
     # Test the classifier
     accuracy = nltk.classify.util.accuracy(classifier, test_set)
     print('Accuracy:', accuracy)
+    return stop_words, vocabulary, classifier
 
-    # Load new data
-    data_new = df
-    df_new = pd.DataFrame(data_new)
 
-    # Clean the text
-    cleaned_text_new = []
-    for text in df_new['Description']:
-        # Tokenize the text
-        words = word_tokenize(text)
-        # Remove stop words and punctuation
-        words = [word.lower() for word in words if word.isalpha() and word.lower() not in stop_words]
-        cleaned_text_new.append(words)
-
-    # Get the predictions for the new data
-    predictions = []
-    for text in cleaned_text_new:
-        predictions.append(classifier.classify(document_features(text)))
+@register_warmup
+def get_necessity_classifier():
+    """ The trained classifier, retrained only when the taxonomy's necessity labels have changed
+    """
+    global _model
+    revision = get_taxonomy().revision
+    if _model is None or _model[0] != revision:
+        _model = (revision, train_necessity_classifier())
+    return _model[1]
+
+
+def predict_necessities(descriptions):
+    stop_words, vocabulary, classifier = get_necessity_classifier()
+    return [classifier.classify(document_features(clean_description(text, stop_words), vocabulary))
+            for text in descriptions]
+
+
+def nb_classifier_prediction(df, session=None):
+    # Classified in an analysis worker; a newer classification from the same session supersedes this one
+    try:
+        predictions = run_in_worker(predict_necessities, df['Description'].tolist(),
+                                    key=session and ('necessities', session))
+    except TaskTimeout as e:
+        return str(e)
 
     # Create a new DataFrame that includes the predicted values
-    results_df = pd.DataFrame({'Description': df_new['Description'], 'Predicted_Necessity': predictions})
+    results_df = pd.DataFrame({'Description': df['Description'], 'Predicted_Necessity': predictions})
 
     predictions_fig = go.Figure(data=[go.Table(
         header=dict(values=list(results_df.columns),
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from dash import dcc
+
+from sketches import TOTAL_BUCKETS, GAMMA, build_counts, sketch_quantiles, sketch_mad
+
+# Modified z-score above which a transaction is raised as an alert (Iglewicz and Hoaglin)
+THRESHOLD = 3.5
+
+# Categories need a few transactions before their median and MAD mean anything
+MIN_OBSERVATIONS = 8
+
+
+class OutlierDetector:
+    """ Streaming per-category outlier detector
+
+    Only a fixed-size amount sketch is kept per category, so memory is bounded by the number of categories no
+    matter how many rows have been ingested, and a new statement is scored without revisiting earlier ones. The
+    ids of the datasets merged so far are kept too, so uploading the same statement again doesn't count it twice.
+    """
+
+    def __init__(self, state=None):
+        self.categories = []
+        self.counts = np.zeros((0, TOTAL_BUCKETS), dtype='int64')
+        self.datasets = []
+        # State saved with a different bucket layout can't be read back; scoring starts over instead
+        if state and state.get('buckets') == TOTAL_BUCKETS:
+            self.categories = list(state['categories'])
+            self.datasets = list(state.get('datasets', []))
+            self.counts = np.zeros((len(self.categories), TOTAL_BUCKETS), dtype='int64')
+            for row, (idx, cnt) in enumerate(state['counts']):
+                self.counts[row, idx] = cnt
+
+    def to_dict(self):
+        # Sparse form so the state fits comfortably in a dcc.Store
+        counts = []
+        for row in self.counts:
+            idx = np.flatnonzero(row)
+            counts.append([idx.tolist(), row[idx].tolist()])
+        return {'categories': self.categories, 'counts': counts, 'buckets': TOTAL_BUCKETS, 'datasets': self.datasets}
+
+    def score(self, counts, rows, amounts):
+        """ Modified z-score of every amount against the sketch of its category (rows index counts)
+        """
+        medians = sketch_quantiles(counts, 0.5)
+        mad = sketch_mad(counts, medians)
+        # Subscriptions and bills often repeat the exact same amount, which gives a MAD of zero
+        mad = np.maximum(mad, np.maximum((GAMMA - 1) * medians, 0.01))
+
+        scores = 0.6745 * (amounts - medians[rows]) / mad[rows]
+        scores[counts.sum(axis=1)[rows] < MIN_OBSERVATIONS] = 0.0
+        return scores
+
+    def update(self, df, dataset_id=None):
+        """ Score a batch of transactions, then add it to the sketches; returns the modified z-score of every row
+
+        Each month of the batch is scored against everything before it, the earlier uploads and the batch's
+        earlier months, never against itself; undated rows come last. A batch with a dataset_id that was already
+        added is scored the same way against the sketches without it, and isn't added again.
+        """
+        categories = df['Category'].fillna('Uncategorized').astype('category')
+        lookup = {name: i for i, name in enumerate(self.categories)}
+        new = [name for name in categories.cat.categories if name not in lookup]
+        for name in new:
+            lookup[name] = len(self.categories)
+            self.categories.append(name)
+        self.counts = np.vstack([self.counts, np.zeros((len(new), TOTAL_BUCKETS), dtype='int64')])
+
+        # Translate the batch's category codes to detector rows once, then gather per transaction
+        code_map = np.array([lookup[name] for name in categories.cat.categories], dtype='int64')
+        rows = code_map[categories.cat.codes.to_numpy()]
+        amounts = df['Amount'].to_numpy(dtype='float64')
+
+        seen = dataset_id is not None and dataset_id in self.datasets
+        counts = self.counts - build_counts(rows, amounts, len(self.categories)) if seen else self.counts.copy()
+
+        # Rows grouped by month, oldest first, each month one slice of order
+        months = pd.factorize(df['Date'].dt.to_period('M'), sort=True)[0] if 'Date' in df \
+            else np.zeros(len(df), dtype='int64')
+        months[months < 0] = months.max(initial=-1) + 1
+        order = np.argsort(months, kind='stable')
+        bounds = np.flatnonzero(np.diff(months[order])) + 1
+
+        scores = np.zeros(len(df))
+        for month in np.split(order, bounds):
+            scores[month] = self.score(counts, rows[month], amounts[month])
+            counts += build_counts(rows[month], amounts[month], len(self.categories))
+
+        if not seen:
+            self.counts = counts
+            if dataset_id is not None:
+                self.datasets.append(dataset_id)
+        return scores
+
+
+def create_outlier_alerts(df):
+    alerts_df = df[df['Outlier_Score'] > THRESHOLD]
+    alerts_df = alerts_df.sort_values('Outlier_Score', ascending=False)
+    alerts_df = pd.DataFrame().assign(Date=alerts_df['Date'].dt.strftime('%Y-%m-%d'),
+                                      Description=alerts_df['Description'],
+                                      Category=alerts_df['Category'],
+                                      Amount=alerts_df['Amount'].round(2),
+                                      Score=alerts_df['Outlier_Score'].round(2))
+
+    alerts_fig = go.Figure(data=[go.Table(
+        header=dict(values=list(alerts_df.columns),
+                    fill_color='#004c6d',
+                    font_color='white',
+                    align='left'),
+        cells=dict(
+            values=[alerts_df.Date, alerts_df.Description, alerts_df.Category, alerts_df.Amount, alerts_df.Score],
+            fill_color='#a7b8c6',
+            font_color='black',
+            align='left')),
+    ])
+
+    alerts_fig.update_layout(
+        title='Which transactions are unusually large for their category? (' + str(len(alerts_df)) + ' alerts)',
+        height=800,
+    )
+    return dcc.Graph(figure=alerts_fig)
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from sketches import TOTAL_BUCKETS, bucket_index, sketch_quantiles, interpolated_bounds
+
+
+class SpendSketches:
+    """ Amount sketches per category and month, merged by adding their bucket counts (see sketches.py)
+    """
+
+    def __init__(self, counts=None, extremes=None):
+        if counts is None:
+            counts = pd.Series([], dtype='int64', index=pd.MultiIndex.from_arrays(
+                [pd.Index([], dtype=object), pd.PeriodIndex([], freq='M'), pd.Index([], dtype='int64')],
+                names=['Category', 'Month', 'Bucket']))
+        if extremes is None:
+            extremes = pd.DataFrame({'Min': [], 'Max': []}, dtype='float64', index=pd.MultiIndex.from_arrays(
+                [pd.Index([], dtype=object), pd.PeriodIndex([], freq='M')], names=['Category', 'Month']))
+        self.counts = counts
+        self.extremes = extremes
+
+    @classmethod
+    def from_frame(cls, df):
+        # A transaction without a date belongs to no month, and one without an amount has nothing to count
+        df = df.dropna(subset=['Date', 'Amount'])
+        categories, category_codes = np.unique(df['Category'].fillna('Uncategorized').astype(str).to_numpy(),
+                                               return_inverse=True)
+        month_codes, months = pd.factorize(df['Date'].dt.to_period('M'))
+
+        # One key per (category, month, bucket); counting the distinct keys builds every sketch in one pass
+        keys = (category_codes * len(months) + month_codes) * TOTAL_BUCKETS + \
+            bucket_index(df['Amount'].to_numpy(dtype='float64'))
+        keys, counts = np.unique(keys, return_counts=True)
+        groups, buckets = np.divmod(keys, TOTAL_BUCKETS)
+        index = pd.MultiIndex.from_arrays([categories[groups // len(months)], months[groups % len(months)], buckets],
+                                          names=['Category', 'Month', 'Bucket'])
+
+        amounts = pd.Series(df['Amount'].to_numpy(dtype='float64'))
+        extremes = amounts.groupby([categories[category_codes], months[month_codes]]).agg(['min', 'max']).dropna()
+        extremes.columns = ['Min', 'Max']
+        extremes.index.names = ['Category', 'Month']
+        return cls(pd.Series(counts, index=index), extremes)
+
+    def merge(self, other):
+        if self.counts.empty:
+            return other
+        if other.counts.empty:
+            return self
+        extremes = pd.concat([self.extremes, other.extremes]).groupby(level=['Category', 'Month'])
+        return SpendSketches(self.counts.add(other.counts, fill_value=0).astype('int64'),
+                             pd.DataFrame({'Min': extremes['Min'].min(), 'Max': extremes['Max'].max()}))
+
+    @staticmethod
+    def _filter(data, categories=None, start=None, end=None):
+        # Rows of counts or extremes in the given categories and months
+        if categories is not None:
+            data = data[data.index.get_level_values('Category').isin(list(categories))]
+        months = data.index.get_level_values('Month')
+        if start is not None:
+            data = data[months >= pd.Period(start, freq='M')]
+            months = data.index.get_level_values('Month')
+        if end is not None:
+            data = data[months <= pd.Period(end, freq='M')]
+        return data
+
+    def select(self, categories=None, start=None, end=None):
+        """ One dense sketch per category, over the months from start to end inclusive
+        """
+        counts = self._filter(self.counts, categories, start, end)
+        names, codes = np.unique(counts.index.get_level_values('Category').to_numpy(dtype=str), return_inverse=True)
+        dense = np.zeros((len(names), TOTAL_BUCKETS), dtype='int64')
+        np.add.at(dense, (codes, counts.index.get_level_values('Bucket').to_numpy()), counts.to_numpy())
+        return names, dense
+
+    def quantiles(self, qs, categories=None, start=None, end=None, combined=False):
+        """ Quantiles per category (or of all the selected categories together), one column per quantile
+        """
+        names, dense = self.select(categories, start, end)
+        extremes = self._filter(self.extremes, categories, start, end)
+        if combined:
+            names, dense = ['All'], dense.sum(axis=0, keepdims=True)
+            extremes = extremes.groupby(lambda key: 'All')
+        else:
+            extremes = extremes.groupby(level='Category')
+        quantiles_df = pd.DataFrame({'Transactions': dense.sum(axis=1),
+                                     'Min': extremes['Min'].min().reindex(names).to_numpy(),
+                                     'Max': extremes['Max'].max().reindex(names).to_numpy()},
+                                    index=pd.Index(names, name='Category'))
+        for q in qs:
+            quantiles_df['p' + format(q * 100, 'g')] = sketch_quantiles(dense, q) if len(dense) else []
+        return quantiles_df
+
+    def quantile_bounds(self, qs, categories=None):
+        """ Bounds on the exact interpolated quantiles of every category, two columns (low, high) per quantile
+        """
+        names, dense = self.select(categories)
+        extremes = self.extremes.groupby(level='Category')
+        smallest = extremes['Min'].min().reindex(names).to_numpy()
+        largest = extremes['Max'].max().reindex(names).to_numpy()
+        bounds_df = pd.DataFrame(index=pd.Index(names, name='Category'))
+        for q in qs:
+            low, high = interpolated_bounds(dense, q) if len(dense) else ([], [])
+            name = 'p' + format(q * 100, 'g')
+            # No quantile lies outside the amounts themselves
+            bounds_df[name + '_low'] = np.clip(low, smallest, largest)
+            bounds_df[name + '_high'] = np.clip(high, smallest, largest)
+        return bounds_df
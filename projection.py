@@ -0,0 +1,144 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from dash import dcc
+
+from datasets import dataset_hash
+from figspec import figure, bar_trace, line_trace
+
+# Simulated paths per projection, drawn PATH_BATCH at a time to bound memory
+PATHS = 20000
+PATH_BATCH = 5000
+# Above this many simulated transactions on one path, their spend is drawn from its normal approximation
+EXACT_MAX_TRANSACTIONS = 32
+# Days of history the daily counts and amounts are resampled from, ending on the as-of date
+HISTORY_DAYS = 365
+QUANTILES = [0.1, 0.5, 0.9]
+# Fixed, so a dataset always gets the same projection for the same as-of date
+SEED = 0
+
+MAX_CACHED_PROJECTIONS = 32
+
+_cache = OrderedDict()
+
+
+def _simulate_block(all_counts, count_starts, count_sizes, all_amounts, amount_starts, amount_sizes, moments,
+                    days, paths, rng):
+    categories = len(count_sizes)
+    # Transactions per category and path: the counts of `days` resampled days of history
+    picked_days = (rng.random((categories, paths, days)) * count_sizes[:, None, None]).astype('int64')
+    transactions = all_counts[count_starts[:, None, None] + picked_days].sum(axis=2)
+
+    # Paths with few transactions draw every amount; beyond EXACT_MAX_TRANSACTIONS their sum is drawn from its
+    # normal approximation instead, so busy ledgers don't need one draw per simulated transaction
+    exact = np.where(transactions <= EXACT_MAX_TRANSACTIONS, transactions, 0).ravel()
+    owners = np.repeat(np.arange(categories * paths), exact)
+    category_of = owners // paths
+    picked = (rng.random(len(owners)) * amount_sizes[category_of]).astype('int64')
+    spend = np.bincount(owners, weights=all_amounts[amount_starts[category_of] + picked],
+                        minlength=categories * paths).reshape(categories, paths)
+
+    many = transactions > EXACT_MAX_TRANSACTIONS
+    if many.any():
+        mean, std = moments[0][:, None], moments[1][:, None]
+        approximate = transactions * mean + np.sqrt(transactions) * std * rng.standard_normal(transactions.shape)
+        spend = np.where(many, approximate, spend)
+    return spend
+
+
+def simulate_remaining_spend(daily_counts, amounts, days, paths=PATHS, rng=None):
+    """ Simulated spend over the next `days` days, one row per category and one column per path
+
+    daily_counts and amounts hold one array per category: its number of transactions on every day of the history,
+    and the amounts of those transactions. Each simulated day draws a day of history for its count, then that many
+    amounts, both with replacement. Every category, path and day of a block of PATH_BATCH paths is drawn in one
+    batch of array operations.
+    """
+    rng = np.random.default_rng(SEED) if rng is None else rng
+    count_sizes = np.array([len(counts) for counts in daily_counts])
+    amount_sizes = np.array([len(values) for values in amounts])
+    all_counts, all_amounts = np.concatenate(daily_counts), np.concatenate(amounts)
+    count_starts = np.concatenate([[0], np.cumsum(count_sizes)[:-1]])
+    amount_starts = np.concatenate([[0], np.cumsum(amount_sizes)[:-1]])
+    moments = (np.array([values.mean() for values in amounts]), np.array([values.std() for values in amounts]))
+
+    blocks = [_simulate_block(all_counts, count_starts, count_sizes, all_amounts, amount_starts, amount_sizes,
+                              moments, days, min(PATH_BATCH, paths - start), rng)
+              for start in range(0, paths, PATH_BATCH)]
+    return np.hstack(blocks)
+
+
+def project_month_end(df, as_of=None, paths=PATHS):
+    """ P10/P50/P90 month-end total of every category, from the spend so far this month and a simulation of the
+    rest of it; cached per dataset and as-of date (the latest transaction by default)
+    """
+    as_of = (df['Date'].max() if as_of is None else pd.Timestamp(as_of)).normalize()
+    key = (dataset_hash(df), as_of, paths)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    month_start = as_of.replace(day=1)
+    month_end = month_start + pd.offsets.MonthEnd(0)
+    remaining_days = (month_end - as_of).days
+    history_start = as_of - pd.Timedelta(days=HISTORY_DAYS - 1)
+
+    history = df[(df['Date'] >= history_start) & (df['Date'] < as_of + pd.Timedelta(days=1))]
+    history = history.dropna(subset=['Category', 'Amount'])
+    # History starts at the first transaction when that is later, so a short ledger isn't padded with empty days
+    first_day = max(history_start, history['Date'].min().normalize()) if len(history) else as_of
+    days_of_history = (as_of - first_day).days + 1
+    day_numbers = (history['Date'].dt.normalize() - first_day).dt.days.to_numpy()
+
+    categories, codes = np.unique(history['Category'].astype(str).to_numpy(), return_inverse=True)
+    day_counts = np.bincount(codes * days_of_history + day_numbers,
+                             minlength=len(categories) * days_of_history).reshape(len(categories),
+                                                                                   days_of_history)
+    history_amounts = history['Amount'].to_numpy(dtype='float64')
+    order = np.argsort(codes, kind='stable')
+    amounts = np.split(history_amounts[order], np.cumsum(np.bincount(codes, minlength=len(categories)))[:-1])
+
+    spent = np.bincount(codes, weights=np.where(history['Date'].to_numpy() >= month_start.to_datetime64(),
+                                                history_amounts, 0), minlength=len(categories))
+    if remaining_days > 0 and len(categories):
+        remaining = simulate_remaining_spend(list(day_counts), amounts, remaining_days, paths)
+        month_end_totals = spent[:, None] + remaining
+    else:
+        month_end_totals = np.repeat(spent[:, None], paths, axis=1)
+
+    # The month-end total of all categories together, per path
+    names = np.append(categories, 'All categories')
+    month_end_totals = np.vstack([month_end_totals, month_end_totals.sum(axis=0)])
+    projection_df = pd.DataFrame({'Category': names,
+                                  'Spent_So_Far': np.append(spent, spent.sum()).round(2)})
+    for q, values in zip(QUANTILES, np.quantile(month_end_totals, QUANTILES, axis=1)):
+        projection_df['P' + format(q * 100, 'g')] = values.round(2)
+    projection_df.attrs.update(as_of=as_of, remaining_days=remaining_days, paths=paths)
+
+    _cache[key] = projection_df
+    if len(_cache) > MAX_CACHED_PROJECTIONS:
+        _cache.popitem(last=False)
+    return projection_df
+
+
+def create_month_end_projection(df, as_of=None):
+    projection_df = project_month_end(df, as_of)
+    categories = projection_df[projection_df['Category'] != 'All categories'].sort_values('P50', ascending=False)
+    total = projection_df.set_index('Category').loc['All categories']
+
+    median = bar_trace(categories['Category'], categories['P50'], colors='#004c6d', name='P50', showlegend=True)
+    median['error_y'] = {'type': 'data', 'symmetric': False,
+                         'array': (categories['P90'] - categories['P50']).tolist(),
+                         'arrayminus': (categories['P50'] - categories['P10']).tolist(), 'color': '#618d9e'}
+    spent = line_trace(categories['Category'].tolist(), categories['Spent_So_Far'], 'Spent so far', '#B31942',
+                       mode='markers', marker={'symbol': 'line-ew-open', 'size': 18})
+    attrs = projection_df.attrs
+    projection_fig = figure(
+        [median, spent],
+        'Where will each category end the month? (as of {:%Y-%m-%d}, {} days left; all categories: P10 ${:,.0f}, '
+        'P50 ${:,.0f}, P90 ${:,.0f})'.format(attrs['as_of'], attrs['remaining_days'], total['P10'], total['P50'],
+                                              total['P90']),
+        xaxis=dict(title={'text': 'Category'}), yaxis=dict(title={'text': 'Month-end total'}),
+        height=600)
+    return dcc.Graph(figure=projection_fig)
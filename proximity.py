@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pgeocode
+
+from workers import register_warmup, run_in_worker
+
+# Distance bands from the home zip code, in miles
+BAND_EDGES = [5, 25, 100]
+BANDS = ['Under 5 miles', '5 to 25 miles', '25 to 100 miles', 'Over 100 miles']
+UNKNOWN_BAND = 'Unknown location'
+
+EARTH_RADIUS_MILES = 3958.8
+
+_nominatim = None
+# Blank zips never reach the geocoder
+_centroids = {'': (np.nan, np.nan)}
+
+
+@register_warmup
+def get_nominatim():
+    global _nominatim
+    if _nominatim is None:
+        _nominatim = pgeocode.Nominatim('us')
+    return _nominatim
+
+
+def query_postal_codes(zips):
+    # Runs in an analysis worker, which loads the geocoding table once
+    return get_nominatim().query_postal_code(zips)[['latitude', 'longitude']].to_numpy(dtype='float64')
+
+
+def zip_centroids(zips, key=None):
+    """ Latitude and longitude of each 5-digit zip code, geocoded once per zip for the life of the process
+
+    key is the analysis task key (see workers.py) of zips that still need geocoding.
+    """
+    missing = list({z for z in zips if z not in _centroids})
+    if missing:
+        for z, centroid in zip(missing, run_in_worker(query_postal_codes, missing, key=key)):
+            _centroids[z] = tuple(centroid)
+    return np.array([_centroids[z] for z in zips], dtype='float64').reshape(-1, 2)
+
+
+def zip_to_number(zip_codes):
+    # '07102-3122', '7040' and 7040 all become the number 7040
+    return pd.to_numeric(zip_codes.astype(str).str.split('-').str[0].str.strip(), errors='coerce')
+
+
+def distinct_zips(zip_codes):
+    """ Code of every row and the distinct zip codes, normalized to five digits ('' when missing)
+    """
+    codes, uniques = pd.factorize(pd.Series(zip_codes))
+    numbers = zip_to_number(pd.Series(uniques)).to_numpy()
+    return codes, ['%05d' % z if not np.isnan(z) else '' for z in numbers]
+
+
+def locate_zip_codes(zip_codes, key=None):
+    """ Latitude and longitude of every row, geocoding each distinct zip code once
+    """
+    codes, zips = distinct_zips(zip_codes)
+    # Missing zip codes have no location
+    return np.vstack([zip_centroids(zips, key), [np.nan, np.nan]])[codes]
+
+
+def haversine_miles(lat, lon, home_lat, home_lon):
+    lat, lon, home_lat, home_lon = (np.radians(value) for value in (lat, lon, home_lat, home_lon))
+    a = np.sin((lat - home_lat) / 2) ** 2 + np.cos(lat) * np.cos(home_lat) * np.sin((lon - home_lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+
+def distance_bands(zip_codes, home_zip, key=None):
+    """ Distance band of every transaction from home_zip, or None when the home zip can't be located
+    """
+    codes, zips = distinct_zips(zip_codes)
+
+    centroids = zip_centroids([home_zip[:5]] + zips, key)
+    home, centroids = centroids[0], centroids[1:]
+    if np.isnan(home).any():
+        return None
+    miles = haversine_miles(centroids[:, 0], centroids[:, 1], home[0], home[1])
+
+    # Zips that didn't geocode and missing ones are in the unknown band
+    band_codes = np.where(np.isnan(miles), len(BANDS), np.digitize(miles, BAND_EDGES))
+    band_codes = np.append(band_codes, len(BANDS))
+    return pd.Categorical.from_codes(band_codes[codes], BANDS + [UNKNOWN_BAND])
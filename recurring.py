@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from dash import dcc
+
+# Billing periods in days that a recurring charge is matched against
+PERIODS = {'Weekly': 7, 'Biweekly': 14, 'Monthly': 30.44, 'Quarterly': 91.31, 'Annual': 365.25}
+
+MIN_CHARGES = 3
+# Share of intervals that must fall within INTERVAL_TOLERANCE of the merchant's median interval
+MIN_REGULAR_SHARE = 0.6
+INTERVAL_TOLERANCE = 0.3
+# Median absolute deviation of the amounts relative to their median
+AMOUNT_TOLERANCE = 0.10
+
+
+def find_recurring_charges(df):
+    """ Find merchants that charge a stable amount at a regular interval
+
+    Charges are keyed by merchant and category, so generic descriptions such as "E-Payment" still separate the
+    housing payment from the car loan. One sort by that key and date is followed by vectorized diffs and grouped
+    aggregations, so the cost is O(n log n) in the number of transactions rather than comparing charges pairwise.
+    """
+    rec_df = pd.DataFrame().assign(Merchant=df['Merchant'], Category=df['Category'], Date=df['Date'],
+                                   Amount=df['Amount'])
+    rec_df = rec_df.dropna(subset=['Merchant', 'Category'])
+    rec_df = rec_df.sort_values(['Merchant', 'Category', 'Date'], kind='mergesort')
+
+    merchants = rec_df['Merchant'].to_numpy()
+    categories = rec_df['Category'].to_numpy()
+    same_key = np.concatenate([[False], (merchants[1:] == merchants[:-1]) & (categories[1:] == categories[:-1])])
+    rec_df['Interval'] = rec_df['Date'].diff().dt.days.where(same_key)
+
+    grouped = rec_df.groupby(['Merchant', 'Category'], observed=True, sort=False)
+    median_interval = grouped['Interval'].transform('median')
+    median_amount = grouped['Amount'].transform('median')
+    rec_df['Regular'] = ((rec_df['Interval'] - median_interval).abs() <= INTERVAL_TOLERANCE * median_interval)
+    rec_df['Amount_Deviation'] = (rec_df['Amount'] - median_amount).abs()
+
+    grouped = rec_df.groupby(['Merchant', 'Category'], observed=True)
+    recurring_df = grouped.agg(Charges=('Amount', 'size'),
+                               Typical_Amount=('Amount', 'median'),
+                               Amount_Deviation=('Amount_Deviation', 'median'),
+                               Interval=('Interval', 'median'),
+                               Regular=('Regular', 'sum'),
+                               Last_Charge=('Date', 'max')).reset_index()
+
+    recurring_df = recurring_df[(recurring_df['Charges'] >= MIN_CHARGES) &
+                                (recurring_df['Interval'] > 0) &
+                                (recurring_df['Regular'] >= MIN_REGULAR_SHARE * (recurring_df['Charges'] - 1)) &
+                                (recurring_df['Amount_Deviation'] <= AMOUNT_TOLERANCE *
+                                 recurring_df['Typical_Amount'])]
+
+    # Match the median interval to the closest billing period and drop anything that fits none of them
+    periods = np.array(list(PERIODS.values()))
+    distance = np.abs(recurring_df['Interval'].to_numpy()[:, None] - periods[None, :]) / periods[None, :]
+    closest = distance.argmin(axis=1)
+    recurring_df = recurring_df.assign(Frequency=np.array(list(PERIODS.keys()))[closest],
+                                       Period=periods[closest])
+    recurring_df = recurring_df[distance.min(axis=1) <= INTERVAL_TOLERANCE]
+
+    recurring_df['Next_Expected'] = recurring_df['Last_Charge'] + pd.to_timedelta(
+        recurring_df['Interval'].round(), unit='D')
+    recurring_df['Annual_Cost'] = recurring_df['Typical_Amount'] * PERIODS['Annual'] / recurring_df['Period']
+    return recurring_df.sort_values('Annual_Cost', ascending=False)
+
+
+def create_recurring_charges(df):
+    recurring_df = find_recurring_charges(df)
+
+    recurring_fig = go.Figure(data=[go.Table(
+        header=dict(values=['Merchant', 'Category', 'Frequency', 'Typical Amount', 'Charges', 'Last Charge',
+                            'Next Expected', 'Annual Cost'],
+                    fill_color='#004c6d',
+                    font_color='white',
+                    align='left'),
+        cells=dict(
+            values=[recurring_df.Merchant.astype(str), recurring_df.Category, recurring_df.Frequency,
+                    recurring_df.Typical_Amount.round(2), recurring_df.Charges,
+                    recurring_df.Last_Charge.dt.strftime('%Y-%m-%d'),
+                    recurring_df.Next_Expected.dt.strftime('%Y-%m-%d'), recurring_df.Annual_Cost.round(2)],
+            fill_color='#a7b8c6',
+            font_color='black',
+            align='left')),
+    ])
+
+    recurring_fig.update_layout(
+        title='Which charges recur, and when is the next one due?',
+        height=800,
+    )
+    return dcc.Graph(figure=recurring_fig)
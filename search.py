@@ -0,0 +1,96 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Columns searched from the preview table
+SEARCH_COLUMNS = ['Description', 'City/State', 'Category']
+
+TOKEN_PATTERN = r'[A-Z0-9]+'
+
+# Sorts after every token, to find the end of a prefix range in the sorted vocabulary
+_LAST_CHAR = '\U0010ffff'
+
+
+def tokenize(text):
+    return re.findall(TOKEN_PATTERN, text.upper())
+
+
+class SearchIndex:
+    """ Token inverted index over the searchable columns of a ledger
+
+    The vocabulary is kept sorted, so a prefix maps to one contiguous range of tokens. Posting lists are sorted
+    row numbers stored back to back in one integer array, with `offsets` marking where each token's list starts.
+    A query is the intersection of the lists of its terms, every term matching as a prefix.
+    """
+
+    def __init__(self, vocabulary, offsets, postings, rows):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.postings = postings
+        self.rows = rows
+
+    @classmethod
+    def from_frame(cls, df, columns=SEARCH_COLUMNS):
+        keys = []
+        vocabularies = []
+        for column in columns:
+            if column not in df.columns:
+                continue
+            # Each distinct value is tokenized once, then its tokens are spread to its rows by code
+            codes, values = pd.factorize(df[column])
+            tokens = pd.Series(values).astype(str).str.upper().str.findall(TOKEN_PATTERN).explode().dropna()
+            vocabularies.append(tokens.to_numpy(dtype=str))
+            keys.append((tokens.index.to_numpy(), tokens.to_numpy(dtype=str), codes, len(values)))
+
+        vocabulary = np.unique(np.concatenate(vocabularies)) if vocabularies else np.array([], dtype=str)
+        pairs = [np.array([], dtype='int64')]
+        for value_codes, tokens, codes, distinct in keys:
+            token_ids = np.searchsorted(vocabulary, tokens)
+            # Rows of every distinct value, grouped by value
+            order = np.argsort(codes, kind='stable')
+            counts = np.bincount(codes[codes >= 0], minlength=distinct)
+            starts = np.concatenate([[0], np.cumsum(counts)])[:-1] + (codes < 0).sum()
+            # One (token, row) pair for every row holding each (value, token)
+            repeats = counts[value_codes]
+            first = np.repeat(starts[value_codes], repeats)
+            step = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+            pairs.append(np.repeat(token_ids, repeats).astype('int64') * len(df) + order[first + step])
+
+        # Sorted, distinct pairs are the posting lists in token order, each already sorted by row
+        pairs = np.unique(np.concatenate(pairs))
+        token_ids, postings = np.divmod(pairs, max(len(df), 1))
+        offsets = np.searchsorted(token_ids, np.arange(len(vocabulary) + 1))
+        return cls(vocabulary, offsets, postings, len(df))
+
+    def prefix_postings(self, prefix):
+        """ Sorted rows holding any token that starts with prefix
+        """
+        lo = np.searchsorted(self.vocabulary, prefix, side='left')
+        hi = np.searchsorted(self.vocabulary, prefix + _LAST_CHAR, side='left')
+        if hi - lo == 1:
+            return self.postings[self.offsets[lo]:self.offsets[hi]]
+        return np.unique(self.postings[self.offsets[lo]:self.offsets[hi]])
+
+    def search(self, query):
+        """ Sorted rows matching every term of query; all rows for an empty query
+        """
+        terms = tokenize(query or '')
+        if not terms:
+            return np.arange(self.rows)
+        postings = sorted((self.prefix_postings(term) for term in set(terms)), key=len)
+        rows = postings[0]
+        for posting in postings[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, posting, assume_unique=True)
+        return rows
+
+    def page(self, df, query, page, page_size, hidden=None):
+        """ One page of the rows of df matching query, and the number of matches; hidden is an optional boolean
+        mask of rows left out
+        """
+        rows = self.search(query)
+        if hidden is not None:
+            rows = rows[~hidden[rows]]
+        return df.iloc[rows[page * page_size:(page + 1) * page_size]], len(rows)
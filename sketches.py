@@ -0,0 +1,91 @@
+import numpy as np
+
+# Every sketch shares the same log-spaced buckets, so counts built from different uploads, categories or months
+# can simply be added together. Positive and negative amounts (refunds) get mirrored buckets around a zero bucket
+# that holds everything within MIN_VALUE of zero; amounts beyond MAX_VALUE either way fall into the outermost
+# buckets.
+MIN_VALUE = 0.01
+MAX_VALUE = 1e6
+N_BUCKETS = 512
+GAMMA = (MAX_VALUE / MIN_VALUE) ** (1 / N_BUCKETS)
+
+# Any quantile read from a sketch is the geometric midpoint of its bucket, so for amounts whose size is inside
+# [MIN_VALUE, MAX_VALUE] the relative error against the exact quantile is at most sqrt(GAMMA) - 1 (about 1.8%),
+# and within MIN_VALUE of zero the absolute error is at most MIN_VALUE
+RELATIVE_ERROR = np.sqrt(GAMMA) - 1
+
+_MAGNITUDES = MIN_VALUE * GAMMA ** (np.arange(N_BUCKETS) + 0.5)
+# Bucket values in ascending order: -MAX_VALUE, the negative buckets, zero, the positive buckets, MAX_VALUE
+BUCKET_VALUES = np.concatenate([[-MAX_VALUE], -_MAGNITUDES[::-1], [0.0], _MAGNITUDES, [MAX_VALUE]])
+TOTAL_BUCKETS = len(BUCKET_VALUES)
+ZERO_BUCKET = N_BUCKETS + 1
+
+
+def bucket_index(values):
+    """ Map amounts to the index of the sketch bucket they fall into
+    """
+    values = np.asarray(values, dtype='float64')
+    sizes = np.abs(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        idx = np.floor(np.log(sizes / MIN_VALUE) / np.log(GAMMA)) + 1
+    idx = np.clip(np.where(sizes > MIN_VALUE, idx, 0), 0, N_BUCKETS + 1)
+    return (ZERO_BUCKET + np.sign(np.nan_to_num(values)) * idx).astype('int64')
+
+
+def quantile_error(quantiles):
+    """ Largest possible distance between quantiles read from a sketch and the exact ones
+    """
+    return np.abs(quantiles) * RELATIVE_ERROR + MIN_VALUE
+
+
+def build_counts(codes, values, n_groups):
+    """ Build one sketch per group in a single pass; codes are the group number of every value
+    """
+    flat = np.asarray(codes, dtype='int64') * TOTAL_BUCKETS + bucket_index(values)
+    counts = np.bincount(flat, minlength=n_groups * TOTAL_BUCKETS)
+    return counts.reshape(n_groups, TOTAL_BUCKETS)
+
+
+def sketch_ranks(counts, ranks):
+    """ Read the ranks-th smallest amount (from 1) from every row of counts, NaN for empty sketches
+    """
+    counts = np.atleast_2d(counts)
+    cum = counts.cumsum(axis=1)
+    total = cum[:, -1]
+    target = np.maximum(ranks, 1)
+    idx = np.minimum((cum < np.asarray(target)[:, None]).sum(axis=1), TOTAL_BUCKETS - 1)
+    return np.where(total > 0, BUCKET_VALUES[idx], np.nan)
+
+
+def sketch_quantiles(counts, q):
+    """ Read quantile q from every row of counts, NaN for empty sketches
+    """
+    counts = np.atleast_2d(counts)
+    return sketch_ranks(counts, np.ceil(q * counts.sum(axis=1)))
+
+
+def interpolated_bounds(counts, q):
+    """ Bounds on the interpolated quantile q (numpy's and pandas' default) of every row of counts
+
+    That quantile lies between the two amounts around position q * (n - 1), and each is read from the sketch to
+    within quantile_error.
+    """
+    counts = np.atleast_2d(counts)
+    position = q * (counts.sum(axis=1) - 1)
+    below = sketch_ranks(counts, np.floor(position) + 1)
+    above = sketch_ranks(counts, np.ceil(position) + 1)
+    return below - quantile_error(below), above + quantile_error(above)
+
+
+def sketch_mad(counts, medians):
+    """ Median absolute deviation of every row of counts around the given medians
+    """
+    counts = np.atleast_2d(counts)
+    deviations = np.abs(BUCKET_VALUES[None, :] - np.asarray(medians)[:, None])
+    order = np.argsort(deviations, axis=1)
+    cum = np.take_along_axis(counts, order, axis=1).cumsum(axis=1)
+    total = cum[:, -1]
+    target = np.maximum(np.ceil(0.5 * total), 1)
+    pos = np.minimum((cum < target[:, None]).sum(axis=1), TOTAL_BUCKETS - 1)
+    mad = np.take_along_axis(deviations, np.take_along_axis(order, pos[:, None], axis=1), axis=1)[:, 0]
+    return np.where(total > 0, mad, np.nan)
@@ -0,0 +1,99 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from datafiles import reloaded
+
+# Category -> group -> necessity flag, plus an optional monthly budget per category. Edit the CSV to change the
+# taxonomy; it is reloaded whenever the file changes.
+TAXONOMY_PATH = 'data/taxonomy.csv'
+
+# Categories missing from the taxonomy land in one extra slot at the end of every lookup array
+UNCATEGORIZED = 'Uncategorized'
+OTHER_GROUP = 'Other'
+
+# Pie chart labels, indexed by 0 for necessities and 1 for everything else
+TYPES = ['Necessities', 'Non-essentials']
+
+
+class Taxonomy:
+    """ Taxonomy compiled into lookup arrays indexed by category code
+
+    A column of categories is turned into codes once, and every attribute of a transaction (group, necessity,
+    budget) is then a single gather from the matching lookup array.
+    """
+
+    def __init__(self, taxonomy_df):
+        taxonomy_df = taxonomy_df.drop_duplicates('Category', keep='last')
+        # Changes whenever the taxonomy does, for anything cached on results derived from it
+        self.revision = hashlib.sha1(taxonomy_df.to_csv(index=False).encode()).hexdigest()
+        self.categories = pd.Index(taxonomy_df['Category'].astype(str).tolist() + [UNCATEGORIZED])
+
+        groups = taxonomy_df['Group'].fillna(OTHER_GROUP).astype(str)
+        self.groups = pd.Index(pd.unique(pd.concat([groups, pd.Series([OTHER_GROUP])])))
+        self.group_lookup = np.append(self.groups.get_indexer(groups), self.groups.get_loc(OTHER_GROUP))
+
+        necessity = taxonomy_df['Necessity'].astype(str).str.lower().isin(['true', '1', 'yes'])
+        self.necessity_lookup = np.append(necessity.to_numpy(), False)
+        self.type_lookup = np.where(self.necessity_lookup, 0, 1)
+
+        budgets = pd.to_numeric(taxonomy_df['Budget'], errors='coerce') if 'Budget' in taxonomy_df \
+            else pd.Series(np.nan, index=taxonomy_df.index)
+        self.budget_lookup = np.append(budgets.to_numpy(dtype='float64'), np.nan)
+
+    def codes(self, categories):
+        """ Taxonomy code of every category, with anything unknown mapped to the Uncategorized slot
+        """
+        categories = pd.Series(categories)
+        if not isinstance(categories.dtype, pd.CategoricalDtype):
+            categories = categories.astype('category')
+        # Look up the distinct names only, then gather by the column's own codes; code -1 (missing) picks the
+        # trailing Uncategorized entry
+        code_map = self.categories.get_indexer(categories.cat.categories.astype(str))
+        code_map = np.append(np.where(code_map < 0, len(self.categories) - 1, code_map), len(self.categories) - 1)
+        return code_map[categories.cat.codes.to_numpy()]
+
+    def is_necessity(self, categories):
+        return self.necessity_lookup[self.codes(categories)]
+
+    def group_of(self, categories):
+        return pd.Categorical.from_codes(self.group_lookup[self.codes(categories)], self.groups)
+
+    def rollup(self, df):
+        """ Spend, transaction count and budget at the category, group and necessity level
+
+        Transactions are summed per category in one pass; the coarser levels are sums of those category totals
+        through the lookup arrays, so their cost doesn't depend on the number of rows.
+        """
+        codes = self.codes(df['Category'])
+        n_categories = len(self.categories)
+        # Blank amounts add nothing, as in a groupby sum
+        amounts = df['Amount'].to_numpy(dtype='float64')
+        totals = np.bincount(codes, weights=np.where(np.isnan(amounts), 0.0, amounts), minlength=n_categories)
+        counts = np.bincount(codes, minlength=n_categories)
+        budgets = np.nan_to_num(self.budget_lookup)
+        has_budget = ~np.isnan(self.budget_lookup)
+
+        def level(level_name, keys, names):
+            n = len(names)
+            level_df = pd.DataFrame({'Amount': np.bincount(keys, weights=totals, minlength=n),
+                                     'Transactions': np.bincount(keys, weights=counts, minlength=n).astype('int64'),
+                                     'Budget': np.where(np.bincount(keys, weights=has_budget, minlength=n) > 0,
+                                                        np.bincount(keys, weights=budgets, minlength=n), np.nan)},
+                                    index=pd.Index(names, name=level_name))
+            return level_df[level_df['Transactions'] > 0]
+
+        return {'Category': level('Category', np.arange(n_categories), self.categories),
+                'Group': level('Group', self.group_lookup, self.groups),
+                'Type': level('Type', self.type_lookup, TYPES)}
+
+
+def load_taxonomy(path=TAXONOMY_PATH):
+    return Taxonomy(pd.read_csv(path))
+
+
+def get_taxonomy(path=TAXONOMY_PATH):
+    """ The compiled taxonomy, rebuilt only when the file has changed since it was last loaded
+    """
+    return reloaded(path, load_taxonomy)
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import app
+import datasets
+import funcs
+from outliers import OutlierDetector
+
+
+def ledger():
+    return pd.DataFrame({'Date': pd.date_range('2023-01-01', periods=12, freq='D'),
+                         'Description': ['WHOLE FOODS #{}'.format(day) for day in range(12)],
+                         'Category': 'Groceries', 'Amount': 10.0})
+
+
+def search_preview(dataset_id, query):
+    # Through Dash's own update endpoint, as the browser calls it
+    response = app.app.server.test_client().post('/_dash-update-component', json={
+        'output': '..preview-table.data...preview-table.page_count...preview-table.page_current...'
+                  'search-matches.children..',
+        'outputs': [{'id': 'preview-table', 'property': 'data'},
+                    {'id': 'preview-table', 'property': 'page_count'},
+                    {'id': 'preview-table', 'property': 'page_current'},
+                    {'id': 'search-matches', 'property': 'children'}],
+        'inputs': [{'id': 'search', 'property': 'value', 'value': query},
+                   {'id': 'preview-table', 'property': 'page_current', 'value': 0},
+                   {'id': 'exclude-duplicates', 'property': 'value', 'value': []}],
+        'state': [{'id': 'dataset-id', 'property': 'data', 'value': dataset_id}],
+        'changedPropIds': ['search.value']})
+    return response.get_json()['response']
+
+
+def test_preview_pages_and_searches():
+    dataset_id = datasets.register_dataset(ledger())
+    response = search_preview(dataset_id, 'whole')
+    assert len(response['preview-table']['data']) == app.PREVIEW_PAGE_SIZE
+    assert response['preview-table']['page_count'] == 3
+    assert response['search-matches']['children'] == '12 matching transactions'
+
+
+def test_evicted_dataset_says_it_expired(monkeypatch):
+    dataset_id = datasets.register_dataset(ledger())
+    monkeypatch.setattr(datasets, '_datasets', datasets.OrderedDict())
+    response = search_preview(dataset_id, 'whole')
+    assert response['preview-table']['data'] == []
+    assert response['search-matches']['children'] == app.DATASET_EXPIRED
+
+
+def stores(component, found=None):
+    # The dcc.Store values of an uploaded statement's layout, by id
+    found = {} if found is None else found
+    if getattr(component, 'id', None) in ('stored-data', 'dataset-id'):
+        found[component.id] = component.data
+    children = getattr(component, 'children', None)
+    for child in children if isinstance(children, list) else [children]:
+        if child is not None and not isinstance(child, str):
+            stores(child, found)
+    return found
+
+
+def test_drill_down_on_a_ledger_without_zip_codes():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'transactions_2015_2022.xlsx')
+    uploaded = stores(app.parse_statement(path, 'transactions_2015_2022.xlsx', OutlierDetector()))
+    data, dataset_id = uploaded['stored-data'], uploaded['dataset-id']
+    assert 'Zip Code' not in data[0]
+    category = data[0]['Category']
+    table = app.make_graphs(1, {'Category': category}, data, 'Year over Year', 5, None, dataset_id, [], 'test')[0]
+    assert list(table.figure.data[0].cells.values[0]) == [category]
+    # Evicted: the rows are found by scanning the ledger instead
+    datasets._datasets.pop(dataset_id)
+    table = app.make_graphs(1, {'Category': category}, data, 'Year over Year', 5, None, dataset_id, [], 'test')[0]
+    assert list(table.figure.data[0].cells.values[0]) == [category]
+
+
+def test_all_charts_leave_the_ledger_unchanged(monkeypatch):
+    # The chart builders share the ledger across threads, so none of them may modify it
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    monkeypatch.setattr(funcs, 'locate_zip_codes', lambda zip_codes, key=None: np.full((len(zip_codes), 2), np.nan))
+    uploaded = stores(app.parse_statement('data/transactions.csv', 'transactions.csv', OutlierDetector()))
+    df = pd.DataFrame(uploaded['stored-data'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Merchant'] = df['Merchant'].astype('category')
+    before = df.copy()
+
+    charts = app.build_all_charts(df, 5, datasets.get_sketches(uploaded['dataset-id'], False), 'test')
+
+    assert len(charts) == 12
+    pd.testing.assert_frame_equal(df, before)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+import backtest
+from backtest import WINDOWS, ALPHAS, MIN_ORIGINS, run_backtest, best_parameters
+
+
+def ledger(rows=40, seed=4):
+    rng = np.random.default_rng(seed)
+    # Groceries alternate between two levels, Rent is the same every month, Gifts is too short to backtest
+    return pd.DataFrame({'Category': ['Groceries'] * rows + ['Rent'] * rows + ['Gifts'] * 5,
+                         'Amount': np.concatenate([np.tile([20.0, 80.0], rows // 2) + rng.random(rows),
+                                                   np.full(rows, 1500.0), np.full(5, 30.0)])})
+
+
+def exact_mae(amounts, method, parameter):
+    start = max(WINDOWS)
+    series = pd.Series(amounts)
+    if method == 'SMA':
+        forecast = series.rolling(int(parameter)).mean().shift(1)
+    else:
+        forecast = series.ewm(alpha=parameter).mean().shift(1)
+    return (series - forecast)[start:].abs().mean()
+
+
+def test_every_parameter_is_scored_on_the_same_origins():
+    df = ledger()
+    results = run_backtest(df)
+    assert set(results['Category']) == {'Groceries', 'Rent'}
+    assert len(results) == 2 * (len(WINDOWS) + len(ALPHAS))
+    groceries = df.loc[df['Category'] == 'Groceries', 'Amount'].to_numpy()
+    for row in results[results['Category'] == 'Groceries'].itertuples():
+        assert np.isclose(row.MAE, exact_mae(groceries, row.Method, row.Parameter))
+
+
+def test_best_parameters_pick_the_lowest_error():
+    best = best_parameters(run_backtest(ledger()))
+    # An even window averages out the alternation
+    assert best.loc['Groceries', 'Window'] % 2 == 0
+    assert best['Window'].dtype == 'int64'
+    assert sorted(best.index) == ['Groceries', 'Rent']
+
+
+def test_blank_amounts_are_left_out():
+    df = ledger()
+    df.loc[3, 'Amount'] = np.nan
+    results = run_backtest(df)
+    assert results['MAE'].notna().all()
+    assert len(results) == 2 * (len(WINDOWS) + len(ALPHAS))
+    assert sorted(best_parameters(results).index) == ['Groceries', 'Rent']
+
+
+def test_categories_without_enough_history_are_skipped():
+    df = ledger(rows=max(WINDOWS) + MIN_ORIGINS - 1)
+    assert run_backtest(df).empty
+    assert best_parameters(run_backtest(df)).empty
+
+
+def test_nan_errors_are_ignored():
+    results = pd.DataFrame({'Category': ['Dining'] * 4 + ['Gifts'] * 2,
+                            'Method': ['SMA', 'SMA', 'ES', 'ES', 'SMA', 'ES'],
+                            'Parameter': [2, 3, 0.1, 0.2, 2, 0.1],
+                            'MAE': [np.nan, 5.0, 4.0, np.nan, np.nan, np.nan]})
+    best = best_parameters(results)
+    assert best.loc['Dining', 'Window'] == 3 and best.loc['Dining', 'Alpha'] == 0.1
+    assert 'Gifts' not in best.index
+
+
+def test_worker_processes_give_the_same_results(monkeypatch):
+    df = ledger(seed=8)
+    inline = run_backtest(df)
+    backtest._cache.clear()
+    monkeypatch.setattr(backtest, 'PARALLEL_MIN_ROWS', 0)
+    monkeypatch.setattr(backtest, 'MAX_WORKERS', 2)
+    monkeypatch.setattr(backtest, '_executor', None)
+    try:
+        pd.testing.assert_frame_equal(run_backtest(df), inline)
+        assert backtest._executor._mp_context.get_start_method() != 'fork'
+    finally:
+        backtest._executor.shutdown()
+        backtest._cache.clear()
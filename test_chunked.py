@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import DEFAULT_WINDOW, DEFAULT_ALPHA
+from chunked import read_chunks, aggregate_csv, clean_amounts, create_archive_summary
+
+
+@pytest.fixture
+def statement_csv(tmp_path, monkeypatch):
+    # The FX and country tables are read from data/, relative to the app's directory
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    rng = np.random.default_rng(11)
+    rows = 50
+    df = pd.DataFrame({'Date': pd.date_range('2022-01-03', periods=rows, freq='3D').strftime('%m/%d/%Y'),
+                       'Description': rng.choice(['UBER EATS', 'SAFEWAY #123', 'SAFEWAY #456', 'HOTEL PARIS'], rows),
+                       'Amount': ['${:,.2f}'.format(amount) for amount in rng.random(rows) * 2000],
+                       'Zip Code': rng.choice(['94105', '02134', ''], rows),
+                       'Country': rng.choice(['USA', 'FRANCE', ''], rows),
+                       'Category': rng.choice(['Dining', 'Groceries', 'Travel'], rows),
+                       'Ignored': 'x'})
+    path = tmp_path / 'statement.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+def whole(path):
+    return pd.concat(read_chunks(path, chunk_rows=10 ** 6), ignore_index=True)
+
+
+def test_clean_amounts():
+    assert clean_amounts(pd.Series(['$1,234.50', '7', 'n/a'], dtype=object)).tolist()[:2] == [1234.5, 7.0]
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 49, 50])
+def test_chunk_boundaries_dont_change_the_rows(statement_csv, chunk_rows):
+    chunked = pd.concat(read_chunks(statement_csv, chunk_rows), ignore_index=True)
+    pd.testing.assert_frame_equal(chunked, whole(statement_csv))
+    assert 'Ignored' not in chunked.columns
+    assert set(chunked['Currency']) == {'USD', 'EUR'}
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 50])
+def test_aggregates_match_the_whole_ledger(statement_csv, chunk_rows):
+    df = whole(statement_csv)
+    agg = aggregate_csv(statement_csv, chunk_rows)
+    assert agg.rows == len(df)
+
+    totals = df.groupby('Category')['Amount'].sum()
+    assert np.allclose(agg.category_totals().reindex(totals.index), totals)
+    assert agg.weekday_counts.tolist() == np.bincount(df['Date'].dt.dayofweek, minlength=7).tolist()
+
+    forecasts = agg.forecasts().set_index('Category')
+    amounts = df.groupby('Category')['Amount']
+    sma = amounts.apply(lambda amounts: amounts.rolling(DEFAULT_WINDOW).mean().iloc[-1])
+    es = amounts.apply(lambda amounts: amounts.ewm(alpha=DEFAULT_ALPHA).mean().iloc[-1])
+    assert np.allclose(forecasts['SMA'], sma.reindex(forecasts.index).round(2))
+    assert np.allclose(forecasts['ES'], es.reindex(forecasts.index).round(2))
+
+
+def test_archive_summary_ranked_graphs_rerank(statement_csv):
+    # The ranking dropdown and the drill-down find the ranked charts by their pattern-matching ids
+    summary = create_archive_summary(statement_csv, 'statement.csv', ranked=2)
+    graphs = [child for child in summary.children if isinstance(getattr(child, 'id', None), dict)]
+    assert [graph.id for graph in graphs] == [{'type': 'ranked-graph', 'index': index}
+                                             for index in ['top-rankings', 'bottom-rankings', 'top-merchants']]
+    assert all(graph.figure['layout']['meta']['kind'] == 'bar' for graph in graphs)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from comparison import monthly_cumulative, compare_periods, rolling_totals, create_period_comparison
+
+
+def ledger(first_month, last_month):
+    months = pd.period_range(first_month, last_month, freq='M')
+    return pd.DataFrame({'Date': months.to_timestamp() + pd.Timedelta(days=9),
+                         'Category': 'Groceries', 'Amount': 100.0})
+
+
+def comparison(df):
+    return compare_periods(*monthly_cumulative(df)).set_index('Category').loc['Groceries']
+
+
+def test_full_history_compares_every_period():
+    row = comparison(ledger('2021-01', '2023-03'))
+    assert row['This_Month'] == row['Last_Year_Month'] == 100
+    assert row['YTD'] == row['Last_YTD'] == 300
+    assert row['Trailing_12M'] == row['Prior_12M'] == 1200
+    assert row['Trailing_Change'] == 0
+
+
+def test_periods_without_full_history_are_missing():
+    # 14 months: no prior 12 months, and January and February of 2022 aren't in the history
+    row = comparison(ledger('2022-03', '2023-04'))
+    assert row['Trailing_12M'] == 1200
+    assert np.isnan(row['Prior_12M']) and np.isnan(row['Trailing_Change'])
+    assert np.isnan(row['Last_YTD']) and np.isnan(row['YTD_Change'])
+    assert row['Last_Year_Month'] == 100
+
+
+def test_rolling_totals_start_at_the_twelfth_month():
+    _, months, cumulative = monthly_cumulative(ledger('2022-01', '2023-02'))
+    rolling = rolling_totals(cumulative)[0]
+    assert np.isnan(rolling[:11]).all()
+    assert (rolling[11:] == 1200).all()
+
+
+def test_missing_periods_show_as_not_available():
+    table = create_period_comparison(ledger('2022-06', '2023-01'))[0].figure.data[0]
+    prior_12m = table.cells.values[8]
+    assert list(prior_12m) == ['n/a']
+
+
+def test_undated_rows_and_blank_amounts_are_left_out():
+    df = ledger('2021-01', '2023-03')
+    df.loc[3, 'Date'] = pd.NaT
+    df.loc[20, 'Amount'] = np.nan
+    categories, months, cumulative = monthly_cumulative(df)
+    assert len(months) == 27 and not np.isnan(cumulative).any()
+    assert cumulative[0, -1] == 100 * 25
+    row = comparison(df)
+    assert row['This_Month'] == 100 and row['Trailing_12M'] == 1100
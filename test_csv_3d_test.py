@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+import csv_3d_test
+from csv_3d_test import sample_per_category, create_3D_scatter
+
+
+def ledger(rows, categories, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'Category': rng.choice(categories, rows), 'Amount': rng.gamma(2.0, 40.0, rows).round(2),
+                         'Date': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), 'D'),
+                         'Zip Code': rng.choice(['94103', '10001', '60601'], rows)})
+
+
+def test_sample_keeps_to_the_budget_and_the_extremes():
+    df = ledger(20000, ['C%d' % i for i in range(40)])
+    sample = sample_per_category(df, 500)
+    assert len(sample) <= 500
+    grouped = df.groupby('Category')['Amount']
+    assert set(grouped.idxmin()) <= set(sample.index) and set(grouped.idxmax()) <= set(sample.index)
+    # Roughly proportional to category size
+    assert sample['Category'].value_counts().min() >= 2
+
+
+def test_budget_holds_when_the_extremes_alone_exceed_it():
+    df = ledger(5000, ['C%d' % i for i in range(300)])
+    assert len(sample_per_category(df, 100)) == 100
+
+
+def test_distance_axis_uses_the_zip_centroids(monkeypatch):
+    centroids = {'94103': (37.77, -122.41), '10001': (40.75, -73.99), '60601': (41.89, -87.62)}
+    monkeypatch.setattr(csv_3d_test, 'zip_centroids',
+                        lambda zips, key=None: np.array([centroids.get(z, (np.nan, np.nan)) for z in zips]))
+    scene = create_3D_scatter(ledger(200, ['Food', 'Travel']), '94103').figure
+    miles = np.unique(np.concatenate([np.asarray(trace.y, dtype='float64') for trace in scene.data]).round())
+    # San Francisco to itself, to New York and to Chicago
+    np.testing.assert_allclose(miles, [0, 1856, 2565], atol=15)
+    assert create_3D_scatter(ledger(20, ['Food']), '00000') == 'Zipcode 00000 could not be located'
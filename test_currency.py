@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from currency import normalize_currency, to_base_currency, currency_of
+
+RATES = pd.DataFrame({'Date': pd.to_datetime(['2022-01-01', '2022-01-01', '2022-02-01', '2022-02-01']),
+                      'Currency': ['EUR', 'CAD', 'EUR', 'CAD'],
+                      'Rate': [1.10, 0.80, 1.20, 0.75]})
+
+
+@pytest.fixture
+def shipped_tables(monkeypatch):
+    # The FX and country tables are read from data/, relative to the app's directory
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_mixed_currencies_convert_at_the_latest_rate_on_or_before_the_date(shipped_tables):
+    df = pd.DataFrame({'Date': pd.to_datetime(['2022-01-15', '2022-02-01', '2022-02-20', '2022-03-05']),
+                       'Country': ['FRANCE', ' canada ', 'USA', np.nan],
+                       'Amount': [100.0, 100.0, 100.0, 100.0]})
+    converted = normalize_currency(df)
+    assert converted['Currency'].tolist() == ['EUR', 'CAD', 'USD', 'USD']
+    assert converted['Amount'].tolist() == [113.7, 78.7, 100.0, 100.0]
+    assert converted['Original_Amount'].tolist() == [100.0] * 4
+
+
+def test_ledger_without_countries_is_in_the_base_currency(shipped_tables):
+    df = pd.DataFrame({'Date': pd.to_datetime(['2022-01-15']), 'Amount': [12.5]})
+    converted = normalize_currency(df)
+    assert converted['Currency'].tolist() == ['USD'] and converted['Amount'].tolist() == [12.5]
+
+
+def test_dates_before_the_first_rate_take_the_earliest_rate():
+    amounts = to_base_currency([10.0, 10.0, 10.0], pd.to_datetime(['2019-06-30', '2022-01-31', '2023-05-01']),
+                               ['EUR', 'EUR', 'CAD'], RATES)
+    assert amounts.tolist() == [11.0, 11.0, 7.5]
+
+
+def test_undated_foreign_rows_become_nan():
+    amounts = to_base_currency([10.0, 10.0], pd.to_datetime([None, '2022-01-31']), ['EUR', 'USD'], RATES)
+    assert np.isnan(amounts[0]) and amounts[1] == 10.0
+
+
+def test_unknown_currencies_are_reported():
+    with pytest.raises(ValueError, match='CHF, JPY'):
+        to_base_currency([1.0, 1.0, 1.0], pd.to_datetime(['2022-01-31'] * 3), ['JPY', 'EUR', 'CHF'], RATES)
+
+
+def test_unlisted_countries_are_in_the_base_currency():
+    countries = pd.Series({'FRANCE': 'EUR'})
+    assert currency_of(['France', 'Atlantis', None], countries).tolist() == ['EUR', 'USD', 'USD']
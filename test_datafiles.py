@@ -0,0 +1,23 @@
+import os
+
+from datafiles import reloaded
+
+
+def test_reloaded_only_when_the_file_changes(tmp_path):
+    path = tmp_path / 'table.csv'
+    path.write_text('a\n1\n')
+    loads = []
+
+    def load(path):
+        loads.append(path)
+        return open(path).read()
+
+    assert reloaded(str(path), load) == 'a\n1\n'
+    assert reloaded(str(path), load) == 'a\n1\n'
+    assert len(loads) == 1
+
+    path.write_text('a\n2\n')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert reloaded(str(path), load) == 'a\n2\n'
+    assert len(loads) == 2
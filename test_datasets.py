@@ -0,0 +1,36 @@
+import pandas as pd
+
+from datasets import register_dataset, get_dataset, dataset_hash
+from outliers import OutlierDetector
+
+
+def ingested():
+    df = pd.read_csv('data/transactions.csv')
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+    return df.assign(Date=pd.to_datetime(df['Date'], format='%m/%d/%y'))
+
+
+def scored(df, detector):
+    return df.assign(Outlier_Score=detector.update(df[['Category', 'Amount']]))
+
+
+def test_same_statement_gets_the_same_id_in_every_session():
+    df = ingested()
+    # The second session has already seen the statement, so its outlier scores differ
+    returning = OutlierDetector()
+    returning.update(df[['Category', 'Amount']])
+    first, second = scored(df, OutlierDetector()), scored(df, returning)
+    assert not first['Outlier_Score'].equals(second['Outlier_Score'])
+    assert register_dataset(first) == register_dataset(second)
+
+
+def test_registry_keeps_only_the_ingested_columns():
+    df = scored(ingested(), OutlierDetector())
+    dataset_id = register_dataset(df)
+    assert 'Outlier_Score' not in get_dataset(dataset_id).columns
+    assert dataset_id == dataset_hash(df.drop(columns='Outlier_Score'), columns=df.columns.drop('Outlier_Score'))
+
+
+def test_different_statements_get_different_ids():
+    df = ingested()
+    assert register_dataset(df) != register_dataset(df.assign(Amount=df['Amount'] + 1))
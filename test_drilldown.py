@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from drilldown import GroupIndex, filter_rows, describe_filters
+
+
+def ledger(rows=500, seed=5):
+    rng = np.random.default_rng(seed)
+    zips = pd.Series(rng.choice(['10001', '94105', '60601'], rows), dtype=object)
+    zips[rng.random(rows) < 0.1] = np.nan
+    return pd.DataFrame({'Date': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), 'D'),
+                         'Category': rng.choice(['Groceries', 'Dining', 'Travel'], rows),
+                         'Amount': rng.random(rows) * 100,
+                         'Zip Code': zips})
+
+
+FILTERS = [{'Category': 'Dining'},
+           {'Month': '2022-03'},
+           {'Zip Code': '94105'},
+           {'Category': 'Travel', 'Month': '2022-11', 'Zip Code': '10001'},
+           {'Category': 'Rent'}]
+
+
+def test_index_matches_a_scan():
+    df = ledger()
+    index = GroupIndex.from_frame(df)
+    for filters in FILTERS:
+        expected = np.flatnonzero(np.logical_and.reduce(
+            [(df['Date'].dt.strftime('%Y-%m') if dimension == 'Month' else df[dimension]) == label
+             for dimension, label in filters.items()]))
+        assert index.select(filters).tolist() == expected.tolist()
+        assert filter_rows(df, filters).tolist() == expected.tolist()
+
+
+def test_rows_without_a_zip_code_match_no_zip_code():
+    df = ledger()
+    assert not len(filter_rows(df, {'Zip Code': 'nan'}))
+    assert not len(GroupIndex.from_frame(df).select({'Zip Code': 'nan'}))
+
+
+def test_describe_filters_in_dimension_order():
+    assert describe_filters({'Zip Code': '10001', 'Category': 'Dining'}) == 'Category Dining, Zip Code 10001'
+
+
+def test_ledger_without_zip_codes():
+    df = ledger().drop(columns='Zip Code')
+    index = GroupIndex.from_frame(df)
+    assert 'Zip Code' not in index.groups
+    dining = np.flatnonzero(df['Category'] == 'Dining')
+    # The zip code filter has nothing to apply to, the rest still does
+    for filters in [{'Category': 'Dining'}, {'Category': 'Dining', 'Zip Code': '10001'}]:
+        assert index.select(filters).tolist() == dining.tolist()
+        assert filter_rows(df, filters).tolist() == dining.tolist()
+    assert index.select({'Zip Code': '10001'}).tolist() == list(range(len(df)))
+    assert filter_rows(df, {'Zip Code': '10001'}).tolist() == list(range(len(df)))
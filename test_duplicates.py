@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from flask import Flask
+
+from api import register_api_routes
+from datasets import register_dataset
+from duplicates import find_duplicate_charges, duplicate_rows, drop_duplicate_charges, statement_runs
+
+
+def statement(first_day, last_day, coffees=1):
+    days = pd.date_range(first_day, last_day, freq='D')
+    rows = [(day, 'GROCER #{}'.format(day.day), 'Groceries', 40.0 + day.day) for day in days]
+    # Coffee on the 10th of the month, twice in a row if coffees=2
+    rows += [(day, 'CAFE', 'Dining', 4.5) for day in days if day.day == 10 for _ in range(coffees)]
+    df = pd.DataFrame(rows, columns=['Date', 'Description', 'Category', 'Amount'])
+    return df.sort_values('Date', kind='stable').assign(Merchant=lambda df: df['Description'])
+
+
+def overlapping_statements():
+    # January 1st to 20th and January 11th to 31st, loaded as one file
+    return pd.concat([statement('2023-01-01', '2023-01-20'), statement('2023-01-11', '2023-01-31')],
+                     ignore_index=True)
+
+
+def test_statements_start_where_the_date_steps_back():
+    runs = statement_runs(overlapping_statements())
+    assert runs[:20].tolist() == [0] * 20
+    assert runs[21:].tolist() == [1] * 21
+    descending = overlapping_statements().iloc[::-1]
+    assert len(np.unique(statement_runs(descending))) == 2
+
+
+def test_overlap_copies_are_dropped():
+    df = overlapping_statements()
+    duplicates = duplicate_rows(df)
+    # The later copy of every charge from the 11th to the 20th
+    assert duplicates.sum() == 10
+    assert (df.loc[duplicates, 'Date'] <= pd.Timestamp('2023-01-20')).all()
+    assert df.index[duplicates].min() > 20
+    assert len(drop_duplicate_charges(df)) == len(df) - 10
+
+
+def test_identical_charges_within_a_statement_are_kept():
+    df = statement('2023-01-01', '2023-01-31', coffees=2)
+    pairs = find_duplicate_charges(df)
+    coffee = pairs[pairs['Merchant'] == 'CAFE']
+    assert coffee['Confirmed'].all() and not coffee['Overlap'].any()
+    assert not duplicate_rows(df).any()
+
+
+def test_repeat_purchases_survive_overlapping_statements():
+    # Two coffees on the 10th appear in both statements: only the second statement's pair goes
+    df = pd.concat([statement('2023-01-01', '2023-01-20', coffees=2), statement('2023-01-05', '2023-01-31', coffees=2)],
+                   ignore_index=True)
+    kept = drop_duplicate_charges(df)
+    assert (kept['Description'] == 'CAFE').sum() == 2
+    assert len(kept) == 31 + 2
+
+
+def test_api_excludes_the_same_duplicates():
+    df = overlapping_statements()
+    dataset_id = register_dataset(df)
+    server = Flask(__name__)
+    register_api_routes(server)
+    client = server.test_client()
+
+    def groceries(query=''):
+        response = client.get('/api/datasets/{}/rankings?ranked=2{}'.format(dataset_id, query))
+        return {row['Category']: row['Amount'] for row in response.get_json()['top']}['Groceries']
+
+    assert groceries() == df.loc[df['Category'] == 'Groceries', 'Amount'].sum()
+    kept = drop_duplicate_charges(df)
+    assert groceries('&exclude_duplicates=true') == kept.loc[kept['Category'] == 'Groceries', 'Amount'].sum()
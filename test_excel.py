@@ -0,0 +1,75 @@
+import io
+import os
+import time
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import excel
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache')
+    monkeypatch.setattr(excel, 'CACHE_DIR', path)
+    return path
+
+
+def workbook(sheets):
+    book = openpyxl.Workbook()
+    book.remove(book.active)
+    for name, rows in sheets.items():
+        sheet = book.create_sheet(name)
+        sheet.append(['Date', 'Description', 'Amount', 'Notes'])
+        for row in rows:
+            sheet.append(row)
+    buffer = io.BytesIO()
+    book.save(buffer)
+    return buffer
+
+
+def test_sheets_are_stacked_with_the_known_columns(cache_dir):
+    df = excel.read_excel_statement(workbook({'2021': [['2021-12-30', 'A', 10.0, 'x']],
+                                              '2022': [['2022-01-02', 'B', 20.0, 'y'], [None, None, None, 'z']]}))
+    assert list(df.columns) == ['Date', 'Description', 'Amount']
+    assert df['Amount'].tolist() == [10.0, 20.0]
+
+
+def test_in_memory_workbooks_are_parsed_in_parallel_too(cache_dir, monkeypatch):
+    sheets = {str(year): [['%d-01-0%d' % (year, day), 'Shop', float(day)] for day in range(1, 8)]
+              for year in range(2019, 2023)}
+    serial = excel.read_excel_statement(workbook(sheets))
+    for name in os.listdir(cache_dir):
+        os.remove(os.path.join(cache_dir, name))
+    monkeypatch.setattr(excel, 'PARALLEL_MIN_BYTES', 0)
+    pd.testing.assert_frame_equal(excel.read_excel_statement(workbook(sheets)), serial)
+
+
+def test_cache_is_private_and_reused(cache_dir):
+    buffer = workbook({'Data': [['2022-01-02', 'B', 20.0]]})
+    first = excel.read_excel_statement(buffer)
+    assert os.stat(cache_dir).st_mode & 0o777 == 0o700
+    assert [name for name in os.listdir(cache_dir) if not name.endswith('.pkl')] == []
+    pd.testing.assert_frame_equal(excel.read_excel_statement(buffer), first)
+
+
+def test_cache_is_skipped_when_others_can_write_to_it(cache_dir):
+    os.makedirs(cache_dir)
+    os.chmod(cache_dir, 0o777)
+    excel.read_excel_statement(workbook({'Data': [['2022-01-02', 'B', 20.0]]}))
+    assert os.listdir(cache_dir) == []
+
+
+def test_cache_is_trimmed_by_age_and_size(cache_dir, monkeypatch):
+    os.makedirs(cache_dir, mode=0o700)
+    old = os.path.join(cache_dir, 'old.pkl')
+    with open(old, 'wb') as f:
+        f.write(b'x')
+    os.utime(old, (time.time() - excel.MAX_CACHE_AGE - 1,) * 2)
+    excel.read_excel_statement(workbook({'Data': [['2022-01-02', 'B', 20.0]]}))
+    assert not os.path.exists(old)
+
+    monkeypatch.setattr(excel, 'MAX_CACHE_BYTES', 0)
+    excel.read_excel_statement(workbook({'Data': [['2022-01-03', 'C', 30.0]]}))
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,67 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from figspec import BASE_LAYOUT, TYPED_ARRAY_DTYPES, typed_array, figure, bar_trace, line_trace, pie_trace, box_trace, \
+    summary_box_trace
+
+
+def decode(value):
+    # Typed arrays back to plain lists, anywhere in a figure
+    if isinstance(value, dict) and set(value) == {'dtype', 'bdata'}:
+        return np.frombuffer(base64.b64decode(value['bdata']), dtype='<' + value['dtype']).tolist()
+    if isinstance(value, dict):
+        return {key: decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def test_typed_arrays_decode_to_the_same_values():
+    for values in [np.array([1.5, -2.25, 1e9]), np.array([3, -4], dtype='int32'), np.array([7, 8], dtype='uint8'),
+                   np.array([1.5, 2.5], dtype='>f8'), np.array([0.1, np.nan], dtype='float32')]:
+        encoded = typed_array(values)
+        assert encoded['dtype'] == TYPED_ARRAY_DTYPES[values.dtype.newbyteorder('=').name]
+        np.testing.assert_array_equal(decode(encoded), values.astype('float64'))
+
+
+def test_unsupported_dtypes_are_widened_or_sent_as_lists():
+    assert typed_array(np.array([2 ** 40, 1], dtype='int64'))['dtype'] == 'f8'
+    assert decode(typed_array(np.array([2 ** 40, 1], dtype='int64'))) == [2 ** 40, 1]
+    assert decode(typed_array(np.array([True, False]))) == [1, 0]
+    dates = np.array(['2023-01-31', '2023-02-01T12:00'], dtype='datetime64[m]')
+    assert decode(typed_array(dates)) == [pd.Timestamp(date).value / 1e6 for date in dates]
+    assert typed_array(['a', 'b']) == ['a', 'b']
+    assert typed_array(np.array([1, None], dtype=object)) == [1, None]
+
+
+def test_figure_matches_the_plain_list_figure():
+    categories = pd.Index(['Groceries', 'Dining', 'Travel'])
+    amounts = pd.Series([420.5, 133.25, 980.0])
+    months = pd.date_range('2023-01-01', periods=3, freq='MS')
+    fig = figure([bar_trace(categories, amounts.to_numpy(), colors='#004c6d'),
+                  line_trace(months.to_numpy(), amounts.to_numpy(), 'Spend', '#B31942'),
+                  pie_trace(categories, amounts.to_numpy(), ['#003f5c', '#8a3800', '#618d9e']),
+                  box_trace(amounts.to_numpy(), 'Groceries', '#004c6d', boxpoints='suspectedoutliers'),
+                  summary_box_trace('Dining', 1.0, 2.0, 3.0, 0.5, 4.0, '#004c6d')],
+                 'Spend', xaxis={'title': 'Category'}, height=600)
+
+    plain = go.Figure(data=[
+        go.Bar(x=list(categories), y=amounts.tolist(), marker={'color': '#004c6d'}, showlegend=False),
+        go.Scatter(x=[month.value / 1e6 for month in months], y=amounts.tolist(), name='Spend',
+                   mode='lines+markers', line={'color': '#B31942'}),
+        go.Pie(labels=list(categories), values=amounts.tolist(), marker={'colors': ['#003f5c', '#8a3800', '#618d9e']}),
+        go.Box(y=amounts.tolist(), name='Groceries', marker={'color': '#004c6d'}, boxpoints='suspectedoutliers'),
+        go.Box(x=['Dining'], q1=[1.0], median=[2.0], q3=[3.0], lowerfence=[0.5], upperfence=[4.0], name='Dining',
+               marker={'color': '#004c6d'}, boxpoints=False),
+    ])
+    assert decode(fig['data']) == [decode(trace) for trace in plain.to_plotly_json()['data']]
+
+    # plotly accepts the dict as it is, with the base layout merged under the chart's own
+    layout = go.Figure(fig).layout
+    assert layout.title.text == 'Spend' and layout.height == 600
+    assert layout.xaxis.title.text == 'Category' and layout.xaxis.gridcolor == 'white'
+    assert layout.plot_bgcolor == '#E5ECF6'
+    assert 'title' not in BASE_LAYOUT['xaxis']
@@ -0,0 +1,53 @@
+import base64
+
+import numpy as np
+import pytest
+import pandas as pd
+
+from backtest import DEFAULT_WINDOW, DEFAULT_ALPHA
+from funcs import MAX_RANKED, forecast_table, ranked_bar_figure
+
+
+def ledger():
+    return pd.DataFrame({'Category': ['Groceries'] * 6 + ['Dining'] * 6,
+                         'Amount': [10.0, 20.0, 30.0, 40.0, 50.0, 60.0, 5.0, 5.0, 5.0, 5.0, 5.0, 35.0]})
+
+
+def test_forecast_uses_backtested_parameters():
+    params = pd.DataFrame({'Window': [2], 'Alpha': [1.0]}, index=pd.Index(['Groceries'], name='Category'))
+    forecasts = forecast_table(ledger(), params).set_index('Category')
+    assert forecasts.loc['Groceries', 'SMA'] == 55
+    assert forecasts.loc['Groceries', 'ES'] == 60
+
+
+def test_forecast_falls_back_to_backtest_defaults():
+    forecasts = forecast_table(ledger()).set_index('Category')
+    dining = ledger()['Amount'][6:]
+    assert forecasts.loc['Dining', 'SMA'] == pytest.approx(dining.rolling(DEFAULT_WINDOW).mean().iloc[-1], abs=0.01)
+    assert forecasts.loc['Dining', 'ES'] == pytest.approx(dining.ewm(alpha=DEFAULT_ALPHA).mean().iloc[-1], abs=0.01)
+
+
+def test_ranked_bar_figure_carries_the_full_ranking():
+    labels = ['Category %d' % i for i in range(MAX_RANKED + 3)]
+    values = np.arange(MAX_RANKED + 3, 0, -1, dtype='float64')
+    fig = ranked_bar_figure(labels, values, 3, "What are your top {n} rankings?", 'Category')
+
+    # assets/ranking.js re-slices the bars from these fields
+    meta = fig['layout']['meta']
+    assert meta['kind'] == 'bar'
+    assert meta['title'] == "What are your top {n} rankings?"
+    assert meta['labels'] == labels[:MAX_RANKED]
+    assert meta['values'] == values[:MAX_RANKED].tolist()
+    assert len(meta['colors']) == MAX_RANKED
+
+    bars = fig['data'][0]
+    assert fig['layout']['title']['text'] == "What are your top 3 rankings?"
+    assert bars['x'] == labels[:3]
+    assert np.frombuffer(base64.b64decode(bars['y']['bdata']), dtype='<f8').tolist() == values[:3].tolist()
+    assert bars['marker']['color'] == meta['colors'][:3]
+
+
+def test_ranked_bar_figure_with_fewer_entries_than_ranked():
+    meta = ranked_bar_figure([7040, 7102], [5.0, 2.5], 5, "{n}", 'Zip')['layout']['meta']
+    assert meta['labels'] == ['7040', '7102']
+    assert len(meta['colors']) == 2
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from merchants import canonicalize_merchants, strip_city_state
+
+# Descriptions from data/transactions.csv (column-aligned) and data/transactions_2015_2022.xlsx (single-spaced)
+PADDED = [
+    ('UBER EATS           SAN FRANCISCO       CA', 'UBER EATS'),
+    ('AplPay TARGET       NORTH HAVEN         CT', 'TARGET'),
+    ('NEW HAVEN PARKING MONEW HAVEN           CT', 'NEW HAVEN PARKING MO'),
+    ('STOP & SHOP #2633   NEW HAVEN           CT', 'STOP & SHOP'),
+    ('SKULL & COMBS CO.   New Haven           CT', 'SKULL & COMBS CO.'),
+    ('AMAZON.COM*9Y9OY9IP3AMZN.COM/BILL       WA', 'AMAZON'),
+    ('SUPER STOP & SHOP   WEST HAVEN          CT', 'STOP & SHOP'),
+    ('SUNOCO 8000319402 80NEW HAVEN           CT', 'SUNOCO'),
+    ('UPWORK*-443405899REFSANTA CLARA', 'UPWORK'),
+    ('E-Payment', 'E-PAYMENT'),
+]
+SINGLE_SPACED = [
+    ('UBER EATS SAN FRANCISCO CA', 'UBER EATS'),
+    ('APLPAY TARGET NORTH HAVEN CT', 'TARGET'),
+    ('TARGET NORTH HAVEN CT', 'TARGET'),
+    ('GAMESTOP NORTH HAVEN CT', 'GAMESTOP'),
+    ('NEW HAVEN PARKING MONEW HAVEN CT', 'NEW HAVEN PARKING MO'),
+    ('STOP & SHOP #2633 NEW HAVEN CT', 'STOP & SHOP'),
+    ('SKULL & COMBS CO. NEW HAVEN CT', 'SKULL & COMBS CO.'),
+    ('FRANK PEPES NEW HAVEN CT', 'FRANK PEPES'),
+    ('SUSHI PALACE ORANGE ORANGE CT', 'SUSHI PALACE ORANGE'),
+    ('THE HOME DEPOT ORANGE CT', 'THE HOME DEPOT'),
+    ('UCVTS MAGNET HIGH SCSCOTCH PLAINS NJ', 'UCVTS MAGNET HIGH SC'),
+    ("MCDONALD'S SCOTCH PLAINS NJ", "MCDONALD'S"),
+    ('BRILLIANTEARTHLLC SAN FRANCISCO CA', 'BRILLIANTEARTHLLC'),
+    ('OAK HALL CAP & GOWN SALEM VA', 'OAK HALL CAP & GOWN SALEM'),
+    ('BT*DD *DOORDASH COSTSAN FRANCISCO CA', 'DOORDASH'),
+    ('FUBO TV 844-441-3826 NY', 'FUBO TV'),
+]
+
+
+@pytest.mark.parametrize('rows', [PADDED, SINGLE_SPACED], ids=['padded', 'single-spaced'])
+def test_real_descriptions(rows):
+    descriptions, expected = zip(*rows)
+    assert canonicalize_merchants(pd.Series(descriptions)).tolist() == list(expected)
+
+
+def test_a_city_needs_several_merchants_or_a_padded_statement():
+    # SALEM follows one merchant only, so it can't be told apart from the merchant's name
+    assert strip_city_state(['OAK HALL CAP & GOWN SALEM VA']) == ['OAK HALL CAP & GOWN SALEM']
+    assert strip_city_state(['OAK HALL CAP & GOWN SALEM VA'], known={'SALEM VA'}) == ['OAK HALL CAP & GOWN']
+    assert strip_city_state(['STEAMPOWERED.COM']) == ['STEAMPOWERED.COM']
+
+
+def test_rows_share_their_description_codes():
+    descriptions = pd.Series(['TARGET NORTH HAVEN CT', None, 'AplPay TARGET       NORTH HAVEN         CT',
+                              'TARGET NORTH HAVEN CT'], index=[5, 6, 7, 8])
+    merchants = canonicalize_merchants(descriptions)
+    assert merchants.index.tolist() == [5, 6, 7, 8]
+    assert isinstance(merchants.dtype, pd.CategoricalDtype)
+    assert merchants.iloc[[0, 2, 3]].tolist() == ['TARGET'] * 3 and pd.isna(merchants.iloc[1])
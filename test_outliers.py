@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from outliers import OutlierDetector, THRESHOLD
+
+
+def statement(month, amounts, category='Groceries'):
+    days = pd.Timestamp(month) + pd.to_timedelta(np.arange(len(amounts)) % 28, 'D')
+    return pd.DataFrame({'Date': days, 'Category': category, 'Amount': amounts})
+
+
+def history(months=6, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.concat([statement('2023-{:02d}-01'.format(month + 1), rng.normal(60, 20, 20).round(2))
+                      for month in range(months)], ignore_index=True)
+
+
+def test_batch_is_scored_against_earlier_months_only():
+    detector = OutlierDetector()
+    scores = detector.update(history())
+    # Nothing before the first month to score it against
+    assert (scores[:20] == 0).all()
+    assert scores[20:].max() < THRESHOLD
+
+    # A month of large charges isn't hidden by its own amounts pulling the median up
+    spree = statement('2023-07-01', np.full(20, 400.0))
+    assert (detector.update(spree) > THRESHOLD).all()
+
+
+def test_scores_are_the_same_in_one_batch_or_month_by_month():
+    df = history()
+    whole = OutlierDetector().update(df)
+    detector = OutlierDetector()
+    by_month = np.concatenate([detector.update(month) for _, month in df.groupby(df['Date'].dt.month)])
+    assert np.allclose(whole, by_month)
+
+
+def test_repeat_upload_is_not_counted_twice():
+    detector = OutlierDetector()
+    detector.update(history(), dataset_id='january-june')
+    new = statement('2023-07-01', [58.0, 61.5, 250.0])
+    first = detector.update(new, dataset_id='july')
+    counts = detector.counts.copy()
+
+    # Restored from the session's store, as the next upload sees it
+    detector = OutlierDetector(detector.to_dict())
+    again = detector.update(new, dataset_id='july')
+    assert np.array_equal(first, again)
+    assert np.array_equal(detector.counts, counts)
+    assert detector.datasets == ['january-june', 'july']
+
+
+def test_undated_rows_are_scored_against_everything_dated():
+    df = pd.concat([history(), statement('2023-07-01', [500.0]).assign(Date=pd.NaT)], ignore_index=True)
+    scores = OutlierDetector().update(df)
+    assert scores[-1] > THRESHOLD
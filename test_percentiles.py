@@ -0,0 +1,75 @@
+import base64
+
+import numpy as np
+import pandas as pd
+
+from funcs import clean_currency, create_box_plot
+from percentiles import SpendSketches
+from sketches import quantile_error
+
+
+def load_sample():
+    df = pd.read_csv('data/transactions.csv')
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+    return df.assign(Date=pd.to_datetime(df['Date'], format='%m/%d/%y'),
+                     Amount=df['Amount'].apply(clean_currency).astype('float'))
+
+
+def decode(values):
+    if isinstance(values, dict):
+        return np.frombuffer(base64.b64decode(values['bdata']), dtype=values['dtype'])
+    return np.asarray(values)
+
+
+def exact_outliers(amounts):
+    q1, q3 = np.quantile(amounts, [0.25, 0.75])
+    return np.sort(amounts[(amounts < q1 - 1.5 * (q3 - q1)) | (amounts > q3 + 1.5 * (q3 - q1))])
+
+
+def test_quantiles_match_numpy_within_the_sketch_error():
+    df = load_sample()
+    stats = SpendSketches.from_frame(df).quantiles([0.25, 0.5, 0.75])
+    for category, amounts in df.dropna(subset=['Amount']).groupby('Category')['Amount']:
+        amounts = amounts.to_numpy()
+        exact = np.quantile(amounts, [0.25, 0.5, 0.75], method='inverted_cdf')
+        sketched = stats.loc[category, ['p25', 'p50', 'p75']].to_numpy(dtype='float64')
+        assert np.all(np.abs(sketched - exact) <= quantile_error(exact)), category
+        assert stats.loc[category, 'Min'] == amounts.min()
+        assert stats.loc[category, 'Max'] == amounts.max()
+
+
+def test_bounds_contain_the_interpolated_quartiles():
+    df = load_sample()
+    bounds = SpendSketches.from_frame(df).quantile_bounds([0.25, 0.75])
+    for category, amounts in df.dropna(subset=['Amount']).groupby('Category')['Amount']:
+        q1, q3 = np.quantile(amounts.to_numpy(), [0.25, 0.75])
+        assert bounds.loc[category, 'p25_low'] <= q1 <= bounds.loc[category, 'p25_high'], category
+        assert bounds.loc[category, 'p75_low'] <= q3 <= bounds.loc[category, 'p75_high'], category
+
+
+def test_box_plot_flags_the_same_outliers_as_exact_quartiles():
+    df = load_sample()
+    figure = create_box_plot(df).figure
+    flagged = {trace['name']: np.sort(decode(trace['y'])) for trace in figure['data'] if trace['type'] != 'box'}
+    for category, amounts in df.dropna(subset=['Amount']).groupby('Category')['Amount']:
+        expected = exact_outliers(amounts.to_numpy())
+        np.testing.assert_array_equal(flagged.get(category, np.array([])), expected, err_msg=category)
+    # Five identical bills are no outliers
+    assert 'Internet Bill' not in flagged
+
+
+def test_refunds_keep_their_sign():
+    df = pd.DataFrame({'Date': pd.to_datetime(['2022-01-03'] * 4 + ['2022-02-03']),
+                       'Category': 'Shopping', 'Amount': [-80.0, -20.0, 15.0, 40.0, 60.0]})
+    stats = SpendSketches.from_frame(df).quantiles([0.2, 0.4])
+    assert stats.loc['Shopping', 'Min'] == -80.0
+    assert abs(stats.loc['Shopping', 'p20'] + 80.0) <= quantile_error(80.0)
+    assert abs(stats.loc['Shopping', 'p40'] + 20.0) <= quantile_error(20.0)
+
+
+def test_merged_sketches_add_counts_and_keep_extremes():
+    df = load_sample()
+    first, second = df.iloc[:150], df.iloc[150:]
+    merged = SpendSketches.from_frame(first).merge(SpendSketches.from_frame(second))
+    whole = SpendSketches.from_frame(df)
+    pd.testing.assert_frame_equal(merged.quantiles([0.5, 0.9]), whole.quantiles([0.5, 0.9]))
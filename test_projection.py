@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from projection import project_month_end, simulate_remaining_spend
+
+PATHS = 2000
+
+
+def ledger(seed=2):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('2023-01-01', '2023-06-15', freq='D')
+    rows = [(day, category, amount) for day in days
+            for category, mean in [('Groceries', 40.0), ('Dining', 20.0)]
+            for amount in rng.exponential(mean, rng.poisson(1.5))]
+    return pd.DataFrame(rows, columns=['Date', 'Category', 'Amount'])
+
+
+def test_projection_is_ordered_and_counts_the_spend_so_far():
+    df = ledger()
+    projection = project_month_end(df, '2023-06-15', paths=PATHS).set_index('Category')
+    june = df[df['Date'] >= '2023-06-01']
+    spent = june.groupby('Category')['Amount'].sum().round(2)
+    assert np.allclose(projection.loc[spent.index, 'Spent_So_Far'], spent)
+    assert (projection['P10'] <= projection['P50']).all() and (projection['P50'] <= projection['P90']).all()
+    assert (projection['P10'] >= projection['Spent_So_Far']).all()
+    assert projection.attrs['remaining_days'] == 15
+
+
+def test_month_end_has_nothing_left_to_project():
+    projection = project_month_end(ledger(), '2023-05-31', paths=PATHS)
+    assert projection.attrs['remaining_days'] == 0
+    assert (projection['P10'] == projection['Spent_So_Far']).all()
+    assert (projection['P90'] == projection['Spent_So_Far']).all()
+
+
+def test_projection_is_repeatable():
+    df = ledger()
+    first = project_month_end(df, '2023-06-10', paths=PATHS)
+    # Same ledger rebuilt, so not a cache hit on the same object
+    again = project_month_end(ledger(), '2023-06-10', paths=PATHS)
+    pd.testing.assert_frame_equal(first, again)
+
+
+def test_simulation_matches_the_expected_spend():
+    # Two transactions of 10 or 30 every day: 20 per transaction, 40 per day
+    spend = simulate_remaining_spend([np.array([2, 2, 2])], [np.array([10.0, 30.0])], days=10, paths=20000)
+    assert spend.shape == (1, 20000)
+    assert abs(spend.mean() - 400) < 2
+    # Twenty draws per path: exact sums are multiples of 20 between 200 and 600
+    assert spend.min() >= 200 and spend.max() <= 600 and (spend % 20 == 0).all()
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+import proximity
+from proximity import BANDS, UNKNOWN_BAND, distance_bands, haversine_miles
+
+# Zip code centroids as pgeocode has them
+CENTROIDS = {
+    '07102': (40.7357, -74.1724),  # Newark, NJ
+    '07103': (40.7423, -74.1966),  # Newark, NJ
+    '07960': (40.7968, -74.4815),  # Morristown, NJ
+    '19103': (39.9526, -75.1652),  # Philadelphia, PA
+    '94103': (37.7725, -122.4147),  # San Francisco, CA
+}
+
+
+def offline_geocoder(monkeypatch):
+    # Known zips come from the cache; anything else fails to geocode, as it does for a zip pgeocode lacks
+    geocoded = []
+
+    def query(func, zips, key=None):
+        geocoded.extend(zips)
+        return np.full((len(zips), 2), np.nan)
+
+    for zip_code, centroid in CENTROIDS.items():
+        monkeypatch.setitem(proximity._centroids, zip_code, centroid)
+    monkeypatch.setattr(proximity, 'run_in_worker', query)
+    return geocoded
+
+
+def test_haversine_miles():
+    newark, philadelphia = CENTROIDS['07102'], CENTROIDS['19103']
+    assert abs(haversine_miles(*philadelphia, *newark) - 75.2) < 0.1
+    assert haversine_miles(*newark, *newark) == 0
+
+
+def test_distance_bands(monkeypatch):
+    geocoded = offline_geocoder(monkeypatch)
+    zip_codes = pd.Series(['07103', '07960-1234', 19103, '94103', '7102', None, '00501', '07103'])
+
+    bands = distance_bands(zip_codes, '07102-3122')
+
+    assert list(bands) == [BANDS[0], BANDS[1], BANDS[2], BANDS[3], BANDS[0], UNKNOWN_BAND, UNKNOWN_BAND, BANDS[0]]
+    assert list(bands.categories) == BANDS + [UNKNOWN_BAND]
+    # Only the zip that wasn't cached went to the geocoder
+    assert geocoded == ['00501']
+
+
+def test_unknown_home_zip(monkeypatch):
+    offline_geocoder(monkeypatch)
+
+    assert distance_bands(pd.Series(['07103', '19103']), '00501') is None
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from recurring import find_recurring_charges
+
+
+def charges(merchant, category, dates, amounts):
+    dates = pd.to_datetime(dates)
+    return pd.DataFrame({'Merchant': merchant, 'Category': category, 'Date': dates,
+                         'Amount': np.broadcast_to(amounts, len(dates)).astype('float64')})
+
+
+def monthly(day, months=12, start='2022-01'):
+    return pd.date_range(start, periods=months, freq='MS') + pd.Timedelta(days=day - 1)
+
+
+def recurring(*ledgers):
+    df = pd.concat(ledgers, ignore_index=True).sample(frac=1, random_state=0)
+    return find_recurring_charges(df).set_index('Merchant')
+
+
+def test_monthly_subscription_is_found():
+    found = recurring(charges('SLING TV', 'Entertainment', monthly(15), 35.0))
+    row = found.loc['SLING TV']
+    assert row['Frequency'] == 'Monthly' and row['Charges'] == 12
+    assert row['Last_Charge'] == pd.Timestamp('2022-12-15')
+    assert abs((row['Next_Expected'] - pd.Timestamp('2023-01-15')).days) <= 1
+    assert np.isclose(row['Annual_Cost'], 35.0 * 365.25 / 30.44)
+
+
+def test_cadence_and_amount_may_wobble_a_little():
+    # Billed on the 1st to the 3rd, with a price change of a few percent halfway through
+    dates = monthly(1) + pd.to_timedelta([0, 2, 1, 0, 2, 1, 0, 2, 1, 0, 2, 1], unit='D')
+    found = recurring(charges('COMCAST', 'Internet Bill', dates, [80.0] * 6 + [84.0] * 6))
+    assert found.loc['COMCAST', 'Frequency'] == 'Monthly'
+
+
+def test_other_cadences():
+    weekly = charges('PARKMOBILE', 'Parking', pd.date_range('2022-03-07', periods=10, freq='7D'), 6.0)
+    annual = charges('AMAZON PRIME', 'Shopping', pd.date_range('2018-06-01', periods=4, freq='YS-JUN'), 139.0)
+    found = recurring(weekly, annual)
+    assert found.loc['PARKMOBILE', 'Frequency'] == 'Weekly'
+    assert found.loc['AMAZON PRIME', 'Frequency'] == 'Annual'
+
+
+def test_near_misses_are_rejected():
+    rng = np.random.default_rng(1)
+    # Too few charges
+    short = charges('NETFLIX', 'Entertainment', monthly(3, months=2), 15.0)
+    # Monthly, but the amount changes every time
+    groceries = charges('STOP & SHOP', 'Groceries', monthly(5), rng.uniform(40, 160, 12).round(2))
+    # A stable amount at irregular intervals
+    irregular = charges('CHIPOTLE', 'Restaurants',
+                        pd.Timestamp('2022-01-01') + pd.to_timedelta(np.cumsum(rng.integers(2, 60, 10)), 'D'), 11.5)
+    # Regular, but every 50 days matches no billing period
+    odd_period = charges('VIOC', 'Car', pd.date_range('2022-01-01', periods=6, freq='50D'), 70.0)
+    found = recurring(short, groceries, irregular, odd_period)
+    assert found.empty
+
+
+def test_merchant_and_category_are_one_key():
+    # "E-Payment" pays the rent and the car loan, each monthly with its own amount
+    rent = charges('E-PAYMENT', 'Housing', monthly(1), 1500.0)
+    car = charges('E-PAYMENT', 'Car Loan', monthly(20), 320.0)
+    found = find_recurring_charges(pd.concat([rent, car], ignore_index=True))
+    assert sorted(found['Category']) == ['Car Loan', 'Housing']
+    assert (found['Frequency'] == 'Monthly').all()
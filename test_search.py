@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from search import SearchIndex, tokenize
+
+
+def ledger():
+    return pd.DataFrame({'Description': ['WHOLE FOODS #10', 'Whole Foods Market', 'FOOD LION', 'UBER EATS',
+                                         None, 'Shell Oil 5771'],
+                         'City/State': ['SAN FRANCISCO CA', 'OAKLAND CA', 'RALEIGH NC', 'SAN FRANCISCO CA',
+                                        'AUSTIN TX', np.nan],
+                         'Category': ['Groceries', 'Groceries', 'Groceries', 'Dining', 'Dining', 'Gas']})
+
+
+def scan(df, query):
+    # Every term a prefix of some token of the row
+    tokens = [set(tokenize(' '.join(str(value) for value in row if pd.notna(value))))
+              for row in df.itertuples(index=False)]
+    return [row for row, row_tokens in enumerate(tokens)
+            if all(any(token.startswith(term) for token in row_tokens) for term in tokenize(query))]
+
+
+def test_terms_match_as_prefixes_in_any_column():
+    df = ledger()
+    index = SearchIndex.from_frame(df)
+    for query in ['whole', 'foo', 'whole foo', 'FOOD lion', 'san fran groc', 'ca', 'dining austin', '5771',
+                  'nothing', 'groceries  ,  ca!']:
+        assert index.search(query).tolist() == scan(df, query), query
+
+
+def test_empty_query_matches_everything():
+    index = SearchIndex.from_frame(ledger())
+    assert index.search('').tolist() == list(range(6))
+    assert index.search(None).tolist() == list(range(6))
+
+
+def test_pages_skip_hidden_rows():
+    df = ledger()
+    index = SearchIndex.from_frame(df)
+    hidden = np.array([False, True, False, False, False, False])
+    page, matches = index.page(df, 'groceries', 0, 2, hidden)
+    assert matches == 2 and page.index.tolist() == [0, 2]
+    page, matches = index.page(df, '', 1, 4)
+    assert matches == 6 and page.index.tolist() == [4, 5]
@@ -0,0 +1,56 @@
+import numpy as np
+
+from sketches import BUCKET_VALUES, MIN_VALUE, MAX_VALUE, GAMMA, bucket_index, quantile_error, build_counts, \
+    sketch_ranks, sketch_quantiles, interpolated_bounds, sketch_mad
+
+
+def amounts(n=5000, seed=9):
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(3.5, 1.2, n).round(2)
+    # Some refunds and zero-amount adjustments
+    values[rng.random(n) < 0.05] *= -1
+    values[rng.random(n) < 0.01] = 0.0
+    return values
+
+
+def test_buckets_keep_sign_and_relative_error():
+    values = np.concatenate([amounts(), [MIN_VALUE, -MIN_VALUE, 0.004, -0.004, 999999.0]])
+    represented = BUCKET_VALUES[bucket_index(values)]
+    assert (np.sign(represented) == np.sign(np.where(np.abs(values) <= MIN_VALUE, 0, values))).all()
+    assert (np.abs(represented - values) <= quantile_error(values)).all()
+
+
+def test_amounts_beyond_the_range_go_to_the_end_buckets():
+    assert bucket_index([2 * MAX_VALUE, -2 * MAX_VALUE]).tolist() == [len(BUCKET_VALUES) - 1, 0]
+
+
+def test_ranks_and_quantiles_are_within_the_error():
+    values = amounts()
+    counts = build_counts(np.zeros(len(values), dtype='int64'), values, 1)
+    ordered = np.sort(values)
+    for rank in [1, 2, 100, 2500, 4999, 5000]:
+        read = sketch_ranks(counts, np.array([rank]))[0]
+        assert abs(read - ordered[rank - 1]) <= quantile_error(ordered[rank - 1])
+    for q in [0.05, 0.25, 0.5, 0.75, 0.99]:
+        low, high = interpolated_bounds(counts, q)
+        assert low[0] <= np.quantile(values, q) <= high[0]
+        assert abs(sketch_quantiles(counts, q)[0] - np.quantile(values, q, method='inverted_cdf')) <= \
+            quantile_error(np.quantile(values, q, method='inverted_cdf'))
+
+
+def test_one_sketch_per_group_and_empty_ones_are_nan():
+    values = amounts()
+    groups = (values > 50).astype('int64')
+    counts = build_counts(groups, values, 3)
+    assert counts.sum(axis=1).tolist() == [(values <= 50).sum(), (values > 50).sum(), 0]
+    medians = sketch_quantiles(counts, 0.5)
+    assert np.isnan(medians[2]) and np.isnan(sketch_mad(counts, medians)[2])
+
+
+def test_mad_is_within_a_bucket_of_the_exact_one():
+    values = np.abs(amounts())
+    counts = build_counts(np.zeros(len(values), dtype='int64'), values, 1)
+    median = sketch_quantiles(counts, 0.5)
+    exact = np.median(np.abs(values - np.median(values)))
+    # The deviations are read off bucket values, each a bucket width apart around the median
+    assert abs(sketch_mad(counts, median)[0] - exact) <= 2 * (GAMMA - 1) * median[0]
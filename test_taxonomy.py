@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from funcs import necessity_totals
+from taxonomy import Taxonomy, get_taxonomy
+
+TAXONOMY = pd.DataFrame({'Category': ['Groceries', 'Restaurants', 'Rent', 'Cinema'],
+                         'Group': ['Food', 'Food', 'Housing', None],
+                         'Necessity': ['True', 'False', 'yes', 'False'],
+                         'Budget': [400, np.nan, 1500, np.nan]})
+
+
+def ledger():
+    return pd.DataFrame({'Category': ['Groceries', 'Groceries', 'Restaurants', 'Rent', 'Cinema', 'Hobbies', None],
+                         'Amount': [50.0, np.nan, 20.0, 1500.0, 12.0, 30.0, 5.0]})
+
+
+@pytest.fixture
+def shipped_taxonomy(monkeypatch):
+    # The taxonomy is read from data/, relative to the app's directory
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_rollup_matches_a_groupby_sum():
+    df = ledger()
+    rollup = Taxonomy(TAXONOMY).rollup(df)
+
+    categories = rollup['Category']
+    expected = df.assign(Category=df['Category'].where(df['Category'].isin(TAXONOMY['Category']), 'Uncategorized'))
+    expected = expected.groupby('Category')['Amount'].agg(['sum', 'size'])
+    assert categories['Amount'].to_dict() == expected['sum'].to_dict()
+    assert categories['Transactions'].to_dict() == expected['size'].to_dict()
+
+    groups = rollup['Group']
+    assert groups['Amount'].to_dict() == {'Food': 70.0, 'Housing': 1500.0, 'Other': 47.0}
+    assert groups.loc['Food', 'Budget'] == 400 and np.isnan(groups.loc['Other', 'Budget'])
+
+    types = rollup['Type']
+    assert types['Amount'].to_dict() == {'Necessities': 1550.0, 'Non-essentials': 67.0}
+
+
+def test_blank_amounts_add_nothing(shipped_taxonomy):
+    df = pd.DataFrame({'Category': ['Groceries', 'Groceries', 'Restaurants'], 'Amount': [50.0, np.nan, 20.0]})
+    totals = necessity_totals(df).set_index('Type')['Amount']
+    assert totals.to_dict() == {'Necessities': 50.0, 'Non-essentials': 20.0}
+
+
+def test_shipped_taxonomy_is_reloaded_only_when_it_changes(shipped_taxonomy):
+    assert get_taxonomy() is get_taxonomy()
+    assert get_taxonomy().is_necessity(['Groceries', 'Restaurants', 'Unknown']).tolist() == [True, False, False]
@@ -0,0 +1,62 @@
+import os
+import threading
+
+import pytest
+from flask import Flask
+
+import uploads
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, 'SPOOL_DIR', str(tmp_path))
+    server = Flask(__name__)
+    uploads.register_upload_routes(server)
+    return server.test_client()
+
+
+def create(client, data):
+    return client.post('/upload', json={'filename': 'statement.csv', 'size': len(data)}).get_json()['upload_id']
+
+
+def put(client, upload_id, data, start, end):
+    return client.put('/upload/' + upload_id, data=data[start:end + 1],
+                      headers={'Content-Range': 'bytes {}-{}/{}'.format(start, end, len(data))})
+
+
+def test_chunks_sent_twice_are_written_once(client):
+    data = b'Date,Amount\n' + b'01/04/22,1.00\n' * 100
+    upload_id = create(client, data)
+    assert put(client, upload_id, data, 0, 99).status_code == 200
+    assert put(client, upload_id, data, 0, 99).status_code == 200
+    assert put(client, upload_id, data, 100, len(data) - 1).get_json()['complete']
+    with open(uploads.spool_path(upload_id), 'rb') as f:
+        assert f.read() == data
+
+
+def test_concurrent_chunks_with_the_same_offset_do_not_corrupt_the_file(client, tmp_path):
+    data = os.urandom(256 * 1024)
+    upload_id = create(client, data)
+    threads = [threading.Thread(target=put, args=(client, upload_id, data, 0, len(data) - 1)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(uploads.spool_path(upload_id), 'rb') as f:
+        assert f.read() == data
+
+
+def test_a_gap_is_refused_with_the_offset_to_resume_from(client):
+    data = b'x' * 100
+    upload_id = create(client, data)
+    put(client, upload_id, data, 0, 9)
+    response = put(client, upload_id, data, 50, 99)
+    assert response.status_code == 409 and response.get_json()['received'] == 10
+
+
+def test_parsed_uploads_are_removed(client):
+    upload_id = create(client, b'abc')
+    uploads.remove_upload(upload_id)
+    uploads.remove_upload(upload_id)
+    assert uploads.upload_info(upload_id) is None
+    assert os.listdir(uploads.SPOOL_DIR) == []
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from workers import WorkerPool, TaskCancelled
+
+
+def run_in_thread(pool, results, name, fn, *args, key=None):
+    def target():
+        try:
+            results[name] = pool.run(fn, *args, key=key)
+        except Exception as e:
+            results[name] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def pool():
+    return WorkerPool(size=1)
+
+
+def test_newer_run_cancels_a_running_one(pool):
+    results = {}
+    first = run_in_thread(pool, results, 'first', time.sleep, 5, key=('necessities', 'session-a'))
+    time.sleep(0.5)
+    assert pool.run(pow, 2, 10, key=('necessities', 'session-a')) == 1024
+    first.join()
+    assert isinstance(results['first'], TaskCancelled)
+
+
+def test_newer_run_cancels_a_queued_one(pool):
+    results = {}
+    busy = run_in_thread(pool, results, 'busy', time.sleep, 1.5)
+    time.sleep(0.3)
+    queued = run_in_thread(pool, results, 'queued', pow, 2, 3, key=('geo-location', 'session-a'))
+    time.sleep(0.3)
+    newer = run_in_thread(pool, results, 'newer', pow, 2, 4, key=('geo-location', 'session-a'))
+    # Cancelled while still waiting, without waiting for the busy worker
+    queued.join(timeout=0.5)
+    assert isinstance(results.get('queued'), TaskCancelled)
+    busy.join()
+    newer.join()
+    assert results['newer'] == 16
+
+
+def test_other_sessions_are_not_cancelled(pool):
+    results = {}
+    first = run_in_thread(pool, results, 'first', pow, 3, 2, key=('necessities', 'session-a'))
+    second = run_in_thread(pool, results, 'second', pow, 3, 3, key=('necessities', 'session-b'))
+    first.join()
+    second.join()
+    assert results == {'first': 9, 'second': 27}
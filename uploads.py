@@ -0,0 +1,122 @@
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+from flask import jsonify, request
+
+# Chunked, resumable statement uploads spooled straight to disk. The browser side lives in
+# assets/chunked_upload.js; the Dash callbacks only ever see the upload id.
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), 'spendalyzer-uploads')
+MAX_UPLOAD_BYTES = 2 * 1024 ** 3
+MAX_SPOOL_AGE = 24 * 60 * 60
+COPY_BUFFER = 64 * 1024
+
+UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+def spool_path(upload_id):
+    if not isinstance(upload_id, str) or not UPLOAD_ID.match(upload_id):
+        raise ValueError('Invalid upload id')
+    return os.path.join(SPOOL_DIR, upload_id)
+
+
+def upload_info(upload_id):
+    """ Filename, expected size and bytes received so far for an upload, or None if it doesn't exist
+    """
+    path = spool_path(upload_id)
+    if not os.path.exists(path + '.json'):
+        return None
+    with open(path + '.json') as f:
+        info = json.load(f)
+    info['received'] = os.path.getsize(path)
+    info['complete'] = info['received'] == info['size']
+    return info
+
+
+def remove_upload(upload_id):
+    """ Delete an upload's spool file once it has been parsed
+    """
+    path = spool_path(upload_id)
+    for name in (path, path + '.json'):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_uploads():
+    cutoff = time.time() - MAX_SPOOL_AGE
+    for name in os.listdir(SPOOL_DIR):
+        path = os.path.join(SPOOL_DIR, name)
+        # Another request may have removed it since the listing
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def register_upload_routes(server):
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+
+    @server.route('/upload', methods=['POST'])
+    def create_upload():
+        body = request.get_json(silent=True) or {}
+        filename = str(body.get('filename', ''))
+        size = body.get('size')
+        if not filename or not isinstance(size, int) or not 0 <= size <= MAX_UPLOAD_BYTES:
+            return jsonify(error='filename and a size of at most {} bytes are required'.format(MAX_UPLOAD_BYTES)), 400
+
+        _remove_stale_uploads()
+        upload_id = uuid.uuid4().hex
+        path = spool_path(upload_id)
+        open(path, 'wb').close()
+        with open(path + '.json', 'w') as f:
+            json.dump({'filename': os.path.basename(filename), 'size': size}, f)
+        return jsonify(upload_id=upload_id, received=0)
+
+    @server.route('/upload/<upload_id>', methods=['GET'])
+    def upload_status(upload_id):
+        try:
+            info = upload_info(upload_id)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        if info is None:
+            return jsonify(error='Unknown upload'), 404
+        return jsonify(info)
+
+    @server.route('/upload/<upload_id>', methods=['PUT'])
+    def upload_chunk(upload_id):
+        try:
+            info = upload_info(upload_id)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        if info is None:
+            return jsonify(error='Unknown upload'), 404
+
+        match = CONTENT_RANGE.match(request.headers.get('Content-Range', ''))
+        if match is None:
+            return jsonify(error='A Content-Range header of the form "bytes start-end/total" is required'), 400
+        start, end, total = (int(value) for value in match.groups())
+        if total != info['size'] or end < start or end >= total:
+            return jsonify(error='Content-Range does not match the upload'), 400
+        # Chunks must arrive in order; the client resumes from the offset returned here
+        if start > info['received']:
+            return jsonify(info), 409
+
+        # Written at its own offset rather than appended, so a chunk sent twice (a retry, or two requests racing)
+        # lands on the same bytes instead of being added again
+        remaining = end - start + 1
+        with open(spool_path(upload_id), 'r+b') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = request.stream.read(min(COPY_BUFFER, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        return jsonify(upload_info(upload_id))
@@ -0,0 +1,193 @@
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+
+from dash.exceptions import PreventUpdate
+
+# Long-lived worker processes for the CPU-heavy analyses (text classification, geocoding), so they run outside
+# the web process and don't hold its GIL. Workers are warmed up once with whatever the analyses registered through
+# register_warmup (trained models, geocoding tables) and are only replaced when a task is stopped.
+POOL_SIZE = 2
+
+# A task running longer than this is stopped by terminating its worker
+TASK_TIMEOUT = 60
+
+# How long a request waits for a free worker before giving up, checking every QUEUE_POLL seconds whether it has
+# been superseded meanwhile
+QUEUE_TIMEOUT = 30
+QUEUE_POLL = 0.1
+
+# Workers are never forked from the threaded web server, which could copy a lock held by another thread into the
+# child: they come from a fork server that imported the analysis modules once (spawned where there is none)
+_context = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+_warmups = []
+
+
+class TaskTimeout(TimeoutError):
+    pass
+
+
+class TaskCancelled(PreventUpdate):
+    """ Raised in the request whose task was superseded by a newer one with the same key
+
+    It is a PreventUpdate, so Dash leaves the outputs of the superseded callback untouched.
+    """
+
+
+def register_warmup(fn):
+    """ Run fn in every worker as it starts, ahead of its first task
+    """
+    _warmups.append(fn)
+    return fn
+
+
+def _worker_main(conn, warmups):
+    for warmup in warmups:
+        try:
+            warmup()
+        except Exception:
+            # Leave it to the task to fail, with the error reported back to the request
+            traceback.print_exc()
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, fn(*args)))
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+
+
+class _Worker:
+    def __init__(self):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=_worker_main, args=(child_conn, list(_warmups)), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+        self.process.terminate()
+
+
+class _Task:
+    # A run from the moment it is submitted, so it can be cancelled while still waiting for a worker
+    def __init__(self):
+        self.worker = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self.worker is not None:
+            self.worker.stop()
+
+
+class WorkerPool:
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = queue.Queue()
+        self._running = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """ Start the workers; call it before serving, so no request pays for their start-up
+        """
+        with self._lock:
+            if not self._started:
+                if _context.get_start_method() == 'forkserver':
+                    _context.set_forkserver_preload(sorted({warmup.__module__ for warmup in _warmups}))
+                for _ in range(self.size):
+                    self._idle.put(_Worker())
+                self._started = True
+
+    def _release(self, worker):
+        if worker.stopped or not worker.process.is_alive():
+            # A stopped worker may have been mid-task, so it is replaced by a fresh one rather than reused
+            worker.process.join()
+            worker.conn.close()
+            worker = _Worker()
+        self._idle.put(worker)
+
+    def _acquire(self, task):
+        deadline = time.monotonic() + QUEUE_TIMEOUT
+        while True:
+            if task.cancelled:
+                raise TaskCancelled()
+            try:
+                worker = self._idle.get(timeout=QUEUE_POLL)
+            except queue.Empty:
+                if time.monotonic() > deadline:
+                    raise TaskTimeout('All analysis workers are busy')
+                continue
+            with self._lock:
+                if not task.cancelled:
+                    task.worker = worker
+                    return worker
+            self._idle.put(worker)
+
+    def run(self, fn, *args, key=None, timeout=TASK_TIMEOUT):
+        """ Run fn(*args) in a worker and return its result
+
+        A newer run with the same key stops this one, whether it is running or still waiting for a worker, and it
+        then raises TaskCancelled. fn and its arguments and result must be picklable.
+        """
+        self.start()
+        task = _Task()
+        if key is not None:
+            with self._lock:
+                if key in self._running:
+                    self._running[key].cancel()
+                self._running[key] = task
+
+        try:
+            worker = self._acquire(task)
+            try:
+                try:
+                    worker.conn.send((fn, args))
+                    # Waiting on the pipe releases the GIL, so the web process keeps serving other callbacks
+                    # meanwhile
+                    finished = worker.conn.poll(timeout)
+                    if finished:
+                        ok, result = worker.conn.recv()
+                except (EOFError, OSError):
+                    if task.cancelled:
+                        raise TaskCancelled()
+                    raise RuntimeError('The analysis worker exited unexpectedly')
+                if not finished:
+                    worker.stop()
+                    raise TaskTimeout('The analysis took longer than {} seconds and was stopped'.format(timeout))
+            finally:
+                self._release(worker)
+        finally:
+            if key is not None:
+                with self._lock:
+                    if self._running.get(key) is task:
+                        del self._running[key]
+
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+
+_pool = WorkerPool()
+
+
+def process_context():
+    """ The multiprocessing context for any other process pool of the web server, for the same reason
+    """
+    return _context
+
+
+def start_workers():
+    _pool.start()
+
+
+def run_in_worker(fn, *args, key=None, timeout=TASK_TIMEOUT):
+    return _pool.run(fn, *args, key=key, timeout=timeout)